@@ -0,0 +1,369 @@
+# File name: apiserver.py
+
+import argparse
+import math
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, jsonify, request
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from erc20factory import erc20_factory_instance
+from swap_utils import get_amount_in_reserve1_for_amount0_out
+
+try:
+    from flask_swagger_ui import get_swaggerui_blueprint
+except ImportError:  # The docs page is optional, the API works without it
+    get_swaggerui_blueprint = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "static")
+MAX_BATCH_SIZE = 1000  # Most sub-requests accepted by one /batch call
+
+
+class SwapApi:
+    """
+    JSON API over a SwapHub and the token ledger, implementing static/swagger.json.
+
+    Every route is a plain method taking the parsed parameters and returning (HTTP status, JSON body), so /batch
+    runs many sub-requests inside one HTTP request without going through Flask again. Malformed parameters answer
+    400, a trade the pool rejects answers 200 with "success": false and the pool message, like the hub tuples.
+    """
+
+    def __init__(self, hub, erc20=erc20_factory_instance, default_leverage=2):
+        """
+        :param hub: SwapHub the trade and price routes run on
+        :param erc20: Token ledger for the balance, transfer and airdrop routes
+        :param default_leverage: Leverage multiplier of /short_open when the request does not give lev_mult
+        """
+        self.hub = hub
+        self.erc20 = erc20
+        self.default_leverage = default_leverage
+        self.routes = {
+            ("POST", "/airdropTokens"): self.airdrop_tokens,
+            ("POST", "/transfer"): self.transfer,
+            ("GET", "/balance_of"): self.balance_of,
+            ("POST", "/mint_usdt"): self.mint_usdt,
+            ("POST", "/mint_mtk"): self.mint_mtk,
+            ("POST", "/burn"): self.burn,
+            ("POST", "/short_open"): self.short_open,
+            ("POST", "/short_close"): self.short_close,
+            ("GET", "/get_current_price"): self.get_current_price,
+            ("GET", "/debug_price"): self.debug_price,
+        }
+
+    def dispatch(self, method, path, params):
+        """
+        Run one route
+        :param method: "GET" or "POST"
+        :param path: Route path, e.g. "/transfer"
+        :param params: Query parameters (GET) or JSON body (POST) as a dict
+        :return: (HTTP status, JSON body)
+        """
+        route = self.routes.get((method, path))
+        if route is None:
+            return 404, {"success": False, "message": f"No route {method} {path}"}
+        if not isinstance(params, dict):
+            return 400, {"success": False, "message": "Parameters must be a JSON object"}
+        try:
+            return route(params)
+        except ValueError as e:
+            return 400, {"success": False, "message": str(e)}
+
+    def batch(self, params):
+        """
+        Run several routes in order, each one exactly like its own request.
+        Body: {"requests": [{"method": "POST", "path": "/burn", "body": {...}}, {"method": "GET", "path": "/balance_of", "query": {...}}]}
+        :return: (200, {"responses": [{"status": ..., "body": ...}]}) in request order
+        """
+        requests = params.get("requests") if isinstance(params, dict) else None
+        if not isinstance(requests, list):
+            return 400, {"success": False, "message": "Body must be {\"requests\": [...]}"}
+        if len(requests) > MAX_BATCH_SIZE:
+            return 400, {"success": False, "message": f"At most {MAX_BATCH_SIZE} requests per batch"}
+        responses = []
+        for sub_request in requests:
+            if not isinstance(sub_request, dict):
+                status, body = 400, {"success": False, "message": "Each request must be a JSON object"}
+            else:
+                method = str(sub_request.get("method", "GET")).upper()
+                sub_params = sub_request.get("query" if method == "GET" else "body")
+                status, body = self.dispatch(method, sub_request.get("path"), {} if sub_params is None else sub_params)
+            responses.append({"status": status, "body": body})
+        return 200, {"responses": responses}
+
+    def airdrop_tokens(self, params):
+        token, addr, amount = _string(params, "token"), _string(params, "addr"), _amount(params, "amount")
+        success, message = self.erc20.airdrop(token, {addr: amount})
+        if success:
+            self.hub.notify_change()
+        return 200, {"success": success, "message": message}
+
+    def transfer(self, params):
+        token, from_addr, to_addr = _string(params, "token"), _string(params, "from_addr"), _string(params, "to_addr")
+        amount = _amount(params, "amount")
+        if token not in self.erc20.tokens:
+            return 200, {"success": False, "message": "Token contract does not exist"}
+        # Serialized with pool trades of the same token by the ledger's stripe lock, the hub lock is not needed
+        journal = self.erc20.journal
+        if journal is None:
+            success, message = self.erc20.transferFrom(token, from_addr, to_addr, amount)
+        else:
+            # Apply and append under the journal lock so the log order matches the order balances changed in
+            with journal.lock:
+                success, message = self.erc20.transferFrom(token, from_addr, to_addr, amount)
+                if success:
+                    journal.append("erc20", "transfer", None, (token, from_addr, to_addr, amount), None)
+        if success:
+            self.hub.notify_change()
+        return 200, {"success": success, "message": message}
+
+    def balance_of(self, params):
+        token, addr = _string(params, "token"), _string(params, "addr")
+        return 200, {"token": token, "addr": addr, "balance": self.erc20.balanceOf(token, addr)}
+
+    def mint_usdt(self, params):
+        """
+        Buy MTK (pool token0) with usdt_amount USDT
+        """
+        addr, usdt_amount = _string(params, "addr"), _amount(params, "usdt_amount")
+        # Balance difference, concurrent requests for the same address may show up in it
+        before = self.erc20.balanceOf(self.hub.pool.token0, addr)
+        success, message = self.hub.buy(addr, usdt_amount)
+        minted = self.erc20.balanceOf(self.hub.pool.token0, addr) - before if success else 0
+        return 200, {"success": success, "message": message, "mtk_amount": minted}
+
+    def mint_mtk(self, params):
+        """
+        Buy exactly mtk_amount MTK, the USDT input is quoted from the latest reserves
+        """
+        addr, mtk_amount = _string(params, "addr"), _amount(params, "mtk_amount")
+        reserve0, reserve1 = self.hub.get_reserves()
+        if mtk_amount >= reserve0:
+            return 200, {"success": False, "message": "Insufficient liquidity", "usdt_spent": 0}
+        usdt_amount = get_amount_in_reserve1_for_amount0_out(mtk_amount, reserve0, reserve1, self.hub.pool.fee)[0]
+        success, message = self.hub.buy(addr, usdt_amount)
+        return 200, {"success": success, "message": message, "usdt_spent": usdt_amount if success else 0}
+
+    def burn(self, params):
+        """
+        Sell mtk_amount MTK for USDT
+        """
+        addr, mtk_amount = _string(params, "addr"), _amount(params, "mtk_amount")
+        before = self.erc20.balanceOf(self.hub.pool.token1, addr)
+        success, message = self.hub.sell(addr, mtk_amount)
+        returned = self.erc20.balanceOf(self.hub.pool.token1, addr) - before if success else 0
+        return 200, {"success": success, "message": message, "usdt_amount": returned}
+
+    def short_open(self, params):
+        """
+        Leverage short with usdt_amount collateral: quote with short_fast_open, then open at the quoted prices
+        """
+        addr, usdt_amount = _string(params, "addr"), _amount(params, "usdt_amount")
+        lev_mult = _amount(params, "lev_mult") if "lev_mult" in params else self.default_leverage
+        success, quote = self.hub.short_fast_open(addr, usdt_amount, lev_mult)
+        if not success:
+            return 200, {"success": False, "message": quote}
+        orders_before = self._order_ids(addr)
+        success, message = self.hub.short_open(addr, quote["baseAmount"], quote["lendAmount"], quote["forcedClosePrice"], quote["insterOrderID"])
+        body = {"success": success, "message": message}
+        if success:
+            new_orders = self._order_ids(addr) - orders_before
+            body.update(
+                order_id=new_orders.pop() if len(new_orders) == 1 else None,
+                lend_amount=quote["lendAmount"],
+                forced_close_price=quote["forcedClosePriceMoved"],
+            )
+        return 200, body
+
+    def short_close(self, params):
+        """
+        Close a short, the whole order unless close_amount (token0) is given
+        """
+        addr, order_id = _string(params, "addr"), _string(params, "order_id")
+        with self.hub.lock.read():
+            order = self.hub.pool.getOrderByID(order_id)
+            if order is None or order['orderType'] != "short":
+                return 200, {"success": False, "message": "Short order does not exist"}
+            lend_amount0 = order['lendAmount0']
+        close_amount = _amount(params, "close_amount") if "close_amount" in params else lend_amount0
+        success, message = self.hub.short_close(addr, order_id, close_amount)
+        return 200, {"success": success, "message": message}
+
+    def _order_ids(self, addr):
+        with self.hub.lock.read():
+            return set(self.hub.pool.getOrderIDsByAddress(addr))
+
+    def get_current_price(self, params):
+        return 200, {"price": self.hub.get_price()}
+
+    def debug_price(self, params):
+        snapshot = self.hub.get_snapshot()
+        return 200, {
+            "price": snapshot.price,
+            "reserve0": snapshot.reserve0,
+            "reserve1": snapshot.reserve1,
+            "version": snapshot.version,
+            "nearShortNode": snapshot.nearShortNode,
+            "nearLongNode": snapshot.nearLongNode,
+        }
+
+
+def _string(params, name):
+    value = params.get(name)
+    if not isinstance(value, str) or not value:
+        raise ValueError(f"{name} must be a non-empty string")
+    return value
+
+
+def _amount(params, name):
+    value = params.get(name)
+    if isinstance(value, str):
+        try:
+            value = float(value)  # Query strings carry numbers as text
+        except ValueError:
+            pass
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value <= 0:
+        raise ValueError(f"{name} must be a positive number")
+    return value
+
+
+def create_app(api):
+    """
+    Flask application serving the routes of api, /batch, static/swagger.json and (with flask-swagger-ui) /docs
+    :param api: SwapApi
+    """
+    app = Flask(__name__, static_folder=STATIC_DIR, static_url_path="/static")
+    app.json.sort_keys = False
+
+    def view(method, path):
+        def handle():
+            params = request.args.to_dict() if method == "GET" else request.get_json(silent=True)
+            status, body = api.dispatch(method, path, params)
+            return jsonify(body), status
+        return handle
+
+    for (method, path), route in api.routes.items():
+        app.add_url_rule(path, endpoint=route.__name__, view_func=view(method, path), methods=[method])
+
+    @app.post("/batch")
+    def batch():
+        status, body = api.batch(request.get_json(silent=True))
+        return jsonify(body), status
+
+    if get_swaggerui_blueprint is not None:
+        app.register_blueprint(get_swaggerui_blueprint("/docs", "/static/swagger.json"))
+    return app
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """
+    HTTP/1.1 handler: a client reuses its connection for many requests instead of connecting per request
+    """
+    protocol_version = "HTTP/1.1"
+    timeout = 5          # Seconds an idle keep-alive connection may hold a worker
+    access_log = False   # Per-request log lines cost more than the requests themselves
+
+    def log_request(self, code="-", size="-"):
+        if self.access_log:
+            super().log_request(code, size)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    WSGI server handling connections on a fixed pool of worker threads.
+
+    The werkzeug threaded server starts a thread per connection, so a burst of clients means a burst of threads
+    all contending for the GIL and the hub lock. Here at most `workers` connections are served at once and at most
+    `max_pending` more wait for a worker, further connections are answered 503 right away.
+    """
+    multithread = True
+    request_queue_size = 1024
+
+    def __init__(self, host, port, app, workers=32, max_pending=256, handler=KeepAliveRequestHandler):
+        """
+        :param host: Interface to listen on
+        :param port: Port to listen on, 0 picks a free port (see self.port)
+        :param app: WSGI application
+        :param workers: Number of worker threads
+        :param max_pending: Number of accepted connections that may wait for a worker
+        :param handler: Request handler class
+        """
+        super().__init__(host, port, app, handler=handler)
+        self.port = self.socket.getsockname()[1]
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-worker")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            self._reject(request)
+            return
+        self.executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def _reject(self, request):
+        try:
+            request.sendall(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        executor = getattr(self, "executor", None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def start_api_server(hub, host="0.0.0.0", port=8000, workers=32, max_pending=256):
+    """
+    Serve the API for hub on a background thread
+    :return: The running PooledWSGIServer, call shutdown() to stop it
+    """
+    server = PooledWSGIServer(host, port, create_app(SwapApi(hub)), workers=workers, max_pending=max_pending)
+    thread = threading.Thread(target=server.serve_forever, name="api-server", daemon=True)
+    thread.start()
+    return server
+
+
+def create_default_hub():
+    """
+    In-memory pool seeded like main.py, for running the API server on its own
+    """
+    from shortswapv1factory import ShortSwapV1Factory
+    from swaphub import SwapHub
+    factory = ShortSwapV1Factory()
+    pool_address = factory.createPool(
+        address="0xYourAddress", name="TestToken", symbol="TTK", decimals=18,
+        totalSupply=1500000, shortSupply=500000, tokenBase="0xUSDToken", tokenBaseAmount=100000
+    )
+    pool = factory.getPool(pool_address)
+    erc20_factory_instance.createErc20Test('b', "BaseToken", "USDT", 18, 100000, "0xUSDToken")
+    erc20_factory_instance.airdrop(pool.token1, {pool_address: 1, 'a': 5000000})
+    return SwapHub(pool)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="TokenSwapHub JSON API server (in-memory pool, see main.py API_PORT to serve the UI's pool)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=32, help="Worker threads serving connections")
+    parser.add_argument("--max-pending", type=int, default=256, help="Connections waiting for a worker before 503")
+    parser.add_argument("--access-log", action="store_true", help="Log every request")
+    args = parser.parse_args()
+    KeepAliveRequestHandler.access_log = args.access_log
+    server = PooledWSGIServer(args.host, args.port, create_app(SwapApi(create_default_hub())), workers=args.workers, max_pending=args.max_pending)
+    print(f"Serving on http://{socket.gethostname()}:{server.port} (docs at /docs when flask-swagger-ui is installed)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
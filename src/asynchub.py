@@ -0,0 +1,152 @@
+# File name: asynchub.py
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+TRADE_OPERATIONS = ("buy", "sell", "short_open", "short_close", "long_open", "long_close")
+
+
+class AsyncSwapHub:
+    """
+    asyncio front end of one SwapHub: trades are queued and applied by a single writer, reads use the snapshot.
+
+    Callers await a future instead of blocking a thread on the hub lock. One writer task per pool takes commands
+    off the queue in arrival order and hands a run of them to one dedicated writer thread, so the event loop never
+    runs pool code and there is never more than one thread waiting for the write lock. Thousands of trades can be
+    in flight with no thread per request, the queue bound (max_pending) applies backpressure to submitters.
+
+    The wrapped SwapHub stays usable from threads (Gradio, the API server), their trades interleave through the
+    hub lock as before.
+    """
+
+    def __init__(self, hub, max_pending=10000, max_batch=256):
+        """
+        :param hub: SwapHub of the pool
+        :param max_pending: Most queued trades, submitters wait when the queue is full
+        :param max_batch: Most trades handed to the writer thread at once
+        """
+        self.hub = hub
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.executed = 0  # Number of trades applied
+        self._queue = None
+        self._writer = None
+        self._executor = None
+
+    async def start(self):
+        """
+        Start the writer task on the running loop (called by the first trade if not called before)
+        """
+        if self._writer is None:
+            self._queue = asyncio.Queue(self.max_pending)
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="swaphub-writer")
+            self._writer = asyncio.get_running_loop().create_task(self._write_loop())
+
+    async def close(self):
+        """
+        Apply every trade already queued, then stop the writer
+        """
+        if self._writer is None:
+            return
+        await self._queue.put(None)
+        await self._writer
+        self._executor.shutdown()
+        self._writer = None
+
+    async def submit(self, op, *args):
+        """
+        Queue one trade and wait for its result
+        :param op: SwapHub trade method, one of TRADE_OPERATIONS
+        :param args: Method arguments (caller address first)
+        :return: The SwapHub result, (bool, message)
+        """
+        if op not in TRADE_OPERATIONS:
+            raise ValueError(f"op must be one of {TRADE_OPERATIONS}, got {op!r}")
+        if self._writer is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, args, future))
+        return await future
+
+    async def buy(self, caller_address, amount1):
+        return await self.submit("buy", caller_address, amount1)
+
+    async def sell(self, caller_address, amount0):
+        return await self.submit("sell", caller_address, amount0)
+
+    async def short_open(self, caller_address, baseAmount, lendAmount, forcedClosePrice, insterOrderID):
+        return await self.submit("short_open", caller_address, baseAmount, lendAmount, forcedClosePrice, insterOrderID)
+
+    async def short_close(self, caller_address, orderID, closeAmount0, isThirdParty=False):
+        return await self.submit("short_close", caller_address, orderID, closeAmount0, isThirdParty)
+
+    async def long_open(self, caller_address, baseAmount, lendAmount1, forcedClosePrice, insterOrderID):
+        return await self.submit("long_open", caller_address, baseAmount, lendAmount1, forcedClosePrice, insterOrderID)
+
+    async def long_close(self, caller_address, orderID, closeAmount0, isThirdParty=False):
+        return await self.submit("long_close", caller_address, orderID, closeAmount0, isThirdParty)
+
+    # Reads come from the latest immutable snapshot: no lock, no queue, no await
+
+    def get_snapshot(self):
+        return self.hub.get_snapshot()
+
+    def get_version(self):
+        return self.hub.get_version()
+
+    def get_info(self):
+        return self.hub.get_info()
+
+    def get_reserves(self):
+        return self.hub.get_reserves()
+
+    def get_price(self):
+        return self.hub.get_price()
+
+    def get_short_order(self, num):
+        return self.hub.get_short_order(num)
+
+    def get_long_order(self, num):
+        return self.hub.get_long_order(num)
+
+    def pending(self):
+        """
+        Number of queued trades not picked up by the writer yet
+        """
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = []
+            command = await self._queue.get()
+            while True:
+                if command is None:
+                    stopping = True
+                elif not command[2].cancelled():  # The caller gave up before the trade ran, skip it
+                    batch.append(command)
+                if stopping or len(batch) >= self.max_batch or self._queue.empty():
+                    break
+                command = self._queue.get_nowait()
+            if not batch:
+                continue
+            results = await loop.run_in_executor(self._executor, self._run_batch, batch)
+            self.executed += len(batch)
+            for (_op, _args, future), (result, error) in zip(batch, results):
+                if future.cancelled():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    def _run_batch(self, batch):
+        # Writer thread: apply the trades one by one in queue order
+        results = []
+        for op, args, _future in batch:
+            try:
+                results.append((getattr(self.hub, op)(*args), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
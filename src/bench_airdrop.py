@@ -0,0 +1,82 @@
+# File name: bench_airdrop.py
+
+# Benchmark: Erc20Factory.airdrop at 10k / 100k / 1M recipients, and batchTransfer vs one transferFrom per move
+# Each airdrop size runs on a fresh ledger twice: to new recipients, then again to the same (now existing) holders.
+# The per-recipient loop the ledger used before is timed on a second ledger, and the script checks that both ledgers
+# end with the same balances, total supply and holder lookups.
+# Run: python bench_airdrop.py [--sizes 10000,100000,1000000] [--moves N]
+
+import argparse
+import random
+import time
+from erc20factory import Erc20Factory
+
+
+def loop_airdrop(erc20, contract_address, recipients):
+    # One dict lookup and update per recipient, as Erc20Factory.airdrop did before
+    balances = erc20.tokens[contract_address]["balances"]
+    for address, amount in recipients.items():
+        if address not in balances:
+            balances[address] = 0
+            erc20._addHolder(address, contract_address)
+        balances[address] += amount
+        erc20.tokens[contract_address]["totalSupply"] += amount
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def bench_airdrop(size):
+    recipients = {f"0xRecipient{i}": 1 + i % 7 for i in range(size)}
+    ledgers = []
+    timings = []
+    for airdrop in (Erc20Factory.airdrop, loop_airdrop):
+        erc20 = Erc20Factory()
+        token = erc20.createErc20Test("0xOwner", "AirdropToken", "ADT", 18, 1000000, "0xAirdropToken")
+        timings.append((timed(airdrop, erc20, token, recipients), timed(airdrop, erc20, token, recipients)))
+        ledgers.append((erc20, token))
+
+    (erc20, token), (reference, _) = ledgers
+    sample = random.Random(size).sample(list(recipients), 100)
+    same = (erc20.tokens[token]["balances"] == reference.tokens[token]["balances"]
+            and erc20.totalSupply(token) == reference.totalSupply(token)
+            and all(erc20.portfolioOf(address) == reference.portfolioOf(address) for address in sample))
+    (new, existing), (loop_new, loop_existing) = timings
+    print(f"{size:>9,} recipients  airdrop: new {new * 1e3:8.1f} ms, existing {existing * 1e3:8.1f} ms   "
+          f"per-recipient loop: new {loop_new * 1e3:8.1f} ms, existing {loop_existing * 1e3:8.1f} ms   same ledger: {same}")
+
+
+def bench_batch_transfer(count):
+    rng = random.Random(0)
+    holders = [f"0xHolder{i}" for i in range(1000)]
+    moves = [(f"0xToken{rng.randrange(4)}", rng.choice(holders), rng.choice(holders), rng.uniform(1, 100))
+             for _ in range(count)]
+    ledgers = []
+    for batched in (True, False):
+        erc20 = Erc20Factory()
+        for i in range(4):
+            token = erc20.createErc20Test("0xOwner", f"Token{i}", f"TK{i}", 18, 0, f"0xToken{i}")
+            erc20.airdrop(token, dict.fromkeys(holders, 1000000))
+        if batched:
+            seconds = timed(erc20.batchTransfer, moves)
+        else:
+            seconds = timed(lambda: [erc20.transferFrom(*move) for move in moves])
+        ledgers.append((erc20, seconds))
+
+    (batch, batch_seconds), (single, single_seconds) = ledgers
+    same = all(batch.tokens[token]["balances"] == single.tokens[token]["balances"] for token in batch.tokens)
+    print(f"{count:,} moves  batchTransfer: {batch_seconds * 1e3:.1f} ms ({count / batch_seconds:,.0f} moves/s)   "
+          f"transferFrom each: {single_seconds * 1e3:.1f} ms ({count / single_seconds:,.0f} moves/s)   same ledger: {same}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Airdrop and batched transfer throughput")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma separated airdrop sizes")
+    parser.add_argument("--moves", type=int, default=100000, help="Moves in the batchTransfer benchmark")
+    args = parser.parse_args()
+    for size in args.sizes.split(","):
+        bench_airdrop(int(size))
+    bench_batch_transfer(args.moves)
@@ -0,0 +1,152 @@
+# File name: bench_apiserver.py
+
+# Load test: requests/sec of the JSON API server, read endpoints and trade endpoints measured separately
+# Every client thread keeps one HTTP/1.1 keep-alive connection. The trade phase is run twice: one request per trade,
+# and /batch with --batch trades per request (throughput counted in trades/sec).
+# By default the server runs in this process on a free port, the clients then share its GIL, so the numbers are a
+# lower bound. Start `python apiserver.py` separately and pass --url to measure it on its own.
+# Run: python bench_apiserver.py [--seconds S] [--clients C] [--workers W] [--batch B] [--url http://host:port]
+
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlencode, urlparse
+from apiserver import PooledWSGIServer, SwapApi, create_app, create_default_hub
+
+USDT = "0xUSDToken"
+
+
+class Client:
+    """
+    One keep-alive connection
+    """
+
+    def __init__(self, host, port):
+        self.connection = http.client.HTTPConnection(host, port, timeout=30)
+
+    def get(self, path, query=None):
+        return self.request("GET", path + ("?" + urlencode(query) if query else ""), None)
+
+    def post(self, path, body):
+        return self.request("POST", path, json.dumps(body))
+
+    def request(self, method, path, body):
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        data = response.read()
+        return response.status, json.loads(data) if data else None
+
+    def close(self):
+        self.connection.close()
+
+
+def read_request(client, trader, count):
+    kind = count % 3
+    if kind == 0:
+        return client.get("/get_current_price")
+    if kind == 1:
+        return client.get("/balance_of", {"token": USDT, "addr": trader})
+    return client.get("/debug_price")
+
+
+def trade_body(trader, count):
+    # Alternate a small buy and a slightly smaller sell, so the price stays in place and every trade can commit
+    if count % 2 == 0:
+        return "/mint_usdt", {"addr": trader, "usdt_amount": 10}
+    return "/burn", {"addr": trader, "mtk_amount": 90}
+
+
+def trade_request(client, trader, count):
+    path, body = trade_body(trader, count)
+    return client.post(path, body)
+
+
+def batch_request(batch_size):
+    def run(client, trader, count):
+        requests = []
+        for i in range(batch_size):
+            path, body = trade_body(trader, count * batch_size + i)
+            requests.append({"method": "POST", "path": path, "body": body})
+        status, body = client.post("/batch", {"requests": requests})
+        ok = status == 200 and all(response["status"] == 200 and response["body"]["success"] for response in body["responses"])
+        return (200 if ok else 500), body
+    return run
+
+
+def run_phase(name, host, port, clients, seconds, make_request, ops_per_request=1):
+    latencies = [[] for _ in range(clients)]
+    errors = [0] * clients
+    stop = threading.Event()
+
+    def worker(index):
+        client = Client(host, port)
+        trader = f"0xApiTrader{index}"
+        count = 0
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                status, body = make_request(client, trader, count)
+                latencies[index].append(time.perf_counter() - start)
+                if status != 200 or (isinstance(body, dict) and body.get("success") is False):
+                    errors[index] += 1
+                count += 1
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    values = sorted(value for values in latencies for value in values)
+    requests = len(values)
+    p50 = values[len(values) // 2] * 1e3 if values else 0.0
+    p99 = values[min(len(values) - 1, int(len(values) * 0.99))] * 1e3 if values else 0.0
+    print(f"{name:<22}{requests:>10}{requests / elapsed:>12,.0f}{requests * ops_per_request / elapsed:>12,.0f}"
+          f"{p50:>10.2f}{p99:>10.2f}{sum(errors):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON API server load test")
+    parser.add_argument("--seconds", type=float, default=5, help="Duration of each phase")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent keep-alive connections")
+    parser.add_argument("--workers", type=int, default=32, help="Server worker threads (in-process server only)")
+    parser.add_argument("--batch", type=int, default=50, help="Trades per /batch request")
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        url = urlparse(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        server = PooledWSGIServer("127.0.0.1", 0, create_app(SwapApi(create_default_hub())), workers=args.workers)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = "127.0.0.1", server.port
+
+    setup = Client(host, port)
+    for i in range(args.clients):
+        setup.post("/airdropTokens", {"token": USDT, "addr": f"0xApiTrader{i}", "amount": 10**9})
+    setup.close()
+
+    print(f"{args.clients} clients, {args.seconds:g}s per phase" + ("" if args.url else f", in-process server with {args.workers} workers"))
+    print(f"{'phase':<22}{'requests':>10}{'req/s':>12}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    run_phase("read", host, port, args.clients, args.seconds, read_request)
+    run_phase("trade", host, port, args.clients, args.seconds, trade_request)
+    run_phase(f"trade /batch x{args.batch}", host, port, args.clients, args.seconds, batch_request(args.batch), args.batch)
+
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
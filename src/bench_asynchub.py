@@ -0,0 +1,89 @@
+# File name: bench_asynchub.py
+
+# Benchmark: trade throughput and latency through the AsyncSwapHub single-writer queue vs threads calling SwapHub
+# The thread case is how Gradio workers trade today: every thread contends for the hub write lock.
+# The async case keeps --inflight trades in flight from one event loop with no thread per request.
+# Run: python bench_asynchub.py [--trades N] [--threads T] [--inflight I]
+
+import argparse
+import asyncio
+import threading
+import time
+from asynchub import AsyncSwapHub
+from bench_swaphub_concurrency import create_hub
+
+
+def trade_args(i):
+    # Alternate a small buy and a slightly smaller sell, so the price stays in place and every trade commits
+    return ("buy", ("0xBenchTrader", 10)) if i % 2 == 0 else ("sell", ("0xBenchTrader", 90))
+
+
+def report(name, latencies, elapsed, failures):
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1e3
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3
+    print(f"{name:<28}{len(latencies) / elapsed:>12,.0f}{p50:>10.2f}{p99:>10.2f}{failures:>10}")
+
+
+def run_threads(trades, threads):
+    hub = create_hub()
+    latencies = []
+    failures = [0]
+    counter = iter(range(trades))
+    counter_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            op, args = trade_args(i)
+            start = time.perf_counter()
+            success, _message = getattr(hub, op)(*args)
+            latencies.append(time.perf_counter() - start)
+            failures[0] += not success
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    report(f"threads x{threads}", latencies, time.perf_counter() - start, failures[0])
+
+
+async def run_async(trades, inflight):
+    async_hub = AsyncSwapHub(create_hub())
+    await async_hub.start()
+    latencies = []
+    failures = 0
+    semaphore = asyncio.Semaphore(inflight)
+
+    async def trade(i):
+        nonlocal failures
+        async with semaphore:
+            op, args = trade_args(i)
+            start = time.perf_counter()
+            success, _message = await async_hub.submit(op, *args)
+            latencies.append(time.perf_counter() - start)
+            failures += not success
+
+    start = time.perf_counter()
+    await asyncio.gather(*(trade(i) for i in range(trades)))
+    elapsed = time.perf_counter() - start
+    await async_hub.close()
+    report(f"asyncio, {inflight} in flight", latencies, elapsed, failures)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="AsyncSwapHub vs threaded SwapHub trade benchmark")
+    parser.add_argument("--trades", type=int, default=50000, help="Number of trades per case")
+    parser.add_argument("--threads", type=int, default=64, help="Trader threads in the threaded case")
+    parser.add_argument("--inflight", type=int, default=5000, help="Concurrent trades in the asyncio case")
+    args = parser.parse_args()
+    print(f"{'case':<28}{'trades/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'failed':>10}")
+    run_threads(args.trades, args.threads)
+    # Same concurrency as the threads, then many more in flight (latency grows with queue depth: depth / throughput)
+    asyncio.run(run_async(args.trades, args.threads))
+    asyncio.run(run_async(args.trades, args.inflight))
@@ -0,0 +1,167 @@
+# File name: bench_fixedpoint.py
+
+# Benchmark: fixed point (18-decimal integer) pools vs float pools
+# 1. Per-call cost of the swap_utils functions against their swap_utils_fixed versions.
+# 2. The same seeded workload (spot trades, short/long opens, partial and full closes, third-party liquidations)
+#    through a SwapHub on a float pool and on a fixed point pool. After the workload it checks:
+#    - the ledger: do the balances of each token still add up to its total supply?
+#    - the loan book: are the loan reserves plus the amounts lent to open orders still the initial loan reserves?
+#    The fixed point run is repeated to check that it ends in the same state (digest).
+# Run: python bench_fixedpoint.py [--ops N] [--seed S] [--calls C]
+
+import argparse
+import random
+import time
+import swap_utils
+import swap_utils_fixed
+from swap_utils_fixed import WAD, to_units
+from erc20factory import erc20_factory_instance
+from shortswapv1factory import ShortSwapV1Factory
+from swaphub import SwapHub
+from bench_swaphub import state_digest
+
+SWAP_FUNCTIONS = ("get_amount_out_reserve0_to_reserve1", "get_amount_out_reserve1_to_reserve0",
+                  "get_amount_in_reserve1_for_amount0_out", "get_amount_in_reserve0_for_amount1_out")
+
+
+def bench_functions(calls):
+    rng = random.Random(7)
+    rows = [(rng.uniform(1, 1e4), rng.uniform(5e5, 2e6), rng.uniform(5e4, 2e5)) for _ in range(calls)]
+    fixed_rows = [tuple(to_units(value) for value in row) for row in rows]
+    for name in SWAP_FUNCTIONS:
+        timings = []
+        for module, args, fee in ((swap_utils, rows, 0.997), (swap_utils_fixed, fixed_rows, swap_utils_fixed.FEE)):
+            function = getattr(module, name)
+            start = time.perf_counter()
+            for amount, reserve0, reserve1 in args:
+                function(amount, reserve0, reserve1, fee)
+            timings.append((time.perf_counter() - start) / calls)
+        print(f"{name:40s} float {timings[0] * 1e6:6.2f} us   fixed {timings[1] * 1e6:6.2f} us   ({timings[1] / timings[0]:.1f}x)")
+
+
+def create_hub(fixed, traders):
+    random.seed(0)  # Same token and pool addresses in every run
+    erc20_factory_instance.tokens.clear()
+    units = to_units if fixed else (lambda amount: amount)
+    factory = ShortSwapV1Factory()
+    pool_address = factory.createPool(
+        address="0xBenchOwner", name="TestToken", symbol="TTK", decimals=18,
+        totalSupply=1500000, shortSupply=500000, tokenBase="0xUSDToken", tokenBaseAmount=100000, fixedPoint=fixed
+    )
+    pool = factory.getPool(pool_address)
+    pool.lendingSecondLimit = -1  # Every order may be liquidated by a third party as soon as it is open
+    erc20_factory_instance.createErc20Test("0xBenchOwner", "BaseToken", "USDT", 18, units(100000), "0xUSDToken")
+    recipients = {pool.poolAddress: units(1)}
+    recipients.update({trader: units(1000000) for trader in traders})
+    erc20_factory_instance.airdrop(pool.token1, recipients)
+    return SwapHub(pool)
+
+
+class Workload:
+    """
+    Seeded workload in token amounts, converted to the pool's units (every random choice comes from one
+    random.Random(seed), so both modes make the same choices while their results agree)
+    """
+
+    def __init__(self, hub, traders, seed):
+        self.hub = hub
+        self.pool = hub.pool
+        self.traders = traders
+        self.rng = random.Random(seed)
+        self.fixed = hub.pool.fixedPoint
+
+    def units(self, amount):
+        return to_units(amount) if self.fixed else amount
+
+    def scale(self, amount, ratio):
+        # amount * ratio in the pool's units
+        return amount * to_units(ratio) // WAD if self.fixed else amount * ratio
+
+    def next_op(self):
+        """
+        :return: (hub method, args)
+        """
+        rng, pool = self.rng, self.pool
+        trader = rng.choice(self.traders)
+        kind = rng.choices(("buy", "sell", "short", "long", "partial", "full", "third"), (25, 25, 12, 12, 8, 10, 8))[0]
+        if kind == "buy":
+            return self.hub.buy, (trader, self.units(rng.uniform(1, 500)))
+        if kind == "sell":
+            return self.hub.sell, (trader, self.units(rng.uniform(10, 5000)))
+        lev_mult = rng.choice((2, 3, 4, 5))
+        base_amount = rng.uniform(10, 200)
+        price = pool.getPrice()
+        if kind == "short":
+            if self.fixed:
+                lend_amount0 = to_units(base_amount * lev_mult) * WAD // price
+            else:
+                lend_amount0 = base_amount * lev_mult / price
+            return self.hub.short_open, (trader, self.units(base_amount), lend_amount0, self.scale(price, 1 + 0.5 / lev_mult), "")
+        if kind == "long":
+            return self.hub.long_open, (trader, self.units(base_amount), self.units(base_amount * (lev_mult - 1)), self.scale(price, 1 - 0.5 / lev_mult), "")
+        if kind == "third":
+            order_id = pool.nearShortNode if rng.random() < 0.5 else pool.nearLongNode
+            if not order_id:
+                return self.hub.buy, (trader, self.units(1))
+            return self._close(trader, order_id, 1.0, True)
+        order_ids = pool.getOrderIDsByAddress(trader)
+        if not order_ids:
+            return self.hub.sell, (trader, self.units(10))
+        return self._close(trader, order_ids[int(rng.random() * len(order_ids))], rng.uniform(0.2, 0.8) if kind == "partial" else 1.0, False)
+
+    def _close(self, trader, order_id, fraction, third_party):
+        order = self.pool.getOrderByID(order_id)
+        if order['orderType'] == "short":
+            amount = order['lendAmount0'] if fraction == 1.0 else self.scale(order['lendAmount0'], fraction)
+            return self.hub.short_close, (trader, order_id, amount, third_party)
+        amount = order['buy_amount0'] if fraction == 1.0 else self.scale(order['buy_amount0'], fraction)
+        return self.hub.long_close, (trader, order_id, amount, third_party)
+
+
+def run_workload(fixed, ops, seed):
+    traders = [f"0xTrader{i}" for i in range(20)]
+    hub = create_hub(fixed, traders)
+    pool = hub.pool
+    short_supply, loan_reserve1 = pool.loanReserve0, pool.loanReserve1
+    workload = Workload(hub, traders, seed)
+    accepted = 0
+    seconds = 0.0
+    for _ in range(ops):
+        method, args = workload.next_op()
+        start = time.perf_counter()
+        success, _ = method(*args)
+        seconds += time.perf_counter() - start
+        accepted += bool(success)
+
+    scale = WAD if fixed else 1
+    ledger_error = max(abs(sum(token["balances"].values()) - token["totalSupply"]) for token in erc20_factory_instance.tokens.values())
+    loan_error0 = pool.loanReserve0 + sum(order['lendAmount0'] for order in pool.orderShortMap.values()) - short_supply
+    loan_error1 = pool.loanReserve1 + sum(order['lendAmount1'] for order in pool.orderLongMap.values()) - loan_reserve1
+    return {
+        "accepted": accepted, "seconds": seconds, "digest": state_digest(hub),
+        "open": len(pool.orderShortMap) + len(pool.orderLongMap),
+        "ledger_error": ledger_error / scale, "loan_error": (abs(loan_error0) + abs(loan_error1)) / scale,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fixed point vs float pool math")
+    parser.add_argument("--ops", type=int, default=20000, help="Operations in the workload")
+    parser.add_argument("--seed", type=int, default=1, help="Workload seed")
+    parser.add_argument("--calls", type=int, default=100000, help="Calls per swap function")
+    args = parser.parse_args()
+
+    bench_functions(args.calls)
+    clock = time.time
+    time.time = lambda: 1.7e9  # Same operation time in every run
+    try:
+        results = {"float": run_workload(False, args.ops, args.seed), "fixed": run_workload(True, args.ops, args.seed)}
+        repeat_digest = run_workload(True, args.ops, args.seed)["digest"]
+    finally:
+        time.time = clock
+    for mode, result in results.items():
+        print(f"{mode:5s} pool: {args.ops / result['seconds']:>8,.0f} ops/s ({result['seconds'] / args.ops * 1e6:.1f} us/op), "
+              f"{result['accepted']} accepted, {result['open']} open orders, ledger error {result['ledger_error']:.3g} tokens, "
+              f"loan book error {result['loan_error']:.3g} tokens")
+    print(f"fixed point cost: {results['fixed']['seconds'] / results['float']['seconds']:.2f}x the float time, "
+          f"same state when repeated: {results['fixed']['digest'] == repeat_digest}")
@@ -0,0 +1,88 @@
+# File name: bench_ledger.py
+
+# Benchmark: concurrent ledger transfers from many threads, alongside spot trades on the pool of the same tokens
+# Every thread moves random amounts between random holders of several tokens with explicit senders
+# (erc20.transferFrom); one more thread trades through the SwapHub. At the end the script checks that no transfer was
+# lost or duplicated: the balances of every token still add up to its total supply, and exits non-zero if they do not.
+# Run: python bench_ledger.py [--threads N] [--transfers T] [--tokens K] [--holders H]
+
+import argparse
+import random
+import sys
+import threading
+import time
+from erc20factory import erc20_factory_instance
+from bench_swaphub import create_hub
+
+
+def transfer_worker(tokens, holders, count, seed, accepted):
+    rng = random.Random(seed)
+    done = 0
+    for _ in range(count):
+        token = rng.choice(tokens)
+        from_address, to = rng.sample(holders, 2)
+        success, _ = erc20_factory_instance.transferFrom(token, from_address, to, rng.uniform(1, 100))
+        done += success
+    accepted.append(done)
+
+
+def trade_worker(hub, traders, count, seed, accepted):
+    rng = random.Random(seed)
+    done = 0
+    for i in range(count):
+        trader = rng.choice(traders)
+        if i % 2 == 0:
+            success, _ = hub.buy(trader, rng.uniform(1, 50))
+        else:
+            success, _ = hub.sell(trader, rng.uniform(10, 450))
+        done += success
+    accepted.append(done)
+
+
+def conserved(tokens):
+    for token in tokens:
+        info = erc20_factory_instance.tokens[token]
+        if abs(sum(info["balances"].values()) - info["totalSupply"]) > 1e-6 * info["totalSupply"]:
+            return False
+    return True
+
+
+def run(thread_count, transfers, token_count, holder_count):
+    holders = [f"0xHolder{i}" for i in range(holder_count)]
+    traders = holders[:20]
+    hub = create_hub(traders)
+    pool = hub.pool
+    tokens = [pool.token0, pool.token1]
+    for i in range(token_count - 2):
+        tokens.append(erc20_factory_instance.createErc20("0xBenchOwner", f"Token{i}", f"TK{i}", 18, 1000000))
+    for token in tokens:
+        erc20_factory_instance.airdrop(token, {holder: 1000000 for holder in holders})
+
+    accepted = []
+    threads = [threading.Thread(target=transfer_worker, args=(tokens, holders, transfers, seed, accepted))
+               for seed in range(thread_count)]
+    threads.append(threading.Thread(target=trade_worker, args=(hub, traders, transfers, thread_count, accepted)))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    total = transfers * len(threads)
+    print(f"{thread_count} transfer threads + 1 trading thread, {len(tokens)} tokens, {holder_count} holders")
+    print(f"{total} operations ({sum(accepted)} accepted) in {seconds:.2f}s: {total / seconds:,.0f} ops/s")
+    ok = conserved(tokens)
+    print(f"balances add up to total supply: {ok}")
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Concurrent ledger transfers and pool trades")
+    parser.add_argument("--threads", type=int, default=8, help="Number of transfer threads")
+    parser.add_argument("--transfers", type=int, default=20000, help="Operations per thread")
+    parser.add_argument("--tokens", type=int, default=6, help="Number of tokens, including the two pool tokens")
+    parser.add_argument("--holders", type=int, default=100, help="Number of holder addresses")
+    args = parser.parse_args()
+    if not run(args.threads, args.transfers, args.tokens, args.holders):
+        sys.exit("Total supply not conserved: concurrent transfers were lost or duplicated")
@@ -0,0 +1,67 @@
+# File name: bench_orderrecord.py
+
+# Benchmark: memory and field access cost of closed orders stored as dicts vs OrderRecord
+# Closed orders stay in addressHistoryMap forever, so this is the dominant per-order footprint
+# Run: python bench_orderrecord.py [max_orders]
+
+import sys
+import time
+import tracemalloc
+from orderrecord import OrderRecord
+
+
+def closed_short_order(i):
+    # Same fields shortOpen writes, plus the closing data added by shortClose
+    return {
+        'orderID': "short" + str(i),
+        'hightPrice': 0.12 + i * 1e-9,
+        'lowPrice': 0.11 + i * 1e-9,
+        'address': "0xTrader" + str(i % 1000),
+        'hightNode': "short" + str(i + 1),
+        'lowNode': "short" + str(i - 1),
+        'orderType': "short",
+        'baseAmount1': 100.0 + i,
+        'sell_amount1': 199.4 + i,
+        'lendAmount0': 2000.0 + i,
+        'forcedClosePrice': 0.115 + i * 1e-9,
+        'loan_fee': 0.2 + i * 1e-6,
+        'loan_day_fee': 0.1 + i * 1e-6,
+        'third_fee': 1.3 + i * 1e-6,
+        'loan_time': 1718000000 + i,
+        'openPrice': 0.1 + i * 1e-9,
+        'insterOrderID': "",
+        'closePrice': 0.1 + i * 2e-9,
+        'closeTimestamp': 1718003600 + i,
+        'closeType': "User active liquidation",
+        'profitLoss': -1.5 + i * 1e-6,
+        'petLoss': -0.015 + i * 1e-8,
+    }
+
+
+def measure(count, make_record):
+    # Build the raw field values outside the measured region, only the containers are counted
+    sources = [closed_short_order(i) for i in range(count)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = [make_record(source) for source in sources]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    total = 0.0
+    for record in records:
+        total += record['loan_fee'] + record['loan_day_fee'] + record['third_fee']
+    access_ns = (time.perf_counter() - start) / (count * 3) * 1e9
+    return used, access_ns
+
+
+if __name__ == '__main__':
+    max_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print(f"{'orders':>10}{'dict MB':>10}{'record MB':>11}{'saved':>8}{'dict ns':>9}{'record ns':>11}")
+    for count in (10000, 100000, 1000000):
+        if count > max_orders:
+            break
+        dict_bytes, dict_ns = measure(count, dict)
+        record_bytes, record_ns = measure(count, OrderRecord)
+        saved = 1 - record_bytes / dict_bytes
+        print(f"{count:>10,}{dict_bytes / 2**20:>10.1f}{record_bytes / 2**20:>11.1f}{saved:>8.0%}{dict_ns:>9.0f}{record_ns:>11.0f}")
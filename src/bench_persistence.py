@@ -0,0 +1,75 @@
+# File name: bench_persistence.py
+
+# Benchmark: write-ahead log throughput per fsync policy, and recovery time after N logged operations
+# Each case runs in a fresh process because the token ledger is the global erc20_factory_instance
+# Run: python bench_persistence.py [operations] [checkpoint_interval]
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from erc20factory import erc20_factory_instance
+from persistence import Persistence
+from shortswapv1factory import ShortSwapV1Factory
+from swaphub import SwapHub
+
+
+def write_case(directory, fsync, operations, checkpoint_interval):
+    persistence = Persistence(directory, fsync=fsync, checkpoint_interval=checkpoint_interval)
+    factory = ShortSwapV1Factory()
+    pool_address = factory.createPool(
+        address="0xBenchOwner", name="TestToken", symbol="TTK", decimals=18,
+        totalSupply=1500000, shortSupply=500000, tokenBase="0xUSDToken", tokenBaseAmount=100000
+    )
+    erc20_factory_instance.createErc20Test("0xBenchOwner", "BaseToken", "USDT", 18, 100000, "0xUSDToken")
+    erc20_factory_instance.airdrop("0xUSDToken", {pool_address: 1, "0xBenchTrader": 10**9})
+    persistence.attach(factory)
+    hub = SwapHub(factory.getPool(pool_address), journal=persistence)
+
+    start = time.perf_counter()
+    for i in range(operations):
+        if i % 2 == 0:
+            hub.buy("0xBenchTrader", 10)
+        else:
+            hub.sell("0xBenchTrader", 90)
+    elapsed = time.perf_counter() - start
+    persistence.close()
+    return operations / elapsed
+
+
+def recover_case(directory):
+    persistence = Persistence(directory)
+    start = time.perf_counter()
+    persistence.recover()
+    return time.perf_counter() - start, persistence.seq, persistence.records_since_checkpoint
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] in ("--write", "--recover"):
+        directory = sys.argv[2]
+        if sys.argv[1] == "--write":
+            print(write_case(directory, sys.argv[3], int(sys.argv[4]), int(sys.argv[5])))
+        else:
+            print(*recover_case(directory))
+        sys.exit(0)
+
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    checkpoint_interval = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+
+    def run(*args):
+        return subprocess.run([sys.executable, __file__, *map(str, args)], capture_output=True, text=True, check=True).stdout.split()
+
+    print(f"{'fsync':<10}{'operations':>12}{'ops/s':>12}")
+    for fsync, count in (("always", min(operations, 5000)), ("interval", min(operations, 50000)), ("off", min(operations, 50000))):
+        with tempfile.TemporaryDirectory() as directory:
+            ops_per_second = float(run("--write", directory, fsync, count, checkpoint_interval)[0])
+        print(f"{fsync:<10}{count:>12,}{ops_per_second:>12,.0f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        # One operation short of a checkpoint, the worst case: the longest possible log tail has to be replayed
+        run("--write", directory, "off", operations - 1, checkpoint_interval)
+        seconds, seq, replayed = run("--recover", directory)
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    print(f"recovery after {int(seq):,} logged operations: {float(seconds):.2f}s "
+          f"(snapshot + {int(replayed):,} replayed records, {size / 2**20:.1f} MB on disk)")
@@ -0,0 +1,82 @@
+# File name: bench_shards.py
+
+# Benchmark: aggregate spot trade throughput of pools spread over worker processes (poolshards.ShardedFactory)
+# The same seeded trades on --pools pools run with 1, 2, 4, ... workers (up to --workers), sent with call_many in
+# batches. Each pool gets the same trades in the same order in every run, so every run must accept the same trades.
+# After each run the settlement invariant is checked and every trader withdraws back to the home ledger.
+# Scaling needs free cores: with fewer CPUs than workers the runs share them and throughput stays flat.
+# Run: python bench_shards.py [--pools P] [--workers W] [--ops N] [--batch B]
+
+import argparse
+import os
+import random
+import time
+from erc20factory import erc20_factory_instance
+from poolshards import ShardedFactory
+
+BASE_TOKEN = "0xUSDToken"
+DEPOSIT = 1000000
+
+
+def trades(pool_count, traders, count, seed):
+    rng = random.Random(seed)
+    ops = []
+    for i in range(count):
+        pool = rng.randrange(pool_count)
+        trader = rng.choice(traders)
+        if i % 2 == 0:
+            ops.append((pool, "buy", (trader, rng.uniform(1, 50))))
+        else:
+            ops.append((pool, "sell", (trader, rng.uniform(10, 450))))
+    return ops
+
+
+def run(workers, pool_count, traders, ops, batch_size):
+    erc20_factory_instance.tokens.clear()
+    erc20_factory_instance.createErc20Test("0xBenchOwner", "BaseToken", "USDT", 18, DEPOSIT * (len(traders) + 1) * pool_count, BASE_TOKEN)
+    erc20_factory_instance.airdrop(BASE_TOKEN, {trader: DEPOSIT * pool_count for trader in traders})
+    with ShardedFactory(workers) as factory:
+        pools = [factory.createPool(address="0xBenchOwner", name=f"Token{i}", symbol=f"TK{i}", decimals=18, totalSupply=1500000,
+                                    shortSupply=500000, tokenBase=BASE_TOKEN, tokenBaseAmount=100000) for i in range(pool_count)]
+        for pool_address in pools:
+            factory.deposit(pool_address, BASE_TOKEN, "0xBenchOwner", 1)
+            for trader in traders:
+                # Traders of pools on the same worker share one balance there, DEPOSIT per pool is never used up
+                factory.deposit(pool_address, BASE_TOKEN, trader, DEPOSIT)
+
+        calls = [(pools[pool], op, args) for pool, op, args in ops]
+        start = time.perf_counter()
+        results = []
+        for begin in range(0, len(calls), batch_size):
+            results.extend(factory.call_many(calls[begin:begin + batch_size]))
+        seconds = time.perf_counter() - start
+
+        settled = not factory.verify_settlement()
+        for trader in traders:
+            for pool_address in pools:
+                balance = factory.balanceOf(pool_address, BASE_TOKEN, trader)
+                if balance > 0:
+                    factory.withdraw(pool_address, BASE_TOKEN, trader, balance)
+        settled = settled and not factory.verify_settlement()
+    return [result[0] for result in results], seconds, settled
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sharded pool throughput")
+    parser.add_argument("--pools", type=int, default=8, help="Number of pools")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Most worker processes")
+    parser.add_argument("--ops", type=int, default=40000, help="Trades per run")
+    parser.add_argument("--batch", type=int, default=1000, help="Trades per call_many")
+    args = parser.parse_args()
+
+    traders = [f"0xTrader{i}" for i in range(20)]
+    ops = trades(args.pools, traders, args.ops, seed=1)
+    print(f"{args.pools} pools, {args.ops} spot trades in batches of {args.batch}, {os.cpu_count()} CPUs")
+    counts = sorted({1, args.workers} | {2 ** i for i in range(1, args.workers.bit_length()) if 2 ** i < args.workers})
+    baseline = None
+    for workers in counts:
+        accepted, seconds, settled = run(workers, args.pools, traders, ops, args.batch)
+        if baseline is None:
+            baseline = (accepted, seconds)
+        print(f"{workers:>2} workers: {args.ops / seconds:>9,.0f} trades/s  speedup {baseline[1] / seconds:4.2f}x  "
+              f"{sum(accepted)} accepted, same results as 1 worker: {accepted == baseline[0]}, settlement consistent: {settled}")
@@ -0,0 +1,69 @@
+# File name: bench_submitbatch.py
+
+# Benchmark: spot trade throughput of SwapHub.submit_batch vs the same trades as sequential SwapHub calls
+# Both cases start from the same state and run the same buys and sells; the script checks that every trade gets the
+# same accept/reject result and that the pools end in the same state.
+# Run: python bench_submitbatch.py [--batch N] [--rounds R] [--traders T]
+
+import argparse
+import random
+import time
+import erc20factory
+from bench_swaphub import create_hub, state_digest
+
+
+def spot_trades(count, traders, seed):
+    rng = random.Random(seed)
+    trades = []
+    for i in range(count):
+        trader = rng.choice(traders)
+        if i % 2 == 0:
+            trades.append((trader, "buy", (rng.uniform(1, 50),)))
+        else:
+            trades.append((trader, "sell", (rng.uniform(10, 450),)))
+    return trades
+
+
+def fresh_hub(traders):
+    random.seed(0)  # Same token and pool addresses for both cases
+    erc20factory.erc20_factory_instance.tokens.clear()
+    return create_hub(traders)
+
+
+def run(batch_size, rounds, trader_count):
+    traders = [f"0xTrader{i}" for i in range(trader_count)]
+    batches = [spot_trades(batch_size, traders, seed) for seed in range(rounds)]
+    clock = time.time
+    time.time = lambda: 1.7e9  # Same operation time in both cases, so the final states can be compared
+
+    try:
+        hub = fresh_hub(traders)
+        start = time.perf_counter()
+        sequential = [getattr(hub, op)(trader, *args) for batch in batches for trader, op, args in batch]
+        sequential_seconds = time.perf_counter() - start
+        sequential_digest = state_digest(hub)
+
+        hub = fresh_hub(traders)
+        start = time.perf_counter()
+        batched = [result for batch in batches for result in hub.submit_batch(batch)]
+        batched_seconds = time.perf_counter() - start
+        batched_digest = state_digest(hub)
+    finally:
+        time.time = clock
+
+    trades = batch_size * rounds
+    print(f"{rounds} batches of {batch_size} spot trades, {sum(result[0] for result in batched)} accepted")
+    print(f"sequential calls: {trades / sequential_seconds:>10,.0f} trades/s  ({sequential_seconds / trades * 1e6:.1f} us/trade)")
+    print(f"submit_batch:     {trades / batched_seconds:>10,.0f} trades/s  ({batched_seconds / trades * 1e6:.1f} us/trade)")
+    print(f"speedup: {sequential_seconds / batched_seconds:.1f}x")
+    same_results = [result[0] for result in sequential] == [result[0] for result in batched]
+    print(f"same accept/reject results: {same_results}, same final state: {sequential_digest == batched_digest}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="submit_batch vs sequential spot trades")
+    parser.add_argument("--batch", type=int, default=1000, help="Trades per batch")
+    parser.add_argument("--rounds", type=int, default=20, help="Number of batches")
+    parser.add_argument("--traders", type=int, default=50, help="Number of trader addresses")
+    args = parser.parse_args()
+    run(args.batch, args.rounds, args.traders)
@@ -0,0 +1,57 @@
+# File name: bench_swap_utils.py
+
+# Benchmark: scalar swap_utils quotes in a Python loop vs swap_utils_batch quotes in one call
+# Run: python bench_swap_utils.py [number_of_quotes]
+
+import sys
+import time
+import numpy as np
+from swap_utils import get_amount_out_reserve0_to_reserve1, get_amount_out_reserve1_to_reserve0, get_amount_in_reserve1_for_amount0_out, get_amount_in_reserve0_for_amount1_out, get_reserves_at_price
+from swap_utils_batch import batch_get_amount_out_reserve0_to_reserve1, batch_get_amount_out_reserve1_to_reserve0, batch_get_amount_in_reserve1_for_amount0_out, batch_get_amount_in_reserve0_for_amount1_out, batch_get_reserves_at_price
+
+
+def make_inputs(n, seed=7):
+    rng = np.random.default_rng(seed)
+    reserve0 = rng.uniform(5e5, 2e6, n)
+    reserve1 = rng.uniform(5e4, 2e5, n)
+    amounts = rng.uniform(1, 1e4, n)
+    prices = (reserve1 / reserve0) * rng.uniform(0.5, 1.5, n)
+    return amounts, reserve0, reserve1, prices
+
+
+def run_case(name, scalar_fn, batch_fn, args):
+    columns = [column.tolist() for column in args]
+    start = time.perf_counter()
+    scalar_results = [scalar_fn(*row) for row in zip(*columns)]
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_results = batch_fn(*args)
+    batch_time = time.perf_counter() - start
+
+    # Results must match the scalar functions bit-for-bit
+    expected = np.array(scalar_results, dtype=np.float64)
+    if isinstance(batch_results, tuple):
+        actual = np.column_stack(batch_results)
+    else:
+        actual = np.asarray(batch_results)
+    identical = np.array_equal(expected.view(np.int64), actual.view(np.int64))
+
+    n = len(columns[0])
+    print(f"{name:<42} scalar: {n / scalar_time:>12,.0f} quotes/s  batch: {n / batch_time:>14,.0f} quotes/s  speedup: {scalar_time / batch_time:>7.1f}x  bit-identical: {identical}")
+    return identical
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    amounts, reserve0, reserve1, prices = make_inputs(n)
+    print(f"Quotes per case: {n:,}")
+    all_identical = all([
+        run_case("get_amount_out_reserve0_to_reserve1", get_amount_out_reserve0_to_reserve1, batch_get_amount_out_reserve0_to_reserve1, (amounts, reserve0, reserve1)),
+        run_case("get_amount_out_reserve1_to_reserve0", get_amount_out_reserve1_to_reserve0, batch_get_amount_out_reserve1_to_reserve0, (amounts, reserve0, reserve1)),
+        run_case("get_amount_in_reserve1_for_amount0_out", get_amount_in_reserve1_for_amount0_out, batch_get_amount_in_reserve1_for_amount0_out, (amounts, reserve0, reserve1)),
+        run_case("get_amount_in_reserve0_for_amount1_out", get_amount_in_reserve0_for_amount1_out, batch_get_amount_in_reserve0_for_amount1_out, (amounts, reserve0, reserve1)),
+        run_case("get_reserves_at_price", get_reserves_at_price, batch_get_reserves_at_price, (prices, reserve0, reserve1)),
+    ])
+    if not all_identical:
+        sys.exit("Batch results differ from scalar results")
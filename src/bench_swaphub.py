@@ -0,0 +1,295 @@
+# File name: bench_swaphub.py
+
+# Benchmark: seeded, reproducible trading workload driven through SwapHub
+# Mixes buys, sells, fast short/long opens, partial and full closes and third-party liquidations, and reports
+# throughput, accepted operations and p50/p99 latency per operation type, peak memory and a digest of the final state.
+# The same seed always produces the same operations and the same digest, so two builds can be compared run to run.
+# A partial close is only accepted when closing the whole order would move the price more than forceMoveRate. The
+# positions of the mixed workload are far too small for that, so its partial closes are all rejected, and a second
+# phase on a pool of its own times accepted partial closes of positions opened close to the single trade limit.
+# Run: python bench_swaphub.py [--ops N] [--seed S] [--traders T] [--partial-rounds R] [--tracemalloc]
+
+import argparse
+import hashlib
+import random
+import sys
+import time
+import tracemalloc
+from erc20factory import erc20_factory_instance
+from shortswapv1factory import ShortSwapV1Factory
+from swaphub import SwapHub
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Relative weight of each operation type in the workload
+WORKLOAD_MIX = {
+    "buy": 25,
+    "sell": 25,
+    "short_open": 12,
+    "long_open": 12,
+    "partial_close": 8,
+    "full_close": 10,
+    "third_party_close": 8,
+}
+
+
+def create_hub(traders):
+    factory = ShortSwapV1Factory()
+    pool_address = factory.createPool(
+        address="0xBenchOwner", name="TestToken", symbol="TTK", decimals=18,
+        totalSupply=1500000, shortSupply=500000, tokenBase="0xUSDToken", tokenBaseAmount=100000
+    )
+    pool = factory.getPool(pool_address)
+    # Every order may be liquidated by a third party as soon as it is open, so liquidations do not depend on the clock
+    pool.lendingSecondLimit = -1
+    erc20_factory_instance.createErc20Test("0xBenchOwner", "BaseToken", "USDT", 18, 100000, "0xUSDToken")
+    recipients = {pool.poolAddress: 1}
+    recipients.update({trader: 1000000 for trader in traders})
+    erc20_factory_instance.airdrop(pool.token1, recipients)
+    return SwapHub(pool)
+
+
+class Workload:
+    """
+    Seeded operation generator, every random choice comes from one random.Random(seed)
+    """
+
+    def __init__(self, hub, traders, seed):
+        self.hub = hub
+        self.traders = traders
+        self.rng = random.Random(seed)
+        self.op_types = list(WORKLOAD_MIX)
+        self.weights = list(WORKLOAD_MIX.values())
+
+    def next_op(self):
+        """
+        :return: (operation type, callable running it through the hub)
+        """
+        op_type = self.rng.choices(self.op_types, self.weights)[0]
+        trader = self.rng.choice(self.traders)
+        return op_type, getattr(self, op_type)(trader)
+
+    def buy(self, trader):
+        amount1 = self.rng.uniform(1, 500)
+        return lambda: self.hub.buy(trader, amount1)
+
+    def sell(self, trader):
+        amount0 = self.rng.uniform(10, 5000)
+        return lambda: self.hub.sell(trader, amount0)
+
+    def short_open(self, trader):
+        base_amount = self.rng.uniform(10, 200)
+        lev_mult = self.rng.choice((2, 3, 4, 5))
+
+        def run():
+            success, params = self.hub.short_fast_open(trader, base_amount, lev_mult)
+            if not success:
+                return success, params
+            return self.hub.short_open(trader, params["baseAmount"], params["lendAmount"], params["forcedClosePrice"], params["insterOrderID"])
+        return run
+
+    def long_open(self, trader):
+        base_amount = self.rng.uniform(10, 200)
+        lev_mult = self.rng.choice((2, 3, 4, 5))
+
+        def run():
+            success, params = self.hub.long_fast_open(trader, base_amount, lev_mult)
+            if not success:
+                return success, params
+            return self.hub.long_open(trader, params["baseAmount"], params["lendAmount1"], params["forcedClosePrice"], params["insterOrderID"])
+        return run
+
+    def partial_close(self, trader):
+        return self._close(trader, self.rng.uniform(0.2, 0.8))
+
+    def full_close(self, trader):
+        return self._close(trader, 1.0)
+
+    def _close(self, trader, fraction):
+        pick = self.rng.random()
+
+        def run():
+            order_ids = self.hub.pool.getOrderIDsByAddress(trader)
+            if not order_ids:
+                return False, "No open orders"
+            order = self.hub.pool.getOrderByID(order_ids[int(pick * len(order_ids))])
+            if order['orderType'] == "short":
+                return self.hub.short_close(trader, order['orderID'], order['lendAmount0'] * fraction)
+            return self.hub.long_close(trader, order['orderID'], order['buy_amount0'] * fraction)
+        return run
+
+    def third_party_close(self, trader):
+        side = self.rng.choice(("short", "long"))
+
+        def run():
+            # Liquidate the order nearest to the price, like the Third-party Liquidation tab in main.py
+            if side == "short" and self.hub.pool.nearShortNode:
+                order = self.hub.pool.getOrderByID(self.hub.pool.nearShortNode)
+                return self.hub.short_close(trader, order['orderID'], order['lendAmount0'], isThirdParty=True)
+            if side == "long" and self.hub.pool.nearLongNode:
+                order = self.hub.pool.getOrderByID(self.hub.pool.nearLongNode)
+                return self.hub.long_close(trader, order['orderID'], order['buy_amount0'], isThirdParty=True)
+            return False, "No order to liquidate"
+        return run
+
+
+class PartialCloseRounds:
+    """
+    Seeded rounds of open, partial close, full close of one large position on a pool of its own, alternating shorts
+    and longs. Each open moves the price by 9.5-9.9%, just within the single trade limit, so that buying back a short
+    moves it more than forceMoveRate. Selling a long back moves it less than the open did, so before a long is
+    partially closed a rally trader buys the price up 45% (and sells back after the round, neither is timed).
+    """
+
+    OP_TYPES = ("large_short_open", "large_long_open", "partial_close", "full_close")
+
+    def __init__(self, seed):
+        self.hub = create_hub([])
+        self.pool = self.hub.pool
+        self.rng = random.Random(seed)
+        erc20_factory_instance.airdrop(self.pool.token1, {"0xWhale": 10**7, "0xRally": 10**9})
+        self.latencies = {op_type: [] for op_type in self.OP_TYPES}
+        self.successes = dict.fromkeys(self.OP_TYPES, 0)
+
+    def timed(self, op_type, operation, *args):
+        op_start = time.perf_counter()
+        success, message = operation(*args)
+        self.latencies[op_type].append(time.perf_counter() - op_start)
+        self.successes[op_type] += bool(success)
+        return success, message
+
+    def run(self, rounds):
+        for index in range(rounds):
+            if index % 2 == 0:
+                self.short_round()
+            else:
+                self.long_round()
+
+    def short_round(self):
+        pool, hub = self.pool, self.hub
+        lev_mult = self.rng.choice((2, 3, 4, 5))
+        lend_amount0 = pool.swapMath.get_amount0_in_for_price_drop(pool.reserve0, self.rng.uniform(0.095, 0.099), pool.fee)
+        close_move = self.rng.uniform(0.05, 0.09)
+        success, params = hub.short_fast_open("0xWhale", lend_amount0 * pool.getPrice() / lev_mult, lev_mult)
+        if not success or not self.timed("large_short_open", hub.short_open, "0xWhale", params["baseAmount"], params["lendAmount"],
+                                         params["forcedClosePrice"], params["insterOrderID"])[0]:
+            return
+        order_id = pool.getOrderIDsByAddress("0xWhale")[-1]
+        close_amount0 = pool.swapMath.get_amount0_out_for_price_rise(pool.reserve0, close_move)
+        self.timed("partial_close", hub.short_close, "0xWhale", order_id, close_amount0)
+        self.timed("full_close", hub.short_close, "0xWhale", order_id, pool.orderShortMap[order_id]['lendAmount0'])
+
+    def long_round(self):
+        pool, hub = self.pool, self.hub
+        lev_mult = self.rng.choice((2, 3, 4, 5))
+        amount0 = pool.swapMath.get_amount0_out_for_price_rise(pool.reserve0, self.rng.uniform(0.095, 0.099))
+        amount1 = pool.swapMath.get_amount_in_reserve1_for_amount0_out(amount0, pool.reserve0, pool.reserve1, pool.fee)[0]
+        close_move = self.rng.uniform(0.05, 0.09)
+        success, params = hub.long_fast_open("0xWhale", amount1 / lev_mult, lev_mult)
+        if not success or not self.timed("large_long_open", hub.long_open, "0xWhale", params["baseAmount"], params["lendAmount1"],
+                                         params["forcedClosePrice"], params["insterOrderID"])[0]:
+            return
+        order_id = pool.getOrderIDsByAddress("0xWhale")[-1]
+        start_price = pool.getPrice()
+        while pool.getPrice() < start_price * 1.45:
+            amount0 = pool.swapMath.get_amount0_out_for_price_rise(pool.reserve0, 0.09)
+            hub.buy("0xRally", pool.swapMath.get_amount_in_reserve1_for_amount0_out(amount0, pool.reserve0, pool.reserve1, pool.fee)[0])
+        close_amount0 = pool.swapMath.get_amount0_in_for_price_drop(pool.reserve0, close_move, pool.fee)
+        self.timed("partial_close", hub.long_close, "0xWhale", order_id, close_amount0)
+        self.timed("full_close", hub.long_close, "0xWhale", order_id, pool.orderLongMap[order_id]['buy_amount0'])
+        while erc20_factory_instance.balanceOf(pool.token0, "0xRally") > 0:
+            amount0 = pool.swapMath.get_amount0_in_for_price_drop(pool.reserve0, 0.09, pool.fee)
+            if not hub.sell("0xRally", min(amount0, erc20_factory_instance.balanceOf(pool.token0, "0xRally")))[0]:
+                break
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def state_digest(hub):
+    """
+    Short hash of reserves, order books and balances, equal digests mean the runs ended in the same state
+    """
+    pool = hub.pool
+    parts = [repr((pool.reserve0, pool.reserve1, pool.loanReserve0, pool.loanReserve1,
+                   pool.collateralShortAmount1, pool.collateralLongAmount1))]
+    for order_map in (pool.orderShortMap, pool.orderLongMap):
+        for order_id in sorted(order_map):
+            order = order_map[order_id]
+            parts.append(repr((order_id, order['lowPrice'], order['hightPrice'], order['address'])))
+    for token in sorted(erc20_factory_instance.tokens):
+        parts.append(repr(sorted(erc20_factory_instance.tokens[token]["balances"].items())))
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:16]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def print_table(latencies, successes):
+    print(f"{'operation':<20}{'count':>8}{'ok':>8}{'ops/s':>10}{'p50 us':>10}{'p99 us':>10}")
+    for op_type, values in latencies.items():
+        values.sort()
+        total = sum(values)
+        ops_per_second = len(values) / total if total else 0.0
+        print(f"{op_type:<20}{len(values):>8}{successes[op_type]:>8}{ops_per_second:>10,.0f}"
+              f"{percentile(values, 0.50) * 1e6:>10,.0f}{percentile(values, 0.99) * 1e6:>10,.0f}")
+
+
+def run(ops, seed, traders, trace_memory, partial_rounds=0):
+    trader_addresses = [f"0xTrader{i}" for i in range(traders)]
+    random.seed(seed)  # Token and pool addresses come from the global random module
+    hub = create_hub(trader_addresses)
+    workload = Workload(hub, trader_addresses, seed)
+    latencies = {op_type: [] for op_type in WORKLOAD_MIX}
+    successes = dict.fromkeys(WORKLOAD_MIX, 0)
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(ops):
+        op_type, operation = workload.next_op()
+        op_start = time.perf_counter()
+        success, _message = operation()
+        latencies[op_type].append(time.perf_counter() - op_start)
+        successes[op_type] += bool(success)
+    elapsed = time.perf_counter() - start
+    traced_peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    if trace_memory:
+        tracemalloc.stop()
+
+    print_table(latencies, successes)
+    print(f"total: {ops} operations in {elapsed:.2f}s = {ops / elapsed:,.0f} ops/s, "
+          f"open orders: {len(hub.pool.orderShortMap)} short / {len(hub.pool.orderLongMap)} long")
+    rss = peak_rss_mb()
+    print("peak RSS:", f"{rss:.1f} MB" if rss is not None else "n/a",
+          "| peak traced Python heap:", f"{traced_peak / 2**20:.1f} MB" if traced_peak is not None else "n/a (use --tracemalloc)")
+    print(f"seed {seed} final state digest: {state_digest(hub)}")
+
+    if partial_rounds:
+        # After the digest: the phase pool reuses the base token address of the workload pool
+        rounds = PartialCloseRounds(seed)
+        rounds.run(partial_rounds)
+        print(f"\npartial close phase: {partial_rounds} rounds of large open, partial close, full close")
+        print_table(rounds.latencies, rounds.successes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Seeded SwapHub trading workload benchmark")
+    parser.add_argument("--ops", type=int, default=20000, help="Number of operations")
+    parser.add_argument("--seed", type=int, default=1, help="Workload seed")
+    parser.add_argument("--traders", type=int, default=200, help="Number of trader addresses")
+    parser.add_argument("--partial-rounds", type=int, default=500, help="Rounds of the partial close phase, 0 to skip it")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also trace the Python heap peak (slows the run)")
+    args = parser.parse_args()
+    run(args.ops, args.seed, args.traders, args.tracemalloc, args.partial_rounds)
@@ -0,0 +1,105 @@
+# File name: bench_swaphub_concurrency.py
+
+# Benchmark: SwapHub read throughput vs reader thread count while a writer keeps trading
+# Compares the reader/writer lock against a single exclusive lock (the previous SwapHub behaviour) for two read mixes:
+#   snapshot - price, reserve, info and order-book reads, served from the pool snapshot without any lock, so both
+#              locks measure the same thing here
+#   locked   - price history, candles and address history reads, which take the read side of the hub lock
+# writes/s is also given as a share of the rate with no readers. Readers and the writer share one interpreter (GIL),
+# so the write rate falls as readers are added with either lock; only the locked mix shows what the lock itself
+# costs the writer.
+# Run: python bench_swaphub_concurrency.py [seconds_per_case]
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from erc20factory import erc20_factory_instance
+from shortswapv1factory import ShortSwapV1Factory
+from swaphub import SwapHub
+from rwlock import ReadWriteLock
+
+
+class ExclusiveLock:
+    """
+    Same interface as ReadWriteLock, but reads and writes share one mutex
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def read(self):
+        with self._lock:
+            yield
+
+    @contextmanager
+    def write(self):
+        with self._lock:
+            yield
+
+
+def create_hub():
+    factory = ShortSwapV1Factory()
+    pool_address = factory.createPool(
+        address="0xBenchOwner", name="TestToken", symbol="TTK", decimals=18,
+        totalSupply=1500000, shortSupply=500000, tokenBase="0xUSDToken", tokenBaseAmount=100000
+    )
+    pool = factory.getPool(pool_address)
+    erc20_factory_instance.createErc20Test("0xBenchOwner", "BaseToken", "USDT", 18, 100000, "0xUSDToken")
+    erc20_factory_instance.airdrop(pool.token1, {pool.poolAddress: 1, "0xBenchTrader": 10**9})
+    return SwapHub(pool)
+
+
+READ_MIXES = {
+    "snapshot": lambda hub: (hub.get_price, hub.get_reserves, hub.get_info, lambda: hub.get_short_order(100)),
+    "locked": lambda hub: (lambda: hub.get_price_history(100), lambda: hub.get_candles(60, 100),
+                           lambda: hub.get_address_history_orders("0xBenchTrader")),
+}
+
+
+def run_case(lock_factory, read_mix, reader_threads, seconds):
+    hub = create_hub()
+    hub.lock = lock_factory()
+    stop = threading.Event()
+    read_counts = [0] * reader_threads
+    write_count = [0]
+
+    def reader(index):
+        calls = READ_MIXES[read_mix](hub)
+        count = 0
+        while not stop.is_set():
+            calls[count % len(calls)]()
+            count += 1
+        read_counts[index] = count
+
+    def writer():
+        count = 0
+        while not stop.is_set():
+            if count % 2 == 0:
+                hub.buy("0xBenchTrader", 10)
+            else:
+                hub.sell("0xBenchTrader", 90)
+            count += 1
+        write_count[0] = count
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(reader_threads)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(read_counts) / seconds, write_count[0] / seconds
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    print(f"{'lock':<12}{'reads':<10}{'readers':>8}{'reads/s':>14}{'writes/s':>12}{'of no-reader':>14}")
+    for name, lock_factory in (("exclusive", ExclusiveLock), ("read/write", ReadWriteLock)):
+        solo_writes = run_case(lock_factory, "snapshot", 0, seconds)[1]
+        print(f"{name:<12}{'-':<10}{0:>8}{0:>14,}{solo_writes:>12,.0f}{1:>14.0%}")
+        for read_mix in READ_MIXES:
+            for reader_threads in (1, 2, 4, 8, 16):
+                reads, writes = run_case(lock_factory, read_mix, reader_threads, seconds)
+                print(f"{name:<12}{read_mix:<10}{reader_threads:>8}{reads:>14,.0f}{writes:>12,.0f}{writes / solo_writes:>14.0%}")
@@ -0,0 +1,85 @@
+# File name: changefeed.py
+
+import asyncio
+import threading
+
+
+class ChangeFeed:
+    """
+    Versioned change notifications: writers call publish() after committing, readers block until the version moves.
+
+    Readers only learn that something changed, not what: they re-read the state they show, so several commits
+    between two wake-ups coalesce into one refresh. Both threads (wait) and asyncio tasks (updates) can listen,
+    async listeners cost no thread while idle.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._async_waiters = []  # (loop, future) of async listeners waiting for the next publish
+        self.version = 0
+
+    def publish(self):
+        """
+        Announce a committed change
+        :return: The new version
+        """
+        with self._cond:
+            self.version += 1
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+            version = self.version
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        return version
+
+    def wait(self, since_version, timeout=None):
+        """
+        Block the calling thread until the version is newer than since_version
+        :param since_version: Last version the caller has seen
+        :param timeout: Maximum seconds to wait, None waits forever
+        :return: Current version (equal to since_version on timeout)
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > since_version, timeout)
+            return self.version
+
+    async def wait_async(self, since_version, timeout=None):
+        """
+        Same as wait(), for asyncio tasks
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self._cond:
+            if self.version > since_version:
+                return self.version
+            self._async_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                if waiter in self._async_waiters:
+                    self._async_waiters.remove(waiter)
+        return self.version
+
+    async def updates(self, since_version=None, heartbeat=None):
+        """
+        Async generator of versions: yields the current version first (unless since_version is given), then the new
+        version after every publish. With heartbeat it also yields the unchanged version every heartbeat seconds,
+        so a consumer can notice that its client went away.
+        :param since_version: Last version the caller has seen
+        :param heartbeat: Seconds between heartbeats, None for no heartbeat
+        """
+        if since_version is None:
+            since_version = self.version
+            yield since_version
+        while True:
+            since_version = await self.wait_async(since_version, heartbeat)
+            yield since_version
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
@@ -2,11 +2,28 @@
 
 import random
 import string
+import threading
+import zlib
+from contextlib import contextmanager
+from eventlog import event_log_instance
+
+LOCK_STRIPES = 64  # Number of ledger locks, tokens are spread over them by contract address
+BULK_AIRDROP_HOLDERS = 10000  # Airdrops creating more holders than this leave them out of the holder index
 
 class Erc20Factory:
+    """
+    Token ledger. Balance changes of a token hold the lock of its stripe, so transfers of different tokens run
+    concurrently and transfers of one token are serialized. Senders are always explicit (transferFrom, or the
+    account returned by use()), there is no shared current address.
+    """
+
     def __init__(self):
         self.tokens = {}
         self.balances = {}
+        self.holderTokens = {}  # Reverse index: holder address -> {contract_address: None} of every token it has a balance entry in
+        self.unindexedTokens = {}  # {contract_address: None} of tokens with holders missing from holderTokens (bulk airdrops)
+        self.journal = None  # Optional persistence.Persistence, airdrops and batch transfers are appended to its write-ahead log
+        self._locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
 
     def createErc20(self, address, name, symbol, decimals, totalSupply):
         # Generate a random virtual contract address
@@ -19,6 +36,7 @@ class Erc20Factory:
             "balances": {address: totalSupply}
         }
         self.balances[address] = totalSupply
+        self._addHolder(address, contract_address)
         return contract_address
 
     def createErc20Test(self, address, name, symbol, decimals, totalSupply, contract_address):
@@ -31,6 +49,7 @@ class Erc20Factory:
             "balances": {address: totalSupply}
         }
         self.balances[address] = totalSupply
+        self._addHolder(address, contract_address)
         return contract_address
 
     def name(self, contract_address):
@@ -50,41 +69,107 @@ class Erc20Factory:
             return 0
         return self.tokens[contract_address]["balances"].get(owner, 0)
 
-    def transfer(self, contract_address, to, value):
-        #print("self.tokens =",self.tokens)
-        
-        from_address = self.current_address
-        print("Address:", from_address[0:8],"Balance:",self.tokens[contract_address]["balances"].get(from_address, 0),  "Transfer to:", to[0:8], "Amount:", value,"Token contract:", contract_address[0:8])
-        
-        if self.tokens[contract_address]["balances"].get(from_address, 0) >= value:
-            # If recipient address doesn't exist, create it and set balance to 0
-            if to not in self.tokens[contract_address]["balances"]:
-                self.tokens[contract_address]["balances"][to] = 0
-            self.tokens[contract_address]["balances"][from_address] -= value
-            self.tokens[contract_address]["balances"][to] += value
-            return True, "Transfer successful"
-        else:
-            return False, "Insufficient balance"
-
     def transferFrom(self, contract_address, from_address, to, value):
-        
-        if self.tokens[contract_address]["balances"].get(from_address, 0) >= value:
-            # If recipient address doesn't exist, create it and set balance to 0
-            if to not in self.tokens[contract_address]["balances"]:
-                self.tokens[contract_address]["balances"][to] = 0
-            self.tokens[contract_address]["balances"][from_address] -= value
-            self.tokens[contract_address]["balances"][to] += value
-            return True, "Transfer successful"
-        else:
-            return False, "Insufficient balance"
+        """
+        Move value tokens from from_address to to (thread-safe, holds the token's stripe lock)
+        """
+        with self.lockFor(contract_address):
+            if self.tokens[contract_address]["balances"].get(from_address, 0) >= value:
+                # If recipient address doesn't exist, create it and set balance to 0
+                if to not in self.tokens[contract_address]["balances"]:
+                    self.tokens[contract_address]["balances"][to] = 0
+                    self._addHolder(to, contract_address)
+                self.tokens[contract_address]["balances"][from_address] -= value
+                self.tokens[contract_address]["balances"][to] += value
+                event_log_instance.emit("transfer", token=contract_address, sender=from_address, to=to, value=value)
+                return True, "Transfer successful"
+            else:
+                return False, "Insufficient balance"
+
+    def batchTransfer(self, moves):
+        """
+        Apply several transfers atomically: every move is applied, or none is when one of them fails
+        Moves are checked in order against the balances left by the earlier moves of the batch (so a move may spend
+        tokens received earlier in the same batch), and written to the ledger once all of them passed.
+        :param moves: List of (contract_address, from_address, to, value)
+        :return: (bool, message), the message of a failed batch names the first failing move
+        """
+        tokens = self.tokens
+        for index, move in enumerate(moves):
+            if move[0] not in tokens:
+                return False, f"Move {index}: Token contract does not exist"
+        journal = self.journal
+        if journal is None:
+            return self._applyBatchTransfer(moves)
+        # Apply and append under the journal lock so the log order matches the order balances changed in
+        with journal.lock:
+            success, message = self._applyBatchTransfer(moves)
+            if success:
+                journal.append("erc20", "batchTransfer", None, ([tuple(move) for move in moves],), None)
+        return success, message
+
+    def _applyBatchTransfer(self, moves):
+        tokens = self.tokens
+        with self.locked({move[0] for move in moves}):
+            staged = {}  # (contract_address, address) -> balance after the moves so far
+            for index, (contract_address, from_address, to, value) in enumerate(moves):
+                balances = tokens[contract_address]["balances"]
+                key = (contract_address, from_address)
+                from_balance = staged[key] if key in staged else balances.get(from_address, 0)
+                if from_balance < value:
+                    return False, f"Move {index}: Insufficient balance"
+                staged[key] = from_balance - value
+                key = (contract_address, to)
+                staged[key] = (staged[key] if key in staged else balances.get(to, 0)) + value
+            for (contract_address, address), balance in staged.items():
+                balances = tokens[contract_address]["balances"]
+                if address not in balances:
+                    self._addHolder(address, contract_address)
+                balances[address] = balance
+            for contract_address, from_address, to, value in moves:
+                event_log_instance.emit("transfer", token=contract_address, sender=from_address, to=to, value=value)
+        return True, "Transfer successful"
 
     def use(self, address):
-        self.current_address = address
-        return self
+        """
+        The ledger as seen by one sender: erc20.use(address).transfer(token, to, value)
+        :return: Erc20Account bound to address (nothing is stored on the shared factory)
+        """
+        return Erc20Account(self, address)
+
+    def lockFor(self, contract_address):
+        """
+        The lock guarding the balances of a token (shared with the other tokens of its stripe)
+        """
+        return self._locks[zlib.crc32(contract_address.encode()) % LOCK_STRIPES]
+
+    @contextmanager
+    def locked(self, contract_addresses):
+        """
+        Hold the locks of several tokens for the duration of a with block, e.g. a pool trade staging transfers of
+        both pool tokens. Stripes are always taken in index order, so two holders cannot deadlock.
+        """
+        stripes = sorted({zlib.crc32(contract_address.encode()) % LOCK_STRIPES for contract_address in contract_addresses})
+        for stripe in stripes:
+            self._locks[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self._locks[stripe].release()
+
+    def stage(self):
+        """
+        Start a LedgerStage: transfers made through it are applied to the ledger together by its flush()
+        """
+        return LedgerStage(self)
 
     def allBalanceOf(self, owner):
         balances = {}
-        for contract_address, token in self.tokens.items():
+        for contract_address in self._heldTokens(owner):
+            token = self.tokens.get(contract_address)
+            if token is None:
+                continue
             balance = token["balances"].get(owner, 0)
             if balance > 0:
                 balances[contract_address] = {
@@ -95,6 +180,52 @@ class Erc20Factory:
                 }
         return balances
 
+    def portfolioOf(self, owner):
+        """
+        Positive balances of one holder, in O(tokens held) through the holder index
+        :return: {contract_address: balance}
+        """
+        portfolio = {}
+        for contract_address in self._heldTokens(owner):
+            token = self.tokens.get(contract_address)
+            if token is not None:
+                balance = token["balances"].get(owner, 0)
+                if balance > 0:
+                    portfolio[contract_address] = balance
+        return portfolio
+
+    def portfolios(self, owners):
+        """
+        Positive balances of many holders at once
+        :param owners: Iterable of holder addresses
+        :return: {owner: {contract_address: balance}}
+        """
+        return {owner: self.portfolioOf(owner) for owner in owners}
+
+    def reindexHolders(self):
+        """
+        Rebuild the holder index from the token balances (after self.tokens was replaced, e.g. loaded from a snapshot)
+        """
+        self.holderTokens = {}
+        self.unindexedTokens = {}
+        for contract_address, token in self.tokens.items():
+            for address in token["balances"]:
+                self._addHolder(address, contract_address)
+
+    def _heldTokens(self, owner):
+        # Tokens owner has a balance entry in: its index entry, plus the bulk airdropped tokens it holds.
+        # Returns a copy, transfers to owner may add index entries while the caller iterates (no lock is held here)
+        held = dict(self.holderTokens.get(owner, {}))
+        if self.unindexedTokens:
+            for contract_address in list(self.unindexedTokens):
+                if owner in self.tokens[contract_address]["balances"]:
+                    held[contract_address] = None
+        return tuple(held)
+
+    def _addHolder(self, address, contract_address):
+        # setdefault keeps this safe when two token stripes add the same new holder at once
+        self.holderTokens.setdefault(address, {})[contract_address] = None
+
     def airdrop(self, contract_address, recipients):
         """
         Airdrop tokens to multiple addresses
@@ -108,14 +239,171 @@ class Erc20Factory:
             
             return False, "Token contract does not exist"
 
-        for address, amount in recipients.items():
-            if address not in self.tokens[contract_address]["balances"]:
-                self.tokens[contract_address]["balances"][address] = 0
-            self.tokens[contract_address]["balances"][address] += amount
-            self.tokens[contract_address]["totalSupply"] += amount
+        journal = self.journal
+        if journal is None:
+            self._applyAirdrop(contract_address, recipients)
+        else:
+            # Apply and append under the journal lock so the log order matches the order balances changed in
+            with journal.lock:
+                self._applyAirdrop(contract_address, recipients)
+                journal.append("erc20", "airdrop", None, (contract_address, dict(recipients)), None)
 
         return True, "Airdrop completed successfully"
 
+    def _applyAirdrop(self, contract_address, recipients):
+        # An airdrop to new recipients only uses whole-dict operations (isdisjoint, update, sum), which run in C.
+        # New holders of a bulk airdrop are not added to the holder index one by one, the token is marked unindexed
+        # and readers look it up directly instead.
+        token = self.tokens[contract_address]
+        with self.lockFor(contract_address):
+            balances = token["balances"]
+            if balances.keys().isdisjoint(recipients):
+                new = recipients.keys()  # The usual case, every recipient is a new holder
+                balances.update(recipients)
+            else:
+                new = []
+                for address, amount in recipients.items():
+                    balance = balances.get(address)
+                    if balance is None:
+                        new.append(address)
+                        balance = 0
+                    balances[address] = balance + amount
+            token["totalSupply"] += sum(recipients.values())
+            if len(new) > BULK_AIRDROP_HOLDERS:
+                self.unindexedTokens[contract_address] = None
+            elif contract_address not in self.unindexedTokens:
+                for address in new:
+                    self._addHolder(address, contract_address)
+
+class Erc20Account:
+    """
+    Erc20Factory bound to one sender, returned by Erc20Factory.use(). Every other attribute is the factory's.
+    """
+
+    __slots__ = ('erc20', 'address')
+
+    def __init__(self, erc20, address):
+        self.erc20 = erc20
+        self.address = address
+
+    def transfer(self, contract_address, to, value):
+        """
+        Send value tokens from this account to to
+        """
+        return self.erc20.transferFrom(contract_address, self.address, to, value)
+
+    def __getattr__(self, name):
+        return getattr(self.erc20, name)
+
+class LedgerStage:
+    """
+    Buffered view of an Erc20Factory ledger used by pool transactions and batched trades.
+
+    transfer() has exactly the checks and arithmetic of Erc20Factory.transferFrom, but writes the new balances into a
+    small per-token dict instead of the ledger. flush() writes every touched balance back once, and emits the
+    transfer events. Balances read through the stage include its pending transfers, so a batch sees its own earlier
+    trades, while readers of the ledger see the balances from before the batch until flush(). The owner holds the
+    locks of the staged tokens (Erc20Factory.locked) from the first transfer until flush().
+    savepoint() / rollback() undo the transfers made after a savepoint, discarding the stage undoes all of them.
+    """
+
+    def __init__(self, erc20):
+        self.erc20 = erc20
+        self._tokens = {}  # contract_address -> (staged balances {address: balance}, ledger balances of the token)
+        self._undo = []    # (staged balances, address, balance before the write or _UNSTAGED)
+        self._events = []  # Transfer events emitted on flush, only collected while the event log is enabled
+
+    def _open(self, contract_address):
+        entry = self._tokens[contract_address] = ({}, self.erc20.tokens[contract_address]["balances"])
+        return entry
+
+    def balanceOf(self, contract_address, owner):
+        entry = self._tokens.get(contract_address)
+        if entry is not None:
+            balance = entry[0].get(owner)
+            if balance is not None:
+                return balance
+        return self.erc20.balanceOf(contract_address, owner)
+
+    def transfer(self, contract_address, from_address, to, value):
+        entry = self._tokens.get(contract_address)
+        if entry is None:
+            entry = self._open(contract_address)
+        staged, ledger = entry
+        from_balance = staged.get(from_address)
+        if from_balance is None:
+            from_balance = ledger.get(from_address, 0)
+            self._undo.append((staged, from_address, _UNSTAGED))
+        else:
+            self._undo.append((staged, from_address, from_balance))
+        if from_balance >= value:
+            staged[from_address] = from_balance - value
+            to_balance = staged.get(to)
+            if to_balance is None:
+                to_balance = ledger.get(to, 0)
+                self._undo.append((staged, to, _UNSTAGED))
+            else:
+                self._undo.append((staged, to, to_balance))
+            staged[to] = to_balance + value
+            if event_log_instance.enabled:
+                self._events.append(dict(token=contract_address, sender=from_address, to=to, value=value))
+            return True, "Transfer successful"
+        else:
+            self._undo.pop()
+            return False, "Insufficient balance"
+
+    def savepoint(self):
+        """
+        :return: Marker for rollback()
+        """
+        return len(self._undo), len(self._events)
+
+    def rollback(self, savepoint):
+        """
+        Undo the transfers staged after savepoint
+        """
+        undo_length, events_length = savepoint
+        undo = self._undo
+        while len(undo) > undo_length:
+            staged, address, balance = undo.pop()
+            if balance is _UNSTAGED:
+                staged.pop(address, None)
+            else:
+                staged[address] = balance
+        del self._events[events_length:]
+
+    def changes(self):
+        """
+        Net balance changes staged so far, addresses whose balance did not change are left out
+        :return: {contract_address: {address: balance change}}
+        """
+        changes = {}
+        for contract_address, (staged, ledger) in self._tokens.items():
+            deltas = {address: balance - ledger.get(address, 0) for address, balance in staged.items() if balance != ledger.get(address, 0)}
+            if deltas:
+                changes[contract_address] = deltas
+        return changes
+
+    def flush(self):
+        """
+        Write the staged balances to the ledger and empty the stage
+        """
+        erc20 = self.erc20
+        for contract_address, (staged, ledger) in self._tokens.items():
+            for address in staged:
+                if address not in ledger:
+                    erc20._addHolder(address, contract_address)
+            ledger.update(staged)
+        for event in self._events:
+            event_log_instance.emit("transfer", **event)
+        self._tokens = {}
+        self._undo = []
+        self._events = []
+
+
+_UNSTAGED = object()  # Undo marker: the balance was read from the ledger, not staged
+
+
 # Example usage
 if __name__ == '__main__':
     # Example code demonstrating the usage of Erc20Factory class
@@ -132,9 +420,6 @@ if __name__ == '__main__':
         totalSupply=1000000
     )
 
-    # Use the use method to set current operating address
-    factory.use("0xYourAddress")
-
     print("contract_address:",contract_address)
 
     # Get token name
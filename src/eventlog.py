@@ -0,0 +1,79 @@
+# File name: eventlog.py
+
+import contextlib
+import itertools
+import json
+import sys
+import threading
+import time
+
+
+class EventLog:
+    """
+    Structured event emitter for the trading path.
+
+    Disabled by default: emit() returns before building or formatting anything, so leaving the calls on the
+    hot path costs one attribute check. When enabled every event is written as one JSON line, e.g.
+    {"seq": 12, "ts": 1718000000.1, "event": "buy", "pool": "0x..", "address": "a", "priceBefore": 0.1, ...}
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stream = None
+        self.capturing = 0  # Number of active capture() blocks, any thread
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self, stream=None):
+        """
+        Start writing events
+        :param stream: Writable text stream, defaults to sys.stdout
+        """
+        self.stream = stream if stream is not None else sys.stdout
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def emit(self, event, **fields):
+        """
+        Write one event record (no-op while disabled)
+        :param event: Event name, e.g. "buy", "shortOpen", "transfer"
+        :param fields: Event fields, must be JSON serializable (other values are written with str())
+        """
+        if not self.enabled and not self.capturing:
+            return
+        captured = getattr(self._local, "captured", None)
+        if captured is not None:
+            captured.append(dict(fields, event=event))
+            return
+        if not self.enabled:
+            return
+        record = {"seq": next(self._seq), "ts": time.time(), "event": event}
+        record.update(fields)
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+
+    @contextlib.contextmanager
+    def capture(self):
+        """
+        Collect the events emitted by the current thread in a list instead of writing them (used by simulations),
+        other threads keep writing as before
+        :return: Context manager yielding the list of captured events, e.g. [{"event": "buy", "pool": "0x..", ...}]
+        """
+        previous = getattr(self._local, "captured", None)
+        captured = self._local.captured = []
+        with self._lock:
+            self.capturing += 1
+        try:
+            yield captured
+        finally:
+            self._local.captured = previous
+            with self._lock:
+                self.capturing -= 1
+
+
+# Create global singleton
+event_log_instance = EventLog()
@@ -0,0 +1,94 @@
+# File name: expiryqueue.py
+
+import heapq
+
+
+class ExpiryQueue:
+    """
+    Min-heap of open orders by loan_time, for finding orders past the lending time limit without a scan.
+
+    Removal is lazy: remove() only drops the order from `loanTimes`, its heap entry is skipped when it reaches the
+    top (or when the heap is compacted). Every insert() gets a new sequence number, so an order that is removed and
+    inserted again (a rolled back close) never matches its old entry.
+    """
+
+    def __init__(self):
+        self.heap = []       # (loanTime, seq, orderID), may contain removed entries
+        self.loanTimes = {}  # orderID -> (loanTime, seq) of the live entry
+        self._seq = 0  # Next sequence number, a plain int so the queue pickles with pool snapshots on every Python
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if not isinstance(self._seq, int):
+            self._seq = next(self._seq)  # Snapshot written while the counter was an itertools.count
+
+    def __len__(self):
+        return len(self.loanTimes)
+
+    def __contains__(self, orderID):
+        return orderID in self.loanTimes
+
+    def insert(self, orderID, loanTime):
+        """
+        Add an open order
+        :param orderID: Order ID
+        :param loanTime: Opening timestamp of the order
+        """
+        seq = self._seq
+        self._seq += 1
+        self.loanTimes[orderID] = (loanTime, seq)
+        heapq.heappush(self.heap, (loanTime, seq, orderID))
+
+    def remove(self, orderID):
+        """
+        Drop an order (closed or rolled back)
+        :return: bool Whether the order was in the queue
+        """
+        if self.loanTimes.pop(orderID, None) is None:
+            return False
+        if len(self.heap) > 2 * len(self.loanTimes) + 64:
+            self._compact()
+        return True
+
+    def peek(self):
+        """
+        The oldest open order, O(log n) amortized
+        :return: (loanTime, orderID), or None when the queue is empty
+        """
+        heap = self.heap
+        while heap:
+            loanTime, seq, orderID = heap[0]
+            if self.loanTimes.get(orderID) == (loanTime, seq):
+                return loanTime, orderID
+            heapq.heappop(heap)  # Removed order
+        return None
+
+    def expired(self, cutoff):
+        """
+        Every open order opened before cutoff, oldest first, in O(k log k) for k results (the heap is walked only
+        below the cutoff)
+        :param cutoff: Timestamp, orders with loanTime < cutoff are returned
+        :return: List of order IDs
+        """
+        heap = self.heap
+        found = []
+        stack = [0] if heap else []
+        while stack:
+            i = stack.pop()
+            loanTime, seq, orderID = heap[i]
+            if loanTime >= cutoff:
+                continue  # Children are not older than their parent
+            if self.loanTimes.get(orderID) == (loanTime, seq):
+                found.append((loanTime, seq, orderID))
+            child = 2 * i + 1
+            if child < len(heap):
+                stack.append(child)
+                if child + 1 < len(heap):
+                    stack.append(child + 1)
+        found.sort()
+        return [orderID for _loanTime, _seq, orderID in found]
+
+    def _compact(self):
+        # Rebuild the heap from the live entries once removed ones outnumber them
+        self.heap = [(loanTime, seq, orderID) for orderID, (loanTime, seq) in self.loanTimes.items()]
+        heapq.heapify(self.heap)
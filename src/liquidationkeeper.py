@@ -0,0 +1,170 @@
+# File name: liquidationkeeper.py
+
+import threading
+import time
+from eventlog import event_log_instance
+
+
+class LiquidationKeeper:
+    """
+    Third-party liquidation engine of one SwapHub: finds every order that may be liquidated and closes them in
+    liquidation order, the third party fees go to the keeper address.
+
+    A third party may close an order once the price has reached its liquidation line (forcedClosePrice *
+    (1 - forceMoveRate) for shorts, forcedClosePrice * (1 + forceMoveRate) for longs) or once it has been open
+    longer than lendingSecondLimit. Each side of the book is sorted by forced close price, so the orders eligible by
+    price are a run starting at the near node: the keeper always closes the near node first, and closing it moves
+    the price further the same way, which can make the next order eligible. A close that would move the price more
+    than forceMoveRate is split into partial closes of forceMoveRate each (partial closes must move it at least
+    forceMoveSlack).
+
+    A sweep resolves the whole cascade under one write lock acquisition, every close is journaled like any other
+    trade. start() runs sweeps in a background thread after every committed change.
+    """
+
+    def __init__(self, hub, address, max_closes=1000):
+        """
+        :param hub: SwapHub of the pool
+        :param address: Keeper address, receives the third party liquidation fees
+        :param max_closes: Most closes in one sweep
+        """
+        self.hub = hub
+        self.address = address
+        self.max_closes = max_closes
+        self.liquidated = 0  # Number of successful closes
+        self._thread = None
+        self._stop = threading.Event()
+
+    def sweep(self):
+        """
+        Liquidate every eligible order
+        :return: List of closes in execution order, e.g. [{"orderID": "short3", "side": "short", "closeAmount0": 12.5,
+                 "fullClose": False, "success": True, "message": "Liquidation successful", "price": 0.105}]
+        """
+        with self.hub.lock.read():
+            if self._next_close(()) is None:
+                return []  # Nothing to do, traders are not blocked by a write lock
+
+        report = []
+        skip = set()  # Orders whose close was rejected, not tried again in this sweep
+        pool = self.hub.pool
+        with self.hub.lock.write():
+            # Publish one snapshot for the whole sweep, as submitBatch does
+            publish = pool.publishSnapshots
+            pool.publishSnapshots = False
+            try:
+                self._close_eligible(report, skip)
+            finally:
+                pool.publishSnapshots = publish
+            if any(close["success"] for close in report):
+                pool.publishSnapshot()
+
+        liquidated = sum(1 for close in report if close["success"])
+        self.liquidated += liquidated
+        if liquidated:
+            self.hub.change_feed.publish()
+        if report:
+            event_log_instance.emit("liquidationSweep", pool=self.hub.pool.poolAddress, keeper=self.address, closes=len(report),
+                                    liquidated=liquidated, rejected=len(skip), price=report[-1]["price"])
+        return report
+
+    def _close_eligible(self, report, skip):
+        while len(report) < self.max_closes:
+            close = self._next_close(skip)
+            if close is None:
+                break
+            side, orderID, closeAmount0, fullClose = close
+            op = "shortClose" if side == "short" else "longClose"
+            success, message = self.hub._apply(op, self.address, orderID, closeAmount0, True)
+            if not success:
+                skip.add(orderID)
+            report.append({"orderID": orderID, "side": side, "closeAmount0": closeAmount0, "fullClose": fullClose,
+                           "success": success, "message": message, "price": self.hub.pool.getPrice()})
+
+    def start(self, interval=60.0):
+        """
+        Sweep in a background thread after every committed change, and when the next order reaches the lending
+        time limit (checked at least every interval seconds)
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="liquidation-keeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread (waits for the current sweep)
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self.hub.change_feed.publish()  # Wake the thread, subscribers only re-read the unchanged state
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, interval):
+        while not self._stop.is_set():
+            version = self.hub.get_change_version()
+            self.sweep()
+            with self.hub.lock.read():
+                next_expiry = self.hub.pool.getNextExpiry()
+            timeout = interval
+            if next_expiry is not None and next_expiry[0] > time.time():
+                timeout = min(interval, next_expiry[0] - time.time())
+            self.hub.change_feed.wait(version, timeout)
+
+    def _next_close(self, skip):
+        """
+        The next close of the sweep: the near short or long order when the price reached its liquidation line,
+        otherwise the oldest order past the lending time limit
+        :return: (side, orderID, closeAmount0, fullClose), or None when no order is eligible
+        """
+        pool = self.hub.pool
+        price = pool.getPrice()
+
+        orderID = pool.nearShortNode
+        if orderID and orderID not in skip:
+            order = pool.orderShortMap[orderID]
+            if price >= order['forcedClosePrice'] * (1 - pool.forceMoveRate):
+                return self._short_close(order)
+
+        orderID = pool.nearLongNode
+        if orderID and orderID not in skip:
+            order = pool.orderLongMap[orderID]
+            if price <= order['forcedClosePrice'] * (1 + pool.forceMoveRate):
+                return self._long_close(order)
+
+        for orderID in pool.getExpiredOrders(time.time()):
+            if orderID in skip:
+                continue
+            order = pool.orderShortMap.get(orderID)
+            if order is not None:
+                return self._short_close(order)
+            return self._long_close(pool.orderLongMap[orderID])
+        return None
+
+    def _short_close(self, order):
+        pool = self.hub.pool
+        lendAmount0 = order['lendAmount0']
+        if lendAmount0 < pool.reserve0:
+            # Same check as ShortSwapV1Pool.shortClose: a full close within forceMoveRate cannot be split
+            _, _, _, _, initial_low_price, final_height_price = pool.swapMath.get_amount_in_reserve1_for_amount0_out(lendAmount0, pool.reserve0, pool.reserve1, pool.fee)
+            if (final_height_price - initial_low_price) / initial_low_price <= pool.forceMoveRate:
+                return "short", order['orderID'], lendAmount0, True
+        # The largest close within forceMoveRate
+        closeAmount0 = pool.swapMath.get_amount0_out_for_price_rise(pool.reserve0, pool.forceMoveRate)
+        if closeAmount0 >= lendAmount0:
+            return "short", order['orderID'], lendAmount0, True
+        return "short", order['orderID'], closeAmount0, False
+
+    def _long_close(self, order):
+        pool = self.hub.pool
+        buy_amount0 = order['buy_amount0']
+        # Same check as ShortSwapV1Pool.longClose: a full close within forceMoveRate cannot be split
+        _, _, _, _, initial_height_price, final_low_price = pool.swapMath.get_amount_out_reserve0_to_reserve1(buy_amount0, pool.reserve0, pool.reserve1, pool.fee)
+        if (initial_height_price - final_low_price) / initial_height_price <= pool.forceMoveRate:
+            return "long", order['orderID'], buy_amount0, True
+        # The largest close within forceMoveRate
+        closeAmount0 = pool.swapMath.get_amount0_in_for_price_drop(pool.reserve0, pool.forceMoveRate, pool.fee)
+        if closeAmount0 >= buy_amount0:
+            return "long", order['orderID'], buy_amount0, True
+        return "long", order['orderID'], closeAmount0, False
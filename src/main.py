@@ -2,41 +2,70 @@ import gradio as gr
 from urllib.parse import urlparse, parse_qs
 from swaphub import SwapHub
 from shortswapv1factory import ShortSwapV1Factory
-import matplotlib.pyplot as plt
+from pricechart import PriceChart
 from erc20factory import erc20_factory_instance
+from eventlog import event_log_instance
+from persistence import Persistence
+from apiserver import start_api_server
+from liquidationkeeper import LiquidationKeeper
 from datetime import datetime
 import json
-
-# Create ShortSwapV1Factory instance
-factory = ShortSwapV1Factory()
-# Create a new pool
-pool_address = factory.createPool(
-    address="0xYourAddress",
-    name="TestToken",
-    symbol="TTK",
-    decimals=18,
-    totalSupply=1500000,
-    shortSupply=500000,
-    tokenBase="0xUSDToken",
-    tokenBaseAmount=100000
-)
+import os
+import asyncio
+
+# Set EVENT_LOG=1 to write trading events to stdout as JSON lines
+if os.environ.get("EVENT_LOG"):
+    event_log_instance.enable()
+
+# Pools, orders and balances are persisted in DATA_DIR (snapshot + write-ahead log), WAL_FSYNC: always / interval / off
+persistence = Persistence(os.environ.get("DATA_DIR", "data"), fsync=os.environ.get("WAL_FSYNC", "interval"))
+factory = persistence.recover()
+
+if factory is None:
+    # Create ShortSwapV1Factory instance
+    factory = ShortSwapV1Factory()
+    # Create a new pool
+    pool_address = factory.createPool(
+        address="0xYourAddress",
+        name="TestToken",
+        symbol="TTK",
+        decimals=18,
+        totalSupply=1500000,
+        shortSupply=500000,
+        tokenBase="0xUSDToken",
+        tokenBaseAmount=100000
+    )
+
+    print("Wallet balance:", erc20_factory_instance.allBalanceOf("0xYourAddress"))
+
+    # Create a new token USDT 
+    erc20_factory_instance.createErc20Test('b', "BaseToken", "USDT", 18, 100000, "0xUSDToken")  
+
+    erc20_factory_instance.airdrop(factory.getPool(pool_address).token1,{pool_address:1})
+    erc20_factory_instance.airdrop(factory.getPool(pool_address).token1,{'a':5000000})
+else:
+    pool_address = next(iter(factory.pools))
+    print("Recovered state from", persistence.directory)
+
+# Log every committed operation from here on
+persistence.attach(factory)
 
 print("Pool address:", pool_address)
 pool = factory.getPool(pool_address)
 
-print("Wallet balance:", erc20_factory_instance.allBalanceOf("0xYourAddress"))
-
-# Create a new token USDT 
-erc20_factory_instance.createErc20Test('b', "BaseToken", "USDT", 18, 100000, "0xUSDToken")  
-
-erc20_factory_instance.airdrop(pool.token1,{pool.poolAddress:1})
-erc20_factory_instance.airdrop(pool.token1,{'a':5000000})
-
 # Airdrop records
 ariMap = {}
 
 # Create global TokenSwapHub object
-hub = SwapHub(pool)
+hub = SwapHub(pool, journal=persistence)
+
+# Set API_PORT to also serve the JSON API of static/swagger.json for this pool
+if os.environ.get("API_PORT"):
+    start_api_server(hub, port=int(os.environ["API_PORT"]))
+
+# Set KEEPER_ADDRESS to liquidate eligible orders automatically, the third party fees go to that address
+if os.environ.get("KEEPER_ADDRESS"):
+    LiquidationKeeper(hub, os.environ["KEEPER_ADDRESS"]).start()
 
 # Disable Gradio analytics
 gr.analytics_enabled = False
@@ -93,24 +122,11 @@ def get_user_info(addr):
     usdt_balance = f"{erc20_factory_instance.balanceOf(pool.token1, addr):.18f}"
     return f"TTK Balance: {ttk_balance}\nUSDT Balance: {usdt_balance}"
 
-import matplotlib
-matplotlib.use('Agg')
+# One chart shared by every client, redrawn only when the price history changes
+price_chart = PriceChart(hub, num=1000)
 
 def process_price_history():
-    y_values = hub.get_price_history() or [0]  # Handle possible empty list return
-    if len(y_values) > 100:
-        y_values = y_values[-100:]  # Keep only last 100 values
-    x_values = list(range(1, len(y_values) + 1))  # Generate x-axis values
-    
-    plt.figure()
-    plt.plot(x_values, y_values)
-    plt.title('Price Curve')
-    plt.xlabel('Time')
-    plt.ylabel('Price')
-    fig = plt.gcf()
-    plt.close()
-    
-    return fig
+    return price_chart.render()
 
 with gr.Blocks(title="Spin.pet Math Model Demo") as demo:
     user_addr = gr.State("")  # Ensure initial value
@@ -118,8 +134,7 @@ with gr.Blocks(title="Spin.pet Math Model Demo") as demo:
     with gr.Row():
         with gr.Column():
             # Left options
-            line_plot = gr.Plot(label="Price History")
-            demo.load(fn=process_price_history, inputs=None, outputs=line_plot, every=3)  # Update chart every 3 seconds
+            line_plot = gr.Image(label="Price History", type="filepath", interactive=False)
 
         with gr.Column():
             # Right options
@@ -326,12 +341,10 @@ with gr.Blocks(title="Spin.pet Math Model Demo") as demo:
             with gr.TabItem("Current Account"):
                 addr_input = gr.Textbox(label="User Address (enter any address to start trading)")
                 user_info = gr.Textbox(label="User Info", interactive=False)
-                addr_input.change(fn=lambda addr: (addr, get_user_info(addr)), inputs=addr_input, outputs=[user_addr, user_info])
-                demo.load(fn=lambda addr: get_user_info(addr) if addr else "", inputs=[user_addr], outputs=user_info, every=3)  # Add auto refresh
+                address_change = addr_input.change(fn=lambda addr: (addr, get_user_info(addr)), inputs=addr_input, outputs=[user_addr, user_info])
 
             with gr.TabItem("Current Price"):
                 swap_hub_info = gr.Textbox(label="Current Pool Info", interactive=False, lines=27)
-                demo.load(fn=get_swap_hub_info, inputs=None, outputs=swap_hub_info, every=3)
 
             with gr.TabItem("Token Airdrop"):
                 #airdrop_token = gr.Dropdown(choices=["TTK", "USDT"], label="Select Airdrop Token")
@@ -350,10 +363,11 @@ with gr.Blocks(title="Spin.pet Math Model Demo") as demo:
                         return "Invalid token selection"
 
                     address_list = [addr.strip() for addr in addresses.split('\n') if addr.strip()]
-                    recipients = {addr: amount for addr in address_list}
+                    recipients = dict.fromkeys(address_list, amount)
                     
                     success, message = erc20_factory_instance.airdrop(contract_address, recipients)
                     if success:
+                        hub.notify_change()
                         return f"Airdrop successful: {message}"
                     else:
                         return f"Airdrop failed: {message}"
@@ -382,8 +396,8 @@ with gr.Blocks(title="Spin.pet Math Model Demo") as demo:
                 # Function to get current leverage orders
                 def get_current_leverage_orders(addr):
                     if addr:
-                        short_orders = hub.pool.getShortOrder("", 100)  # Get all short orders
-                        long_orders = hub.pool.getLongOrder("", 100)  # Get all long orders
+                        short_orders = hub.get_short_order(100)  # Get all short orders
+                        long_orders = hub.get_long_order(100)  # Get all long orders
                         all_orders = short_orders + long_orders
                         return [order for order in all_orders if order['address'] == addr]
                     else:
@@ -477,9 +491,6 @@ with gr.Blocks(title="Spin.pet Math Model Demo") as demo:
                     else:
                         return "No orders to close."   
 
-                # Set up events
-                demo.load(fn=update_leverage_order_buttons, inputs=[user_addr], outputs=leverage_order_buttons + [leverage_order_ids_state], every=3)
-
                 # Set click events for each button
                 for i in range(max_leverage_orders):
                     leverage_order_buttons[i].click(
@@ -525,12 +536,6 @@ with gr.Blocks(title="Spin.pet Math Model Demo") as demo:
                     else:
                         return []
 
-                demo.load(
-                    fn=get_history_orders,
-                    inputs=[user_addr],
-                    outputs=history_positions,
-                    every=3
-                )
                 
             with gr.TabItem("Third-party Liquidation"):
                 gr.Markdown("When approaching liquidation price, any third party can liquidate orders and receive benefits, keeping trades flowing smoothly.")
@@ -539,28 +544,25 @@ with gr.Blocks(title="Spin.pet Math Model Demo") as demo:
                     near_short_node = gr.Textbox(label="Nearest Short Order ID", interactive=False)
 
                 def update_near_nodes():
-                    return hub.pool.nearLongNode, hub.pool.nearShortNode
+                    snapshot = hub.get_snapshot()
+                    return snapshot.nearLongNode, snapshot.nearShortNode
 
-                demo.load(fn=update_near_nodes, inputs=None, outputs=[near_long_node, near_short_node], every=3)
 
                 liquidate_button = gr.Button("Liquidate Long/Short Stop Orders")
                 liquidate_result = gr.Textbox(label="Liquidation Result", interactive=False)
 
                 def liquidate_orders(user_addr):
-                    long_result = False, "No long orders to liquidate"
-                    short_result = False, "No short orders to liquidate"
-
-                    if hub.pool.nearLongNode:
-                        long_order = hub.pool.getOrderByID(hub.pool.nearLongNode)
-                        if long_order:
-                            long_result = hub.long_close(user_addr, hub.pool.nearLongNode, long_order['buy_amount0'], isThirdParty=True)
-
-                    if hub.pool.nearShortNode:
-                        short_order = hub.pool.getOrderByID(hub.pool.nearShortNode)
-                        if short_order:
-                            short_result = hub.short_close(user_addr, hub.pool.nearShortNode, short_order['lendAmount0'], isThirdParty=True)
-
-                    return f"Long liquidation result: {long_result[1]}\nShort liquidation result: {short_result[1]}"
+                    # Sweep every eligible order (cascades and partial closes included), the fees go to user_addr
+                    report = LiquidationKeeper(hub, user_addr).sweep()
+                    if not report:
+                        return "No orders to liquidate"
+                    lines = [
+                        f"{close['side']} {close['orderID']}: {'full' if close['fullClose'] else 'partial'} close of {close['closeAmount0']:.4f}, "
+                        f"{close['message']} (price {close['price']:.6f})"
+                        for close in report
+                    ]
+                    liquidated = sum(1 for close in report if close['success'])
+                    return f"Liquidated {liquidated} of {len(report)} attempted closes\n" + "\n".join(lines)
 
                 liquidate_button.click(
                     fn=liquidate_orders,
@@ -605,10 +607,7 @@ with gr.Blocks(title="Spin.pet Math Model Demo") as demo:
                         for order in orders
                     ]
 
-                def update_global_orders(request: gr.Request):
-                    short_orders = hub.get_short_order(100)
-                    long_orders = hub.get_long_order(100)
-                    
+                def load_session(request: gr.Request):
                     # Get complete URL from headers
                     referer = request.headers.get("referer", "")
                     parsed_url = urlparse(referer)
@@ -624,16 +623,64 @@ with gr.Blocks(title="Spin.pet Math Model Demo") as demo:
                     if address not in ariMap:
                         ariMap[address] = 1
                         erc20_factory_instance.airdrop("0xUSDToken",{address:500000})
+                        hub.notify_change()
                     
                     
-                    return format_orders(short_orders), format_orders(long_orders),address
-
-                demo.load(
-                    fn=update_global_orders,
-                    inputs=None,
-                    outputs=[short_orders_display, long_orders_display,addr_input],
-                    every=3
-                )
+                    return address
+
+                # Runs once per page load, setting the address starts the account stream below
+                demo.load(fn=load_session, inputs=None, outputs=addr_input)
+
+    # Push pool state to each browser session when a trade commits instead of polling every 3 seconds
+    def get_global_state():
+        near_long, near_short = update_near_nodes()
+        return [
+            process_price_history(),
+            get_swap_hub_info(),
+            near_long,
+            near_short,
+            format_orders(hub.get_short_order(100)),
+            format_orders(hub.get_long_order(100)),
+        ]
+
+    def get_account_state(addr):
+        return [get_user_info(addr) if addr else ""] + update_leverage_order_buttons(addr) + [get_history_orders(addr)]
+
+    async def stream_state(get_state, *args):
+        # Recompute outputs on every change and send gr.update() (no change) for the ones that stayed the same.
+        # A heartbeat with an unchanged version sends only gr.update(), it just lets Gradio notice closed tabs.
+        last = None
+        last_version = None
+        async for version in hub.subscribe(heartbeat=15):
+            if last is not None and version == last_version:
+                yield [gr.update() for _ in last]
+                continue
+            last_version = version
+            values = await asyncio.to_thread(get_state, *args)
+            if last is None:
+                yield values
+            else:
+                yield [gr.update() if value == previous else value for value, previous in zip(values, last)]
+            last = values
+
+    async def stream_global_state():
+        async for outputs in stream_state(get_global_state):
+            yield outputs
+
+    async def stream_account_state(addr):
+        async for outputs in stream_state(get_account_state, addr):
+            yield outputs
+
+    account_outputs = [user_info] + leverage_order_buttons + [leverage_order_ids_state, history_positions]
+    demo.load(
+        fn=stream_global_state,
+        inputs=None,
+        outputs=[line_plot, swap_hub_info, near_long_node, near_short_node, short_orders_display, long_orders_display],
+        concurrency_limit=None
+    )
+    # A new address cancels the stream of the previous address and starts its own
+    account_stream = address_change.then(fn=stream_account_state, inputs=[user_addr], outputs=account_outputs, concurrency_limit=None)
+    addr_input.change(fn=None, inputs=None, outputs=None, cancels=[account_stream])
 
 
 
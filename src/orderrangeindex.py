@@ -0,0 +1,101 @@
+# File name: orderrangeindex.py
+
+from bisect import bisect_left, bisect_right
+
+
+class OrderRangeIndex:
+    """
+    Sorted array index of the liquidation price ranges [lowPrice, hightPrice] of one side of the order book.
+
+    Orders on the same side never overlap (insterShortOrder/insterLongOrder reject overlaps), so sorting by
+    lowPrice also sorts by hightPrice. This lets intersection checks run as a binary search instead of a
+    walk along the linked list.
+    """
+
+    def __init__(self):
+        self.lowPrices = []   # Lowest prices, ascending
+        self.hightPrices = []  # Highest prices, ascending (parallel to lowPrices)
+        self.orderIDs = []    # Order IDs (parallel to lowPrices)
+        self.ranges = {}      # orderID -> (lowPrice, hightPrice)
+        self.version = 0      # Incremented on every change to this side of the book
+
+    def __len__(self):
+        return len(self.orderIDs)
+
+    def __contains__(self, orderID):
+        return orderID in self.ranges
+
+    def insert(self, orderID, lowPrice, hightPrice):
+        """
+        Add an order range to the index
+        :param orderID: Order ID
+        :param lowPrice: Lowest price of the liquidation range
+        :param hightPrice: Highest price of the liquidation range
+        """
+        if orderID in self.ranges:
+            self.remove(orderID)
+        i = bisect_right(self.lowPrices, lowPrice)
+        self.lowPrices.insert(i, lowPrice)
+        self.hightPrices.insert(i, hightPrice)
+        self.orderIDs.insert(i, orderID)
+        self.ranges[orderID] = (lowPrice, hightPrice)
+        self.version += 1
+
+    def remove(self, orderID):
+        """
+        Remove an order range from the index
+        :param orderID: Order ID
+        :return: bool Whether the order was in the index
+        """
+        if orderID not in self.ranges:
+            return False
+        i = self._position(orderID)
+        del self.lowPrices[i]
+        del self.hightPrices[i]
+        del self.orderIDs[i]
+        del self.ranges[orderID]
+        self.version += 1
+        return True
+
+    def update(self, orderID, lowPrice, hightPrice):
+        """
+        Replace the range of an order (e.g. after partial liquidation)
+        """
+        self.remove(orderID)
+        self.insert(orderID, lowPrice, hightPrice)
+
+    def touch(self):
+        """
+        Record a change to order data that does not move any range
+        """
+        self.version += 1
+
+    def findIntersect(self, hightPrice, lowPrice):
+        """
+        Find an order whose range intersects [lowPrice, hightPrice]
+        :return: Order ID of the first (lowest) intersecting order, or None if there is no intersection
+        """
+        # First order whose highest price reaches the given lowest price
+        i = bisect_left(self.hightPrices, lowPrice)
+        if i < len(self.orderIDs) and self.lowPrices[i] <= hightPrice:
+            return self.orderIDs[i]
+        return None
+
+    def neighbours(self, lowPrice):
+        """
+        Find the slot for a new range starting at lowPrice
+        :param lowPrice: Lowest price of the new range
+        :return: (orderID of the range directly below or None, orderID of the range directly above or None)
+        """
+        i = bisect_right(self.lowPrices, lowPrice)
+        below = self.orderIDs[i - 1] if i > 0 else None
+        above = self.orderIDs[i] if i < len(self.orderIDs) else None
+        return below, above
+
+    def _position(self, orderID):
+        lowPrice = self.ranges[orderID][0]
+        i = bisect_left(self.lowPrices, lowPrice)
+        # Orders with equal lowPrice are adjacent, search among them
+        while self.orderIDs[i] != orderID:
+            i += 1
+        return i
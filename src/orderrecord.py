@@ -0,0 +1,107 @@
+# File name: orderrecord.py
+
+from collections.abc import MutableMapping
+
+# Every field a short or long order can carry, in the order they are written by shortOpen/longOpen/close
+ORDER_FIELDS = (
+    # Linked list section
+    'orderID', 'hightPrice', 'lowPrice', 'address', 'hightNode', 'lowNode',
+    # Data section
+    'orderType', 'baseAmount1', 'sell_amount1', 'lendAmount0', 'lendAmount1', 'buy_amount0',
+    'forcedClosePrice', 'loan_fee', 'loan_day_fee', 'third_fee', 'loan_time', 'openPrice',
+    # Debug section
+    'insterOrderID',
+    # Closing data (set when the order moves to history)
+    'closePrice', 'closeTimestamp', 'closeType', 'profitLoss', 'petLoss',
+)
+_ORDER_FIELD_SET = frozenset(ORDER_FIELDS)
+_MISSING = object()
+
+
+class OrderRecord(MutableMapping):
+    """
+    Compact order record stored in orderShortMap/orderLongMap and addressHistoryMap.
+
+    Fields live in __slots__ instead of a per-order dict, which roughly halves the memory of an order.
+    The record still behaves like the dict it replaces: order['loan_fee'], order.get(...), 'closeType' in order,
+    order.update({...}), dict(order) and iteration all work with the same field names. Only fields that have been
+    set are present, so short orders have no 'buy_amount0' key and long orders have no 'lendAmount0' key.
+    Keys outside ORDER_FIELDS are accepted and kept in a small overflow dict.
+    """
+
+    __slots__ = ORDER_FIELDS + ('_extra',)
+
+    def __init__(self, data=None, /, **fields):
+        self._extra = None
+        if data is not None:
+            self.update(data)
+        if fields:
+            self.update(fields)
+
+    def __getitem__(self, key):
+        if key in _ORDER_FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in _ORDER_FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _ORDER_FIELD_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in _ORDER_FIELD_SET:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        return iter(self.toDict())
+
+    def __len__(self):
+        count = sum(1 for key in ORDER_FIELDS if hasattr(self, key))
+        return count + (len(self._extra) if self._extra else 0)
+
+    def __repr__(self):
+        return f"OrderRecord({self.toDict()!r})"
+
+    def copy(self):
+        return OrderRecord(self)
+
+    def restore(self, fields):
+        """
+        Reset the record to exactly the given fields (a toDict() result), used to undo changes
+        """
+        for key in ORDER_FIELDS:
+            value = fields.get(key, _MISSING)
+            if value is not _MISSING:
+                setattr(self, key, value)
+            elif hasattr(self, key):
+                delattr(self, key)
+        self._extra = {key: value for key, value in fields.items() if key not in _ORDER_FIELD_SET} or None
+
+    def toDict(self):
+        """
+        Plain dict copy of the set fields, much faster than dict(record) which goes through __getitem__ per key
+        """
+        result = {key: value for key in ORDER_FIELDS if (value := getattr(self, key, _MISSING)) is not _MISSING}
+        if self._extra:
+            result.update(self._extra)
+        return result
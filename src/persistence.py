@@ -0,0 +1,247 @@
+# File name: persistence.py
+
+import os
+import pickle
+import struct
+import threading
+import zlib
+from erc20factory import erc20_factory_instance
+
+_FRAME = struct.Struct("<II")  # Log record header: payload length, payload crc32
+POOL_OPERATIONS = frozenset(("buy", "sell", "shortOpen", "shortClose", "longOpen", "longClose", "submitBatch"))
+LEDGER_OPERATIONS = {"airdrop": "airdrop", "transfer": "transferFrom", "batchTransfer": "batchTransfer"}  # Log op -> Erc20Factory method
+FSYNC_POLICIES = ("always", "interval", "off")
+
+
+class Persistence:
+    """
+    Durable pool, order book and ledger state: a write-ahead log of committed operations plus periodic snapshots.
+
+    Every committed SwapHub trade and every journaled ledger change (Erc20Factory airdrop and batchTransfer, and the
+    transfers of the API /transfer route) is appended to wal.log as a CRC-checked pickle record. Ledger changes made
+    through other paths, e.g. a bare transferFrom, are not logged and are only persisted by the next checkpoint.
+    Every checkpoint_interval records the whole state (the factory with its pools and order books, and the token
+    ledger) is pickled to snapshot.pkl and the log is emptied, so recovery loads one snapshot and replays at most
+    checkpoint_interval trades, each with its original timestamp.
+
+    fsync policy:
+        "always"   - fsync every record, a trade is on disk when the call returns
+        "interval" - group commit: records reach the OS on every append, a background thread fsyncs them together
+                     at most every fsync_interval seconds
+        "off"      - never fsync, leave write-back to the OS
+    """
+
+    def __init__(self, directory, fsync="interval", fsync_interval=0.05, checkpoint_interval=50000, erc20=erc20_factory_instance):
+        """
+        :param directory: Directory holding snapshot.pkl and wal.log, created if missing
+        :param fsync: fsync policy, one of FSYNC_POLICIES
+        :param fsync_interval: Seconds between group fsyncs for the "interval" policy
+        :param checkpoint_interval: Number of logged records after which a new snapshot is written
+        :param erc20: Token ledger to persist, the global erc20_factory_instance by default
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, "snapshot.pkl")
+        self.wal_path = os.path.join(directory, "wal.log")
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.erc20 = erc20
+        self.factory = None
+        self.lock = threading.RLock()  # Held while an operation is applied and appended, and while checkpointing
+        self.seq = 0  # Sequence number of the last logged record
+        self.records_since_checkpoint = 0
+        self._wal = None
+        self._dirty = False  # Records written since the last fsync
+        self._closed = threading.Event()
+        self._flusher = None
+
+    def recover(self):
+        """
+        Load the latest snapshot and replay the log records written after it.
+        Call before attach(), so replayed operations are not logged again.
+        :return: The recovered ShortSwapV1Factory, or None when nothing has been persisted yet
+        """
+        with self.lock:
+            factory = None
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "rb") as f:
+                    state = pickle.load(f)
+                factory = state["factory"]
+                self.seq = state["seq"]
+                self.erc20.tokens = state["tokens"]
+                self.erc20.balances = state["balances"]
+                self.erc20.reindexHolders()
+
+            records, valid_size = self._read_log()
+            pools = list(factory.pools.values()) if factory is not None else []
+            for pool in pools:
+                pool.publishSnapshots = False  # Readers only need the final state
+            replayed = 0
+            try:
+                for record in records:
+                    if record[0] <= self.seq:
+                        continue  # Already contained in the snapshot (crash between snapshot and log truncation)
+                    if factory is None:
+                        raise RuntimeError(f"Write-ahead log {self.wal_path} has records but there is no snapshot")
+                    self._replay(factory, record)
+                    self.seq = record[0]
+                    replayed += 1
+            finally:
+                for pool in pools:
+                    pool.publishSnapshots = True
+                    pool.publishSnapshot()
+
+            # Drop a torn record left by a crash in the middle of a write, later appends must follow valid data
+            if os.path.exists(self.wal_path) and os.path.getsize(self.wal_path) > valid_size:
+                with open(self.wal_path, "r+b") as f:
+                    f.truncate(valid_size)
+            self.records_since_checkpoint = replayed
+            return factory
+
+    def attach(self, factory):
+        """
+        Start journaling the state of factory. Erc20Factory airdrops and batch transfers are logged from now on, SwapHub
+        trades are logged by hubs created with SwapHub(pool, journal=persistence). Writes the first snapshot if there is
+        none.
+        :param factory: ShortSwapV1Factory whose pools are persisted
+        """
+        with self.lock:
+            self.factory = factory
+            self._wal = open(self.wal_path, "ab")
+            self.erc20.journal = self
+            if not os.path.exists(self.snapshot_path):
+                self.checkpoint()
+        if self.fsync == "interval":
+            self._flusher = threading.Thread(target=self._flush_loop, name="wal-fsync", daemon=True)
+            self._flusher.start()
+
+    def append(self, target, op, caller, args, timestamp):
+        """
+        Append one committed operation to the log, call while holding self.lock together with applying it
+        :param target: Pool address, or "erc20" for token ledger operations
+        :param op: Operation name, a ShortSwapV1Pool method in POOL_OPERATIONS or a key of LEDGER_OPERATIONS
+        :param caller: Caller address (None for ledger operations)
+        :param args: Operation arguments
+        :param timestamp: Time the operation ran with (None for ledger operations)
+        """
+        with self.lock:
+            self.seq += 1
+            payload = pickle.dumps((self.seq, timestamp, target, op, caller, args), pickle.HIGHEST_PROTOCOL)
+            self._wal.write(_FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+            self._wal.flush()
+            if self.fsync == "always":
+                os.fsync(self._wal.fileno())
+            else:
+                self._dirty = True
+            self.records_since_checkpoint += 1
+            if self.records_since_checkpoint >= self.checkpoint_interval:
+                self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Write a snapshot of the full state and empty the log
+        """
+        with self.lock:
+            state = {
+                "seq": self.seq,
+                "factory": self.factory,
+                "tokens": self.erc20.tokens,
+                "balances": self.erc20.balances,
+            }
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            self._sync_directory()
+
+            # Everything up to self.seq is in the snapshot now
+            self._wal.seek(0)
+            self._wal.truncate()
+            self._wal.flush()
+            os.fsync(self._wal.fileno())
+            self._dirty = False
+            self.records_since_checkpoint = 0
+
+    def sync(self):
+        """
+        fsync records written since the last fsync
+        """
+        with self.lock:
+            if not self._dirty or self._wal is None:
+                return
+            self._dirty = False
+            fileno = self._wal.fileno()
+        # fsync outside the lock, trades keep appending while the disk catches up
+        os.fsync(fileno)
+
+    def close(self):
+        """
+        Stop journaling, fsync the log and close it
+        """
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        with self.lock:
+            if self._wal is None:
+                return
+            self._wal.flush()
+            os.fsync(self._wal.fileno())
+            self._wal.close()
+            self._wal = None
+            if self.erc20.journal is self:
+                self.erc20.journal = None
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            self.sync()
+
+    def _read_log(self):
+        """
+        Read all intact records of the log
+        :return: (records, size in bytes of the intact prefix)
+        """
+        if not os.path.exists(self.wal_path):
+            return [], 0
+        with open(self.wal_path, "rb") as f:
+            data = f.read()
+        records = []
+        pos = 0
+        while pos + _FRAME.size <= len(data):
+            length, crc = _FRAME.unpack_from(data, pos)
+            start = pos + _FRAME.size
+            end = start + length
+            if end > len(data) or zlib.crc32(data[start:end]) != crc:
+                break
+            records.append(pickle.loads(data[start:end]))
+            pos = end
+        return records, pos
+
+    def _replay(self, factory, record):
+        seq, timestamp, target, op, caller, args = record
+        if target == "erc20":
+            if op not in LEDGER_OPERATIONS:
+                raise RuntimeError(f"Unknown ledger operation {op!r} in log record {seq}")
+            result = getattr(self.erc20, LEDGER_OPERATIONS[op])(*args)
+        else:
+            pool = factory.getPool(target)
+            if pool is None or op not in POOL_OPERATIONS:
+                raise RuntimeError(f"Cannot replay log record {seq}: {op!r} on pool {target!r}")
+            result = getattr(pool.use(caller).at(timestamp), op)(*args)
+        if not result[0]:
+            raise RuntimeError(f"Replay of log record {seq} ({op}) diverged: {result[1]}")
+
+    def _sync_directory(self):
+        # Make the snapshot rename durable, directories cannot be opened for fsync on Windows
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,301 @@
+# File name: poolshards.py
+
+import itertools
+import multiprocessing
+import os
+import threading
+from functools import partial
+from erc20factory import erc20_factory_instance
+
+SETTLEMENT_ADDRESS = "0xShardSettlement"  # Shard ledgers: tokens withdrawn back to the home ledger are parked here
+
+
+def escrow_address(shard):
+    """
+    Home ledger address holding the tokens deposited into a shard
+    """
+    return f"0xShardEscrow{shard}"
+
+
+class ShardedFactory:
+    """
+    Pools spread over worker processes: each worker owns the pools assigned to it, with their SwapHubs and a token
+    ledger of its own, and runs their trades in its own interpreter. Calls are routed to the worker by pool_address,
+    over one pipe per worker; pools on different workers never wait for each other.
+
+    The ledger of this process (erc20_factory_instance) is the home ledger, the only state shared between shards.
+    The token0 of a pool lives in its worker's ledger only. Home tokens (e.g. USDT) reach a shard through the
+    settlement path: deposit() moves the amount to the shard's escrow address on the home ledger, then credits it on
+    the shard; withdraw() moves it from the holder to SETTLEMENT_ADDRESS on the shard, then releases it from escrow at
+    home. So for every home token and shard, the escrow balance equals the shard's supply minus its
+    SETTLEMENT_ADDRESS balance (verify_settlement()). Moving tokens from one shard to another is a withdraw() from
+    the first followed by a deposit() into the second.
+    """
+
+    def __init__(self, workers=None):
+        """
+        :param workers: Number of worker processes, defaults to the number of CPUs
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.pools = {}  # pool_address -> _Shard
+        context = multiprocessing.get_context("spawn")  # Fresh interpreters, workers must not inherit the home ledger
+        self._shards = []
+        for index in range(self.workers):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=_worker_main, args=(worker_connection,), name=f"pool-shard-{index}", daemon=True)
+            process.start()
+            worker_connection.close()
+            self._shards.append(_Shard(index, process, connection))
+        self._assign = itertools.cycle(self._shards)
+        self._assign_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Stop the worker processes (their pools and ledgers are discarded)
+        """
+        for shard in self._shards:
+            shard.stop()
+        self._shards = []
+
+    def createPool(self, address, name, symbol, decimals, totalSupply, shortSupply, tokenBase, tokenBaseAmount, fixedPoint=False):
+        """
+        Create a pool on the next worker (round robin), same arguments as ShortSwapV1Factory.createPool
+        :return: Pool address
+        """
+        with self._assign_lock:
+            shard = next(self._assign)
+        pool_address = shard.request([(None, "createPool", (address, name, symbol, decimals, totalSupply, shortSupply, tokenBase, tokenBaseAmount, fixedPoint), {})])[0]
+        self.pools[pool_address] = shard
+        return pool_address
+
+    def getHub(self, pool_address):
+        """
+        :return: ShardHub forwarding SwapHub calls to the worker of the pool, or None for an unknown pool
+        """
+        return ShardHub(self, pool_address) if pool_address in self.pools else None
+
+    def shardOf(self, pool_address):
+        """
+        :return: Index of the worker running the pool
+        """
+        return self.pools[pool_address].index
+
+    def call(self, pool_address, method, *args, **kwargs):
+        """
+        Run one SwapHub method of a pool in its worker
+        :return: The method's result, exceptions raised by the method are raised here
+        """
+        return self.pools[pool_address].request([(pool_address, method, args, kwargs)])[0]
+
+    def call_many(self, calls):
+        """
+        Run SwapHub calls on many pools at once: every worker receives its share in one message and the workers run
+        them in parallel. Calls of the same pool run in list order.
+        :param calls: List of (pool_address, method, args)
+        :return: List of results, in the order of calls
+        """
+        by_shard = {}
+        for position, (pool_address, method, args) in enumerate(calls):
+            shard = self.pools[pool_address]
+            positions, items = by_shard.setdefault(shard.index, ([], []))
+            positions.append(position)
+            items.append((pool_address, method, tuple(args), {}))
+        results = [None] * len(calls)
+        shards = [self._shards[index] for index in sorted(by_shard)]  # Locks are always taken in index order
+        for shard in shards:
+            shard.lock.acquire()
+        try:
+            for shard in shards:
+                shard.connection.send(by_shard[shard.index][1])
+            errors = []
+            for shard in shards:
+                positions = by_shard[shard.index][0]
+                for position, (ok, value) in zip(positions, shard.connection.recv()):
+                    results[position] = value
+                    if not ok:
+                        errors.append(value)
+        finally:
+            for shard in reversed(shards):
+                shard.lock.release()
+        if errors:
+            raise errors[0]
+        return results
+
+    def deposit(self, pool_address, token, address, amount):
+        """
+        Move home ledger tokens of address into the ledger of the pool's worker
+        :return: (bool, message)
+        """
+        info = erc20_factory_instance.tokens.get(token)
+        if info is None:
+            return False, "Token contract does not exist"
+        shard = self.pools[pool_address]
+        escrow = escrow_address(shard.index)
+        success, message = erc20_factory_instance.transferFrom(token, address, escrow, amount)
+        if not success:
+            return False, message
+        try:
+            success, message = shard.request([(None, "credit", (token, info["name"], info["symbol"], info["decimals"], address, amount), {})])[0]
+        except BaseException:
+            erc20_factory_instance.transferFrom(token, escrow, address, amount)  # Not credited on the shard
+            raise
+        if not success:
+            erc20_factory_instance.transferFrom(token, escrow, address, amount)
+            return False, message
+        return True, "Deposit successful"
+
+    def withdraw(self, pool_address, token, address, amount):
+        """
+        Move tokens of address from the ledger of the pool's worker back to the home ledger
+        :return: (bool, message)
+        """
+        shard = self.pools[pool_address]
+        success, message = shard.request([(None, "debit", (token, address, amount), {})])[0]
+        if not success:
+            return False, message
+        # Cannot fail: the escrow holds every token credited on the shard and not withdrawn yet
+        erc20_factory_instance.transferFrom(token, escrow_address(shard.index), address, amount)
+        return True, "Withdrawal successful"
+
+    def balanceOf(self, pool_address, token, address):
+        """
+        Balance of address in the ledger of the pool's worker
+        """
+        return self.pools[pool_address].request([(None, "balanceOf", (token, address), {})])[0]
+
+    def verify_settlement(self):
+        """
+        Check every escrow balance against the tokens in circulation on its shard
+        :return: List of (shard index, token, escrow balance, shard circulation) that differ, empty when consistent
+        """
+        mismatches = []
+        for shard in self._shards:
+            escrow = escrow_address(shard.index)
+            tokens = [token for token, info in erc20_factory_instance.tokens.items() if escrow in info["balances"]]
+            circulation = shard.request([(None, "circulation", (tokens,), {})])[0]
+            for token in tokens:
+                escrowed = erc20_factory_instance.balanceOf(token, escrow)
+                if abs(escrowed - circulation[token]) > 1e-9 * max(1, abs(escrowed)):
+                    mismatches.append((shard.index, token, escrowed, circulation[token]))
+        return mismatches
+
+
+class ShardHub:
+    """
+    SwapHub of a pool running in a worker process, every public SwapHub method is forwarded, e.g.
+    factory.getHub(pool_address).buy("0xA", 100)
+    """
+
+    __slots__ = ('factory', 'pool_address')
+
+    def __init__(self, factory, pool_address):
+        self.factory = factory
+        self.pool_address = pool_address
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return partial(self.factory.call, self.pool_address, name)
+
+
+class _Shard:
+    # One worker process and the client end of its pipe, a round trip holds the lock
+
+    def __init__(self, index, process, connection):
+        self.index = index
+        self.process = process
+        self.connection = connection
+        self.lock = threading.Lock()
+
+    def request(self, items):
+        with self.lock:
+            self.connection.send(items)
+            replies = self.connection.recv()
+        for ok, value in replies:
+            if not ok:
+                raise value
+        return [value for _ok, value in replies]
+
+    def stop(self):
+        with self.lock:
+            try:
+                self.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.connection.close()
+        self.process.join()
+
+
+def _worker_main(connection):
+    # Worker process loop: receive a list of (pool_address or None, method, args, kwargs), reply with a list of
+    # (ok, result or exception). pool_address None addresses the worker itself (_WORKER_OPERATIONS).
+    from shortswapv1factory import ShortSwapV1Factory
+    from swaphub import SwapHub
+
+    factory = ShortSwapV1Factory()
+    hubs = {}
+
+    def create_pool(*args):
+        pool_address = factory.createPool(*args)
+        hubs[pool_address] = SwapHub(factory.getPool(pool_address))
+        return pool_address
+
+    operations = dict(_WORKER_OPERATIONS, createPool=create_pool)
+    while True:
+        try:
+            items = connection.recv()
+        except EOFError:
+            break
+        if items is None:
+            break
+        replies = []
+        for pool_address, method, args, kwargs in items:
+            try:
+                if pool_address is None:
+                    result = operations[method](*args, **kwargs)
+                elif method.startswith('_'):
+                    raise AttributeError(f"SwapHub method {method!r} is private")
+                else:
+                    result = getattr(hubs[pool_address], method)(*args, **kwargs)
+                replies.append((True, result))
+            except Exception as error:
+                replies.append((False, error))
+        try:
+            connection.send(replies)
+        except Exception as error:  # A result that cannot be pickled, e.g. a snapshot with read-only proxies
+            connection.send([(False, RuntimeError(f"Result of {item[1]} cannot be sent back: {error}")) for item in items])
+
+
+def _credit(token, name, symbol, decimals, address, amount):
+    erc20 = erc20_factory_instance
+    if token not in erc20.tokens:
+        erc20.createErc20Test(SETTLEMENT_ADDRESS, name, symbol, decimals, 0, token)
+    if erc20.balanceOf(token, SETTLEMENT_ADDRESS) >= amount:
+        return erc20.transferFrom(token, SETTLEMENT_ADDRESS, address, amount)  # Reuse withdrawn tokens
+    return erc20.airdrop(token, {address: amount})
+
+
+def _debit(token, address, amount):
+    if token not in erc20_factory_instance.tokens:
+        return False, "Token contract does not exist"
+    return erc20_factory_instance.transferFrom(token, address, SETTLEMENT_ADDRESS, amount)
+
+
+def _circulation(tokens):
+    erc20 = erc20_factory_instance
+    return {token: erc20.totalSupply(token) - erc20.balanceOf(token, SETTLEMENT_ADDRESS) if token in erc20.tokens else 0
+            for token in tokens}
+
+
+_WORKER_OPERATIONS = {
+    "credit": _credit,
+    "debit": _debit,
+    "balanceOf": erc20_factory_instance.balanceOf,
+    "circulation": _circulation,
+}
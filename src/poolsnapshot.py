@@ -0,0 +1,71 @@
+# File name: poolsnapshot.py
+
+import time
+from collections import namedtuple
+from types import MappingProxyType
+from orderrecord import OrderRecord
+
+# Immutable view of a pool published after every committed mutation
+# Readers grab pool.snapshot without locking; version increases by one per publish
+PoolSnapshot = namedtuple("PoolSnapshot", [
+    "version",                 # Monotonically increasing snapshot version
+    "timestamp",               # Publish time
+    "reserve0",                # Token0 amount in liquidity pool
+    "reserve1",                # Token1 amount in liquidity pool
+    "price",                   # Current price
+    "loanReserve0",            # Token0 loan reserve amount
+    "loanReserve1",            # Token1 loan reserve amount
+    "collateralShortAmount1",  # Short collateral total amount
+    "collateralLongAmount1",   # Long collateral total amount
+    "nearShortNode",           # Nearest (lowest) short order ID
+    "nearLongNode",            # Nearest (highest) long order ID
+    "shortOrders",             # Tuple of read-only short orders from the nearest one up
+    "longOrders",              # Tuple of read-only long orders from the nearest one down
+    "shortBookVersion",        # shortRangeIndex.version the short orders were copied at
+    "longBookVersion",         # longRangeIndex.version the long orders were copied at
+    "info",                    # getInfo() JSON string
+])
+
+
+def _freeze_orders(orders):
+    return tuple(MappingProxyType(order.toDict() if isinstance(order, OrderRecord) else dict(order)) for order in orders)
+
+
+def build_snapshot(pool, version, previous=None):
+    """
+    Build an immutable snapshot of the pool state
+    :param pool: ShortSwapV1Pool instance
+    :param version: Version number of the new snapshot
+    :param previous: Previous snapshot, whose order tuples are reused for sides of the book that did not change
+    :return: PoolSnapshot
+    """
+    depth = pool.snapshotOrderDepth
+    short_book_version = pool.shortRangeIndex.version
+    long_book_version = pool.longRangeIndex.version
+    if previous is not None and previous.shortBookVersion == short_book_version:
+        short_orders = previous.shortOrders
+    else:
+        short_orders = _freeze_orders(pool.getShortOrder(pool.nearShortNode, depth))
+    if previous is not None and previous.longBookVersion == long_book_version:
+        long_orders = previous.longOrders
+    else:
+        long_orders = _freeze_orders(pool.getLongOrder(pool.nearLongNode, depth))
+
+    return PoolSnapshot(
+        version=version,
+        timestamp=time.time(),
+        reserve0=pool.reserve0,
+        reserve1=pool.reserve1,
+        price=pool.getPrice(),
+        loanReserve0=pool.loanReserve0,
+        loanReserve1=pool.loanReserve1,
+        collateralShortAmount1=pool.collateralShortAmount1,
+        collateralLongAmount1=pool.collateralLongAmount1,
+        nearShortNode=pool.nearShortNode,
+        nearLongNode=pool.nearLongNode,
+        shortOrders=short_orders,
+        longOrders=long_orders,
+        shortBookVersion=short_book_version,
+        longBookVersion=long_book_version,
+        info=pool.getInfo(),
+    )
@@ -0,0 +1,65 @@
+# File name: pricechart.py
+
+import os
+import tempfile
+import threading
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+class PriceChart:
+    """
+    Price curve rendered once per price-history version and shared by every viewer.
+
+    The chart owns one Figure built with the object-oriented matplotlib API, so it never touches the global pyplot
+    state and is safe to call from Gradio worker threads. The figure and its line are created once, a new version
+    only replaces the line data and writes a new PNG. Viewers polling an unchanged history get the cached file path.
+    """
+
+    def __init__(self, hub, num=1000, directory=None):
+        """
+        :param hub: SwapHub whose price history is drawn
+        :param num: Number of most recent prices drawn
+        :param directory: Where PNG files are written, a new temporary directory by default
+        """
+        self.hub = hub
+        self.num = num
+        self.directory = directory or tempfile.mkdtemp(prefix="pricechart-")
+        self.figure = Figure()
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_subplot()
+        self.line, = self.axes.plot([], [])
+        self.axes.set_title('Price Curve')
+        self.axes.set_xlabel('Time')
+        self.axes.set_ylabel('Price')
+        self.version = None  # Price history version of the cached image
+        self.path = None     # Cached image
+        self.renders = 0     # Number of times the chart was actually drawn
+        self._previous_path = None
+        self._lock = threading.Lock()
+
+    def render(self):
+        """
+        :return: Path of a PNG with the current price curve, drawn only when the price history changed
+        """
+        version = self.hub.get_price_history_version()
+        if version == self.version:
+            return self.path
+        with self._lock:
+            if version == self.version:
+                return self.path  # Another viewer drew it while we waited
+            y_values = self.hub.get_price_history(self.num) or [0]  # Handle possible empty list return
+            self.line.set_data(range(1, len(y_values) + 1), y_values)
+            self.axes.relim()
+            self.axes.autoscale_view()
+            # A new file name per version, so browsers and the Gradio file cache never serve a stale chart
+            path = os.path.join(self.directory, f"price-{version}.png")
+            self.figure.savefig(path)
+            self.renders += 1
+            # Keep the previous file, a viewer may still be fetching it
+            if self._previous_path is not None and os.path.exists(self._previous_path):
+                os.remove(self._previous_path)
+            self._previous_path = self.path
+            self.version = version
+            self.path = path
+            return path
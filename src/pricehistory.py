@@ -0,0 +1,190 @@
+# File name: pricehistory.py
+
+import numpy as np
+
+BUY = 1    # Trade moved the price up
+SELL = -1  # Trade moved the price down
+
+DEFAULT_CANDLE_INTERVALS = (1, 60, 300, 3600)  # 1s / 1m / 5m / 1h
+
+
+class CandleSeries:
+    """
+    OHLCV candles of one interval in a preallocated ring buffer, updated in O(1) per trade
+    """
+
+    def __init__(self, interval, capacity=1000):
+        """
+        :param interval: Candle length in seconds
+        :param capacity: Number of most recent candles kept
+        """
+        self.interval = interval
+        self.capacity = capacity
+        self.starts = np.zeros(capacity, dtype=np.float64)  # Candle start time
+        self.opens = np.zeros(capacity, dtype=np.float64)
+        self.highs = np.zeros(capacity, dtype=np.float64)
+        self.lows = np.zeros(capacity, dtype=np.float64)
+        self.closes = np.zeros(capacity, dtype=np.float64)
+        self.volumes = np.zeros(capacity, dtype=np.float64)
+        self.count = 0   # Number of candles stored (at most capacity)
+        self.last = -1   # Slot of the newest candle
+
+    def update(self, timestamp, price, volume):
+        start = timestamp - timestamp % self.interval
+        i = self.last
+        if self.count and self.starts[i] == start:
+            if price > self.highs[i]:
+                self.highs[i] = price
+            if price < self.lows[i]:
+                self.lows[i] = price
+            self.closes[i] = price
+            self.volumes[i] += volume
+            return
+        # Trades arrive in time order, so a different start always opens the next candle
+        i = (i + 1) % self.capacity
+        self.last = i
+        self.count = min(self.count + 1, self.capacity)
+        self.starts[i] = start
+        self.opens[i] = self.highs[i] = self.lows[i] = self.closes[i] = price
+        self.volumes[i] = volume
+
+    def merge(self, high, low, close, volume):
+        """
+        Fold trades into the newest candle (the caller made sure they belong to it)
+        """
+        i = self.last
+        if high > self.highs[i]:
+            self.highs[i] = high
+        if low < self.lows[i]:
+            self.lows[i] = low
+        self.closes[i] = close
+        self.volumes[i] += volume
+
+    def latest(self, n=None):
+        """
+        Most recent candles in time order
+        :param n: Number of candles, all stored candles when None
+        :return: dict of NumPy arrays: start, open, high, low, close, volume
+        """
+        order = _ring_order(self.last, self.count, self.capacity, n)
+        return {
+            "start": self.starts[order],
+            "open": self.opens[order],
+            "high": self.highs[order],
+            "low": self.lows[order],
+            "close": self.closes[order],
+            "volume": self.volumes[order],
+        }
+
+
+class PriceHistory:
+    """
+    Tick history (timestamp, price, volume, side) in preallocated NumPy ring buffers, with OHLCV candles.
+    append() is O(1): it writes one slot and updates one candle per interval, nothing is shifted or copied.
+    """
+
+    def __init__(self, capacity=100000, candle_intervals=DEFAULT_CANDLE_INTERVALS, candle_capacity=1000):
+        """
+        :param capacity: Number of most recent ticks kept
+        :param candle_intervals: Candle lengths in seconds
+        :param candle_capacity: Number of most recent candles kept per interval
+        """
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.prices = np.zeros(capacity, dtype=np.float64)
+        self.volumes = np.zeros(capacity, dtype=np.float64)  # Token0 amount that went through the pool
+        self.sides = np.zeros(capacity, dtype=np.int8)       # BUY or SELL
+        self.count = 0  # Number of ticks stored (at most capacity)
+        self.last = -1  # Slot of the newest tick
+        self.version = 0  # Number of ticks ever appended, changes whenever the history changes
+        self.candles = {interval: CandleSeries(interval, candle_capacity) for interval in candle_intervals}
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, price, volume, side):
+        """
+        Record one trade
+        :param timestamp: Trade time (seconds)
+        :param price: Price after the trade
+        :param volume: Traded token0 amount
+        :param side: BUY or SELL
+        """
+        i = (self.last + 1) % self.capacity
+        self.last = i
+        self.count = min(self.count + 1, self.capacity)
+        self.timestamps[i] = timestamp
+        self.prices[i] = price
+        self.volumes[i] = volume
+        self.sides[i] = side
+        self.version += 1
+        for series in self.candles.values():
+            series.update(timestamp, price, volume)
+
+    def extend(self, timestamp, prices, volumes, sides):
+        """
+        Record several trades made at the same time, in order (same result as append() for each)
+        :param timestamp: Trade time (seconds) shared by all trades
+        :param prices: Prices after each trade
+        :param volumes: Traded token0 amounts
+        :param sides: BUY or SELL per trade
+        """
+        n = len(prices)
+        if n == 0:
+            return
+        # All trades fall into the same candle of every interval
+        high, low, total = max(prices), min(prices), float(np.sum(volumes))
+        for series in self.candles.values():
+            series.update(timestamp, prices[0], 0.0)
+            series.merge(high, low, prices[-1], total)
+        if n > self.capacity:
+            prices, volumes, sides = prices[-self.capacity:], volumes[-self.capacity:], sides[-self.capacity:]
+        slots = np.arange(self.last + 1, self.last + 1 + len(prices)) % self.capacity
+        self.timestamps[slots] = timestamp
+        self.prices[slots] = prices
+        self.volumes[slots] = volumes
+        self.sides[slots] = sides
+        self.last = int(slots[-1])
+        self.count = min(self.count + len(prices), self.capacity)
+        self.version += n
+
+    def last_price(self):
+        return self.prices[self.last] if self.count else None
+
+    def latest_prices(self, n=None):
+        """
+        Most recent prices in time order
+        :param n: Number of prices, all stored prices when None
+        :return: NumPy array (a copy)
+        """
+        return self.prices[_ring_order(self.last, self.count, self.capacity, n)]
+
+    def latest_ticks(self, n=None):
+        """
+        Most recent ticks in time order
+        :param n: Number of ticks, all stored ticks when None
+        :return: dict of NumPy arrays: timestamp, price, volume, side
+        """
+        order = _ring_order(self.last, self.count, self.capacity, n)
+        return {
+            "timestamp": self.timestamps[order],
+            "price": self.prices[order],
+            "volume": self.volumes[order],
+            "side": self.sides[order],
+        }
+
+    def get_candles(self, interval, n=None):
+        """
+        :param interval: One of the configured candle intervals (seconds)
+        :param n: Number of candles, all stored candles when None
+        :return: dict of NumPy arrays: start, open, high, low, close, volume
+        """
+        if interval not in self.candles:
+            raise ValueError(f"No candles with interval {interval}s, configured: {sorted(self.candles)}")
+        return self.candles[interval].latest(n)
+
+
+def _ring_order(last, count, capacity, n):
+    # Slot indexes of the newest n entries, oldest first
+    n = count if n is None else max(0, min(n, count))
+    return np.arange(last - n + 1, last + 1) % capacity
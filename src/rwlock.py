@@ -0,0 +1,67 @@
+# File name: rwlock.py
+
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Reader/writer lock: any number of readers may hold the lock together, a writer holds it alone.
+    Waiting writers block new readers, so readers cannot keep a writer out indefinitely. That is an admission order,
+    not a throughput guarantee: reader threads still share the interpreter with the writer, and many busy readers
+    slow trades down with either lock (see bench_swaphub_concurrency.py).
+    The lock is not reentrant: do not take read() or write() again while holding it.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0          # Number of active readers
+        self._writer = False       # Whether a writer holds the lock
+        self._writers_waiting = 0  # Number of writers waiting for the lock
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        """
+        Hold the lock shared for the duration of a with block
+        """
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        """
+        Hold the lock exclusively for the duration of a with block
+        """
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
@@ -4,12 +4,22 @@ import random
 import string
 from erc20factory import erc20_factory_instance
 from shortswapv1pool import ShortSwapV1Pool
+from swap_utils_fixed import to_units
 
 class ShortSwapV1Factory:
     def __init__(self):
         self.pools = {}
 
-    def createPool(self, address, name, symbol, decimals, totalSupply, shortSupply, tokenBase, tokenBaseAmount):
+    def createPool(self, address, name, symbol, decimals, totalSupply, shortSupply, tokenBase, tokenBaseAmount, fixedPoint=False):
+        """
+        :param fixedPoint: Create a fixed point pool, the amounts here are still given in tokens and are converted to
+                           18-decimal base units (tokenBase balances must already be in base units)
+        """
+        if fixedPoint:
+            if decimals != 18:
+                raise ValueError("Fixed point pools use 18-decimal base units, decimals must be 18")
+            totalSupply, shortSupply, tokenBaseAmount = to_units(totalSupply), to_units(shortSupply), to_units(tokenBaseAmount)
+
         # Create a new ERC20 token
         token0 = erc20_factory_instance.createErc20(address, name, symbol, decimals, totalSupply)
         
@@ -17,7 +27,7 @@ class ShortSwapV1Factory:
         pool_address = "0x" + ''.join(random.choices(string.hexdigits, k=40)).lower()
         
         # Create ShortSwapV1Pool object  
-        pool = ShortSwapV1Pool(factory=self, token0=token0, token1=tokenBase, token0TotalSupply=totalSupply, token0ShortSupply=shortSupply, token1Amount=tokenBaseAmount, poolAddress=pool_address)
+        pool = ShortSwapV1Pool(factory=self, token0=token0, token1=tokenBase, token0TotalSupply=totalSupply, token0ShortSupply=shortSupply, token1Amount=tokenBaseAmount, poolAddress=pool_address, fixedPoint=fixedPoint)
         
         # Send all new tokens to pool address
         success, message = erc20_factory_instance.use(address).transfer(token0, pool_address, totalSupply)
@@ -1,4 +1,7 @@
 import shortuuid
+from orderrangeindex import OrderRangeIndex
+from orderrecord import OrderRecord
+from expiryqueue import ExpiryQueue
 
 class ShortSwapV1Order:
     def __init__(self):
@@ -11,10 +14,18 @@ class ShortSwapV1Order:
         self.orderLongMap = {}
         self.nearLongNode = ""
         
+        # Sorted price range indexes kept alongside the linked lists, for O(log n) intersection checks
+        self.shortRangeIndex = OrderRangeIndex()
+        self.longRangeIndex = OrderRangeIndex()
+        
         self.addressNodeMap = {}   
         self.addressHistoryMap = {}   
         
         self.orderCount = 0   
+        
+        self.expiryQueue = ExpiryQueue()  # Open orders of both sides by loan_time, for lending time limit liquidations
+        
+        self.undoLog = None  # (function, args) pairs undoing order book changes, a list while a pool transaction runs
           
     def generateOrderID(self,head):
         #return shortuuid.uuid()[:8]  # Generate 8-character short ID
@@ -38,24 +49,21 @@ class ShortSwapV1Order:
         #print("insterShortOrder =",node['lowPrice'],node['hightPrice'] )
         if not self.nearShortNode:
             # List is empty, insert directly
-            self.orderShortMap[node['orderID']] = node
+            self._addOrderNode(self.orderShortMap, self.shortRangeIndex, node)
             self.nearShortNode = node['orderID']
-            self._addOrderToAddressMap(node['address'], node['orderID'])
             return True, "Successfully inserted first node"
 
         if nodeOrderID == "":
             # Insert at the bottom
             
             lowest_node = self.orderShortMap[self.nearShortNode]
-            print("New node:", node['lowPrice'], node['hightPrice'])
-            print("Old node:",lowest_node['lowPrice'],lowest_node['hightPrice'])
             if node['hightPrice'] <= lowest_node['lowPrice']:
+                self._saveOrder(lowest_node)
                 node['hightNode'] = self.nearShortNode
                 lowest_node['lowNode'] = node['orderID']
-                self.orderShortMap[node['orderID']] = node
+                self._addOrderNode(self.orderShortMap, self.shortRangeIndex, node)
                 self.orderShortMap[self.nearShortNode] = lowest_node
                 self.nearShortNode = node['orderID']
-                self._addOrderToAddressMap(node['address'], node['orderID'])
                 return True, "Successfully inserted at bottom"
             return False, "New node overlaps with lowest node"
 
@@ -67,27 +75,53 @@ class ShortSwapV1Order:
             if current_node['hightNode']:
                 upper_node = self.orderShortMap[current_node['hightNode']]
                 if node['hightPrice'] <= upper_node['lowPrice']:
+                    self._saveOrder(current_node)
+                    self._saveOrder(upper_node)
                     node['hightNode'] = current_node['hightNode']
                     node['lowNode'] = current_node['orderID']
                     current_node['hightNode'] = node['orderID']
                     upper_node['lowNode'] = node['orderID']
-                    self.orderShortMap[node['orderID']] = node
+                    self._addOrderNode(self.orderShortMap, self.shortRangeIndex, node)
                     self.orderShortMap[current_node['orderID']] = current_node
                     self.orderShortMap[upper_node['orderID']] = upper_node
-                    self._addOrderToAddressMap(node['address'], node['orderID'])
                     return True, "Successfully inserted new node"
                 return False, "New node overlaps with upper node"
             else:
+                self._saveOrder(current_node)
                 node['hightNode'] = current_node['hightNode']
                 node['lowNode'] = current_node['orderID']
                 current_node['hightNode'] = node['orderID']
-                self.orderShortMap[node['orderID']] = node
+                self._addOrderNode(self.orderShortMap, self.shortRangeIndex, node)
                 self.orderShortMap[current_node['orderID']] = current_node
-                self._addOrderToAddressMap(node['address'], node['orderID'])
                 return True, "Successfully inserted at top"
         return False, "New node overlaps with current node"
 
 
+    def insterShortOrderAuto(self, node, hintOrderID=""):
+        """
+        Insert a new short order node, locating its position from the node's price range
+
+        :param node: The node to insert, containing order ID, highest price, lowest price, address and data etc.
+        :param hintOrderID: Optional expected lower neighbour (same meaning as nodeOrderID of insterShortOrder). Used directly when still correct, otherwise the position is looked up in shortRangeIndex
+        :return: (bool, str) Whether the insertion was successful and corresponding message
+        """
+        if node['hightPrice'] <= node['lowPrice']:
+            return False, "Highest price must be greater than lowest price"
+
+        # Fast path: the hint is still the correct lower neighbour (checked in O(1) by insterShortOrder)
+        if hintOrderID == "" or hintOrderID in self.orderShortMap:
+            success, message = self.insterShortOrder(node, hintOrderID)
+            if success:
+                return success, message
+
+        # Locate the slot in the sorted index and reject overlaps with either neighbour
+        below_id, above_id = self.shortRangeIndex.neighbours(node['lowPrice'])
+        if below_id is not None and self.orderShortMap[below_id]['hightPrice'] > node['lowPrice']:
+            return False, f"New node overlaps with short order {below_id}"
+        if above_id is not None and self.orderShortMap[above_id]['lowPrice'] < node['hightPrice']:
+            return False, f"New node overlaps with short order {above_id}"
+        return self.insterShortOrder(node, below_id if below_id is not None else "")
+
     def printOrderShort(self):
         print("Order linked list (from bottom to top):")
         current_id = self.nearShortNode
@@ -111,21 +145,20 @@ class ShortSwapV1Order:
         
         if not self.nearLongNode:
             # List is empty, insert directly
-            self.orderLongMap[node['orderID']] = node
+            self._addOrderNode(self.orderLongMap, self.longRangeIndex, node)
             self.nearLongNode = node['orderID']
-            self._addOrderToAddressMap(node['address'], node['orderID'])
             return True, "Successfully inserted first node"
 
         if nodeOrderID == "":
             # Insert at the top
             highest_node = self.orderLongMap[self.nearLongNode]
             if node['lowPrice'] >= highest_node['hightPrice']:
+                self._saveOrder(highest_node)
                 node['lowNode'] = self.nearLongNode
                 highest_node['hightNode'] = node['orderID']
-                self.orderLongMap[node['orderID']] = node
+                self._addOrderNode(self.orderLongMap, self.longRangeIndex, node)
                 self.orderLongMap[self.nearLongNode] = highest_node
                 self.nearLongNode = node['orderID']
-                self._addOrderToAddressMap(node['address'], node['orderID'])
                 return True, "Successfully inserted at top"
             return False, "New node overlaps with highest node"
 
@@ -137,27 +170,53 @@ class ShortSwapV1Order:
             if current_node['lowNode']:
                 lower_node = self.orderLongMap[current_node['lowNode']]
                 if node['lowPrice'] >= lower_node['hightPrice']:
+                    self._saveOrder(current_node)
+                    self._saveOrder(lower_node)
                     node['lowNode'] = current_node['lowNode']
                     node['hightNode'] = current_node['orderID']
                     current_node['lowNode'] = node['orderID']
                     lower_node['hightNode'] = node['orderID']
-                    self.orderLongMap[node['orderID']] = node
+                    self._addOrderNode(self.orderLongMap, self.longRangeIndex, node)
                     self.orderLongMap[current_node['orderID']] = current_node
                     self.orderLongMap[lower_node['orderID']] = lower_node
-                    self._addOrderToAddressMap(node['address'], node['orderID'])
                     return True, "Successfully inserted new node"
                 return False, "New node overlaps with lower node"
             else:
+                self._saveOrder(current_node)
                 node['lowNode'] = current_node['lowNode']
                 node['hightNode'] = current_node['orderID']
                 current_node['lowNode'] = node['orderID']
-                self.orderLongMap[node['orderID']] = node
+                self._addOrderNode(self.orderLongMap, self.longRangeIndex, node)
                 self.orderLongMap[current_node['orderID']] = current_node
-                self._addOrderToAddressMap(node['address'], node['orderID'])
                 return True, "Successfully inserted at bottom"
         return False, "New node overlaps with current node"
 
 
+    def insterLongOrderAuto(self, node, hintOrderID=""):
+        """
+        Insert a new long order node, locating its position from the node's price range
+
+        :param node: The node to insert, containing order ID, highest price, lowest price, address and data etc.
+        :param hintOrderID: Optional expected upper neighbour (same meaning as nodeOrderID of insterLongOrder). Used directly when still correct, otherwise the position is looked up in longRangeIndex
+        :return: (bool, str) Whether the insertion was successful and corresponding message
+        """
+        if node['hightPrice'] <= node['lowPrice']:
+            return False, "Highest price must be greater than lowest price"
+
+        # Fast path: the hint is still the correct upper neighbour (checked in O(1) by insterLongOrder)
+        if hintOrderID == "" or hintOrderID in self.orderLongMap:
+            success, message = self.insterLongOrder(node, hintOrderID)
+            if success:
+                return success, message
+
+        # Locate the slot in the sorted index and reject overlaps with either neighbour
+        below_id, above_id = self.longRangeIndex.neighbours(node['lowPrice'])
+        if below_id is not None and self.orderLongMap[below_id]['hightPrice'] > node['lowPrice']:
+            return False, f"New node overlaps with long order {below_id}"
+        if above_id is not None and self.orderLongMap[above_id]['lowPrice'] < node['hightPrice']:
+            return False, f"New node overlaps with long order {above_id}"
+        return self.insterLongOrder(node, above_id if above_id is not None else "")
+
     def printOrderLong(self):
         print("Order linked list (from top to bottom):")
         current_id = self.nearLongNode
@@ -215,6 +274,7 @@ class ShortSwapV1Order:
         
         if node['hightNode']:
             upper_node = self.orderShortMap[node['hightNode']]
+            self._saveOrder(upper_node)
             upper_node['lowNode'] = node['lowNode']
             self.orderShortMap[node['hightNode']] = upper_node
         else:
@@ -223,13 +283,14 @@ class ShortSwapV1Order:
 
         if node['lowNode']:
             lower_node = self.orderShortMap[node['lowNode']]
+            self._saveOrder(lower_node)
             lower_node['hightNode'] = node['hightNode']
             self.orderShortMap[node['lowNode']] = lower_node
         else:
             # If it's the bottom node, update nearShortNode
             self.nearShortNode = node['hightNode']
 
-        del self.orderShortMap[nodeOrderID]
+        self._removeOrderNode(self.orderShortMap, self.shortRangeIndex, nodeOrderID)
         self._removeOrderFromAddressMap(node['address'], nodeOrderID, node)
         return True, "Successfully deleted node"
 
@@ -242,6 +303,7 @@ class ShortSwapV1Order:
         
         if node['lowNode']:
             lower_node = self.orderLongMap[node['lowNode']]
+            self._saveOrder(lower_node)
             lower_node['hightNode'] = node['hightNode']
             self.orderLongMap[node['lowNode']] = lower_node
         else:
@@ -250,22 +312,104 @@ class ShortSwapV1Order:
 
         if node['hightNode']:
             upper_node = self.orderLongMap[node['hightNode']]
+            self._saveOrder(upper_node)
             upper_node['lowNode'] = node['lowNode']
             self.orderLongMap[node['hightNode']] = upper_node
         else:
             # If it's the top node, update nearLongNode
             self.nearLongNode = node['lowNode']
 
-        del self.orderLongMap[nodeOrderID]
+        self._removeOrderNode(self.orderLongMap, self.longRangeIndex, nodeOrderID)
         self._removeOrderFromAddressMap(node['address'], nodeOrderID, node)
         return True, "Successfully deleted node"
 
 
+    def _logUndo(self, function, *args):
+        """
+        Record how to reverse an order book change, while a pool transaction runs
+        """
+        if self.undoLog is not None:
+            self.undoLog.append((function, args))
+
+    def _saveOrder(self, order):
+        """
+        Record the fields of an order before they change, while a pool transaction runs
+        """
+        if self.undoLog is not None:
+            self.undoLog.append((_restoreOrder, (order, order.toDict() if isinstance(order, OrderRecord) else dict(order))))
+
+    def _loggedOrderIDs(self, undoLog):
+        """
+        IDs of the orders created, changed or removed by the changes recorded in undoLog, in first-change order
+        """
+        orderMaps = (self.orderShortMap, self.orderLongMap)
+        orderIDs = {}
+        for function, args in undoLog:
+            if function is _restoreOrder:
+                orderIDs[args[0]['orderID']] = None
+            elif getattr(function, '__self__', None) in orderMaps:
+                orderIDs[args[0]] = None
+        return list(orderIDs)
+
+    def _buildExpiryQueue(self):
+        """
+        Index the open orders by loan_time (pools saved before the expiry queue existed)
+        """
+        self.expiryQueue = ExpiryQueue()
+        for orderMap in (self.orderShortMap, self.orderLongMap):
+            for orderID, order in orderMap.items():
+                if order.get('loan_time') is not None:
+                    self.expiryQueue.insert(orderID, order['loan_time'])
+
+    def _addOrderNode(self, orderMap, rangeIndex, node):
+        orderMap[node['orderID']] = node
+        self._logUndo(orderMap.pop, node['orderID'], None)
+        rangeIndex.insert(node['orderID'], node['lowPrice'], node['hightPrice'])
+        self._logUndo(rangeIndex.remove, node['orderID'])
+        if node.get('loan_time') is not None:
+            self.expiryQueue.insert(node['orderID'], node['loan_time'])
+            self._logUndo(self.expiryQueue.remove, node['orderID'])
+        self._addOrderToAddressMap(node['address'], node['orderID'])
+
+    def _removeOrderNode(self, orderMap, rangeIndex, orderID):
+        node = orderMap.pop(orderID)
+        self._logUndo(orderMap.__setitem__, orderID, node)
+        lowPrice, hightPrice = rangeIndex.ranges[orderID]
+        rangeIndex.remove(orderID)
+        self._logUndo(rangeIndex.insert, orderID, lowPrice, hightPrice)
+        if self.expiryQueue.remove(orderID):
+            self._logUndo(self.expiryQueue.insert, orderID, node['loan_time'])
+
+    def _updateOrderRange(self, rangeIndex, orderID, lowPrice, hightPrice):
+        """
+        Move the range of an order in the index (e.g. after partial liquidation)
+        """
+        previous = rangeIndex.ranges.get(orderID)
+        rangeIndex.update(orderID, lowPrice, hightPrice)
+        if previous is not None:
+            self._logUndo(rangeIndex.update, orderID, previous[0], previous[1])
+
+    def _undoAddressOrder(self, address, orderID):
+        orders = self.addressNodeMap.get(address)
+        if orders is not None and orderID in orders:
+            orders.remove(orderID)
+            if not orders:
+                del self.addressNodeMap[address]
+
+    def _restoreAddressOrders(self, address, orders, historyLength):
+        self.addressNodeMap[address] = orders
+        history = self.addressHistoryMap.get(address)
+        if history is not None:
+            del history[historyLength:]
+            if not history:
+                del self.addressHistoryMap[address]
+
     def _addOrderToAddressMap(self, address, orderID):
         if address not in self.addressNodeMap:
             self.addressNodeMap[address] = []
         if len(self.addressNodeMap[address]) < self.ORDER_MAX_LENGTH:
             self.addressNodeMap[address].append(orderID)
+            self._logUndo(self._undoAddressOrder, address, orderID)
         else:
             raise ValueError(f"Address {address} has reached maximum order limit {self.ORDER_MAX_LENGTH}")
 
@@ -274,6 +418,7 @@ class ShortSwapV1Order:
         # print("self.addressNodeMap =",self.addressNodeMap)
         if address in self.addressNodeMap:
             if orderID in self.addressNodeMap[address]:
+                self._logUndo(self._restoreAddressOrders, address, list(self.addressNodeMap[address]), len(self.addressHistoryMap.get(address, ())))
                 # Remove from current order list
                 self.addressNodeMap[address].remove(orderID)
                 
@@ -351,22 +496,10 @@ class ShortSwapV1Order:
         if orderID == self.nearShortNode:
             return True, "Given range has only one short order (itself), no intersection"
 
-        current_id = self.nearShortNode
-        while current_id:
-            node = self.orderShortMap[current_id]
-            
-            # Check for intersection
-            if (lowPrice <= node['hightPrice'] and hightPrice >= node['lowPrice']) or \
-               (lowPrice >= node['lowPrice'] and lowPrice <= node['hightPrice']) or \
-               (hightPrice >= node['lowPrice'] and hightPrice <= node['hightPrice']):
-                return False, f"Given range intersects with short order {current_id}"
-            
-            # If the highest price of current range is lower than node's lowest price, 
-            # later nodes definitely have no intersection, can exit loop directly
-            if hightPrice < node['lowPrice']:
-                break
-            
-            current_id = node['hightNode']
+        # Binary search in the sorted range index instead of walking the linked list
+        intersect_id = self.shortRangeIndex.findIntersect(hightPrice, lowPrice)
+        if intersect_id is not None:
+            return False, f"Given range intersects with short order {intersect_id}"
 
         return True, "Given range has no intersection with short orders"
 
@@ -383,20 +516,10 @@ class ShortSwapV1Order:
         if orderID == self.nearLongNode:
             return True, "Given range has only one long order (itself), no intersection"
 
-        current_id = self.nearLongNode
-        while current_id:
-            node = self.orderLongMap[current_id]
-            if (lowPrice <= node['hightPrice'] and hightPrice >= node['lowPrice']) or \
-               (lowPrice >= node['lowPrice'] and lowPrice <= node['hightPrice']) or \
-               (hightPrice >= node['lowPrice'] and hightPrice <= node['hightPrice']):
-                return False, f"Given range intersects with long order {current_id}"
-            
-            # If the lowest price of current range is higher than node's highest price,
-            # later nodes definitely have no intersection, can exit loop directly
-            if lowPrice > node['hightPrice']:
-                break
-            
-            current_id = node['lowNode']
+        # Binary search in the sorted range index instead of walking the linked list
+        intersect_id = self.longRangeIndex.findIntersect(hightPrice, lowPrice)
+        if intersect_id is not None:
+            return False, f"Given range intersects with long order {intersect_id}"
 
         return True, "Given range has no intersection with long orders"
 
@@ -450,13 +573,31 @@ class ShortSwapV1Order:
         """
         if orderID in self.orderShortMap:
             current_order = self.orderShortMap[orderID]
+            self._saveOrder(current_order)
             current_order.update(node)
             self.orderShortMap[orderID] = current_order
+            if 'lowPrice' in node or 'hightPrice' in node:
+                self._updateOrderRange(self.shortRangeIndex, orderID, current_order['lowPrice'], current_order['hightPrice'])
+            else:
+                self.shortRangeIndex.touch()
             return True, "Short order updated successfully"
         elif orderID in self.orderLongMap:
             current_order = self.orderLongMap[orderID]
+            self._saveOrder(current_order)
             current_order.update(node)
             self.orderLongMap[orderID] = current_order
+            if 'lowPrice' in node or 'hightPrice' in node:
+                self._updateOrderRange(self.longRangeIndex, orderID, current_order['lowPrice'], current_order['hightPrice'])
+            else:
+                self.longRangeIndex.touch()
             return True, "Long order updated successfully"
         else:
-            return False, "Order ID not found"
\ No newline at end of file
+            return False, "Order ID not found"
+
+
+def _restoreOrder(order, fields):
+    if isinstance(order, OrderRecord):
+        order.restore(fields)
+    else:
+        order.clear()
+        order.update(fields)
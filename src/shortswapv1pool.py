@@ -3,14 +3,48 @@
 import random
 import string
 from erc20factory import erc20_factory_instance
-from swap_utils import get_current_price,get_amount_in_reserve1_for_amount0_out,get_amount_in_reserve0_for_amount1_out, get_amount_out_reserve0_to_reserve1, get_amount_out_reserve1_to_reserve0, get_reserves_at_price
+import swap_utils
+import swap_utils_fixed
+from swap_utils_fixed import to_units
 from shortswapv1order import ShortSwapV1Order
+from poolsnapshot import build_snapshot
+from orderrecord import OrderRecord
+from eventlog import event_log_instance
 import time
+from functools import wraps
+from operator import attrgetter
+
+BATCH_OPERATIONS = frozenset(("buy", "sell", "shortOpen", "shortClose", "longOpen", "longClose"))  # Operations submitBatch accepts
+
+# Pool fields an operation may change, saved when a transaction starts and put back on rollback
+TRANSACTION_SCALARS = (
+    "reserve0", "reserve1", "loanReserve0", "loanReserve1", "collateralShortAmount1", "collateralLongAmount1",
+    "nearShortNode", "nearLongNode", "orderCount",
+)
+_getScalars = attrgetter(*TRANSACTION_SCALARS)
+
+# Pool fields holding amounts or fee ratios, converted to 18-decimal base units when the pool runs in fixed point mode
+FIXED_POINT_FIELDS = ("loanReserve1", "loanFee", "loanDayFee", "forcedCloseFee", "forcedCloseBaseAmount", "fee")
+
+FULL_CLOSE_TOLERANCE = 1e-9  # Float mode: a close within this fraction of the order size closes the whole order
+
+
+def transactional(method):
+    """
+    Make a pool operation atomic, see ShortSwapV1Pool.runTransaction
+    """
+    @wraps(method)
+    def run(self, *args, **kwargs):
+        return self.runTransaction(method, *args, **kwargs)
+    return run
+
 
 class ShortSwapV1Pool(ShortSwapV1Order):
-    def __init__(self, factory, token0, token1, token0TotalSupply, token0ShortSupply, token1Amount,  poolAddress):
+    def __init__(self, factory, token0, token1, token0TotalSupply, token0ShortSupply, token1Amount,  poolAddress, fixedPoint=False):
         """
         Initialize ShortSwapV1Pool instance.
+        :param fixedPoint: Run on integers in 18-decimal base units (swap_utils_fixed) instead of floats: token
+                           amounts are given in base units, prices (e.g. forcedClosePrice) are scaled by 10**18
         """
         ShortSwapV1Order.__init__(self)  # Call parent class initialization method
         self.factory = factory  # Factory
@@ -44,12 +78,55 @@ class ShortSwapV1Pool(ShortSwapV1Order):
         # Liquidation movement ratio - this value is crucial, relates to maximum position size per trade
         self.forceMoveRate = 0.10 # Forced liquidation line movement ratio (this value can be appropriately reduced when pool grows)
         self.forceMoveSlack = self.forceMoveRate*0.5  # Minimum price requirement for partial liquidation (prevents users from liquidating one token at a time)
+
+        self.fixedPoint = fixedPoint  # Integer amounts in 18-decimal base units, see swap_utils_fixed
+        if fixedPoint:
+            # forceMoveRate and forceMoveSlack stay floats, they are only compared with price change ratios
+            for name in FIXED_POINT_FIELDS:
+                setattr(self, name, to_units(getattr(self, name)))
         
         self.current_address = ""  # Current address (not needed in contract environment)
+        self.current_time = None  # Pinned operation time, None means wall clock (not needed in contract environment)
+        
+        self.snapshotOrderDepth = 100  # Number of nearest orders per side copied into each snapshot
+        self.snapshot = build_snapshot(self, 0)  # Latest committed state, read without locking (not needed in contract environment)
+        self.publishSnapshots = True  # Cleared while a write-ahead log is replayed, the snapshot is published once at the end
+        self.ledgerStage = None  # LedgerStage buy/sell transfer through while a batch runs (not needed in contract environment)
         
     def use(self, address):
         self.current_address = address
+        self.current_time = None
+        return self
+
+    def at(self, timestamp):
+        """
+        Pin the time seen by the next operation, so that a logged operation replays with its original timestamps.
+        use() resets it back to the wall clock.
+        :param timestamp: Unix timestamp in seconds
+        """
+        self.current_time = timestamp
         return self
+
+    def now(self):
+        """
+        Current operation time (the pinned time when set via at())
+        """
+        return self.current_time if self.current_time is not None else time.time()
+
+    def __getstate__(self):
+        # The published snapshot holds read-only proxies that cannot be pickled, it is rebuilt on load
+        state = self.__dict__.copy()
+        state['snapshot'] = self.snapshot.version
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('ledgerStage', None)  # Pools pickled before batches existed
+        self.__dict__.setdefault('undoLog', None)  # Pools pickled before transactions existed
+        self.__dict__.setdefault('fixedPoint', False)  # Pools pickled before fixed point mode existed
+        if 'expiryQueue' not in state:
+            self._buildExpiryQueue()
+        self.snapshot = build_snapshot(self, state['snapshot'])
     
     def getInfo(self):
         """
@@ -87,38 +164,58 @@ class ShortSwapV1Pool(ShortSwapV1Order):
         
     def getReserves(self):
         return self.reserve0, self.reserve1
+
+    def publishSnapshot(self):
+        """
+        Publish an immutable snapshot of the committed state, called after every successful mutation
+        """
+        if not self.publishSnapshots:
+            return self.snapshot
+        self.snapshot = build_snapshot(self, self.snapshot.version + 1, self.snapshot)
+        return self.snapshot
+
+    def getSnapshot(self):
+        """
+        Get the latest published snapshot (safe to call without holding any lock)
+        """
+        return self.snapshot
     
 
+    @property
+    def swapMath(self):
+        """
+        Market maker functions of the pool's number mode: swap_utils (floats) or swap_utils_fixed (integers)
+        """
+        return swap_utils_fixed if self.fixedPoint else swap_utils
+
     def getPrice(self):
         """
         Get current price
         """
-        return get_current_price(self.reserve0, self.reserve1)
+        return self.swapMath.get_current_price(self.reserve0, self.reserve1)
     
+    @transactional
     def buy(self, amount1):
         """
         Buy operation
         """
-        print("---------------buy------------------Current price:", self.getPrice())
         # Check if user has enough token1 (USDT)
-        user_balance = erc20_factory_instance.balanceOf(self.token1, self.current_address)
+        user_balance = self._balanceOf(self.token1, self.current_address)
         if user_balance < amount1:
             return False, "Insufficient USDT balance"
 
         # Calculate price movement range
-        amount0_out, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price = get_amount_out_reserve1_to_reserve0(
+        amount0_out, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price = self.swapMath.get_amount_out_reserve1_to_reserve0(
             amount1, self.reserve0, self.reserve1, self.fee
         )
         
         # Check if price movement range exceeds self.forceMoveRate
         price_change_rate = (final_height_price - initial_low_price) / initial_low_price
-        print(f"1.Calculate buy impact on price range {initial_low_price} to {final_height_price} price movement: {price_change_rate:.3%}")
         if price_change_rate > self.forceMoveRate:
             return False, f"Price movement {price_change_rate:.3%} exceeds maximum single trade volatility {self.forceMoveRate:.3%}"
 
         # Check if price range intersects with liquidation orders
         is_valid, message = self.checkShortOrderRange(final_height_price, initial_low_price)
-        print("2.Calculate buy impact on price range",initial_low_price, "to",final_height_price,"no intersection with short liquidation:",is_valid)
         if is_valid == False:
             return False, "Intersects with short liquidation, please liquidate first"
         
@@ -127,48 +224,46 @@ class ShortSwapV1Pool(ShortSwapV1Order):
         self.reserve1 = new_reserve1
 
         # Send purchased tokens to user address
-        success, message = erc20_factory_instance.use(self.poolAddress).transfer(self.token0, self.current_address, amount0_out)
+        success, message = self._transfer(self.token0, self.poolAddress, self.current_address, amount0_out)
         if not success:
             return False, message
         # Send USDT to contract address
-        success, message = erc20_factory_instance.use(self.current_address).transfer(self.token1, self.poolAddress, amount1)
+        success, message = self._transfer(self.token1, self.current_address, self.poolAddress, amount1)
         if not success:
             return False, message
         # 3. Send fee_amount1 to self.feeAddress
-        success, message = erc20_factory_instance.use(self.poolAddress).transfer(self.token1, self.feeAddress, fee_amount1)
+        success, message = self._transfer(self.token1, self.poolAddress, self.feeAddress, fee_amount1)
         if not success:
             return False, message
 
-        print("3.Use USDT amount:",amount1, "buy", amount0_out, "tokens", "fee:", fee_amount1, "USDT", "price after buy:", self.getPrice())
+        event_log_instance.emit("buy", pool=self.poolAddress, address=self.current_address, amount1In=amount1, amount0Out=amount0_out, fee1=fee_amount1, priceBefore=initial_low_price, priceAfter=final_height_price)
         # Return check result
         return is_valid, message
     
     
     
+    @transactional
     def sell(self, amount0):
         """
         Sell operation
         """
-        print("---------------sell------------------Current price:", self.getPrice())
         
         # Check if user has enough token0
-        user_balance = erc20_factory_instance.balanceOf(self.token0, self.current_address)
+        user_balance = self._balanceOf(self.token0, self.current_address)
         if user_balance < amount0:
             return False, "Insufficient token balance"
 
         # Calculate price movement range
-        amount_out, fee_amount0, new_reserve0, new_reserve1, initial_height_price, final_low_price = get_amount_out_reserve0_to_reserve1(
+        amount_out, fee_amount0, new_reserve0, new_reserve1, initial_height_price, final_low_price = self.swapMath.get_amount_out_reserve0_to_reserve1(
             amount0, self.reserve0, self.reserve1, self.fee
         )
         # Check if price movement range exceeds self.forceMoveRate
         price_change_rate = (initial_height_price - final_low_price) / initial_height_price
-        print(f"1.Calculate sell impact on price range {initial_height_price} to {final_low_price} price movement: {price_change_rate:.3%}")
         if price_change_rate > self.forceMoveRate:
             return False, f"Price movement {price_change_rate:.3%} exceeds maximum single trade volatility {self.forceMoveRate:.3%}"
         
         # Check if price range intersects with liquidation orders
         is_valid, message = self.checkLongOrderRange(initial_height_price, final_low_price)
-        print("1.Calculate sell impact on price range", initial_height_price, "to", final_low_price, "no intersection with long liquidation:", is_valid)
         if not is_valid:
             return False, "Intersects with long liquidation, please liquidate first"
         
@@ -176,39 +271,225 @@ class ShortSwapV1Pool(ShortSwapV1Order):
         self.reserve0 = new_reserve0
         self.reserve1 = new_reserve1
         # 3. Send fee_amount to self.feeAddress
-        success, message = erc20_factory_instance.use(self.poolAddress).transfer(self.token0, self.feeAddress, fee_amount0)
+        success, message = self._transfer(self.token0, self.poolAddress, self.feeAddress, fee_amount0)
         if not success:
             return False, message
         # Send sold tokens to user address
-        success, message = erc20_factory_instance.use(self.poolAddress).transfer(self.token1, self.current_address, amount_out)
+        success, message = self._transfer(self.token1, self.poolAddress, self.current_address, amount_out)
         if not success:
             return False, message
         # Send token0 to contract address
-        success, message = erc20_factory_instance.use(self.current_address).transfer(self.token0, self.poolAddress, amount0)
+        success, message = self._transfer(self.token0, self.current_address, self.poolAddress, amount0)
         if not success:
             return False, message
-        print("2.Use token amount:", amount0, "sell for", amount_out, "USDT", "fee:", fee_amount0, "T", "price after sell:", self.getPrice())
+        event_log_instance.emit("sell", pool=self.poolAddress, address=self.current_address, amount0In=amount0, amount1Out=amount_out, fee0=fee_amount0, priceBefore=initial_height_price, priceAfter=final_low_price)
         # Return check result
         return is_valid, message
     
 
+    def getExpiredOrders(self, timestamp=None):
+        """
+        Orders a third party may liquidate because they have been open longer than lendingSecondLimit
+        :param timestamp: Time of the check, defaults to the operation time
+        :return: List of order IDs of both sides, oldest first
+        """
+        current_time = int(self.now() if timestamp is None else timestamp)
+        # Same condition as shortClose/longClose: current_time - loan_time > lendingSecondLimit
+        return self.expiryQueue.expired(current_time - self.lendingSecondLimit)
+
+    def getNextExpiry(self):
+        """
+        The next order to pass the lending time limit
+        :return: (time from which it may be liquidated, orderID), or None when there are no open orders
+        """
+        oldest = self.expiryQueue.peek()
+        if oldest is None:
+            return None
+        loanTime, orderID = oldest
+        return loanTime + self.lendingSecondLimit + 1, orderID
+
+    def _snapFullClose(self, closeAmount0, amount0):
+        """
+        The close amount to use: the whole order when closeAmount0 is within a float rounding residue of it (e.g. the
+        remaining size shown after partial closes), so no dust order is left behind. Exact in fixed point mode.
+        """
+        if not self.fixedPoint and abs(amount0 - closeAmount0) <= amount0 * FULL_CLOSE_TOLERANCE:
+            return amount0
+        return closeAmount0
+
+    def _balanceOf(self, token, address):
+        if self.ledgerStage is not None:
+            return self.ledgerStage.balanceOf(token, address)
+        return erc20_factory_instance.balanceOf(token, address)
+
+    def _transfer(self, token, fromAddress, to, value):
+        if self.ledgerStage is not None:
+            return self.ledgerStage.transfer(token, fromAddress, to, value)
+        return erc20_factory_instance.transferFrom(token, fromAddress, to, value)
+
+    def runTransaction(self, operation, *args, **kwargs):
+        """
+        Run one operation atomically: its changes are kept when it returns (True, ...), otherwise (a rejection or
+        an exception) reserves, loan reserves, collateral, the order book and the ledger are put back exactly as
+        they were before the call.
+        Scalars are saved up front, order book changes are recorded in undoLog as they happen, and ledger transfers
+        go through a LedgerStage that is written to the ledger only on commit (inside submitBatch the batch stage
+        is rolled back to a savepoint instead). The ledger locks of both pool tokens are held until then, and the
+        snapshot is published once the ledger is written (by submitBatch for the whole batch).
+        :param operation: Unbound pool method, e.g. ShortSwapV1Pool.buy
+        :param args: Method arguments
+        :return: The result of the operation
+        """
+        if self.undoLog is not None:
+            return operation(self, *args, **kwargs)  # Already inside a transaction
+        stage = self.ledgerStage
+        if stage is None:
+            # Not in a batch: stage this operation alone and write it to the ledger on commit
+            with erc20_factory_instance.locked((self.token0, self.token1)):
+                stage = self.ledgerStage = erc20_factory_instance.stage()
+                try:
+                    result = self.runTransaction(operation, *args, **kwargs)
+                finally:
+                    self.ledgerStage = None
+                if result[0]:
+                    stage.flush()
+                    # After the ledger write, so a snapshot never shows pool state ahead of the balances
+                    self.publishSnapshot()
+                return result
+        savepoint = stage.savepoint()
+        scalars = _getScalars(self)
+        self.undoLog = []
+        committed = False
+        try:
+            result = operation(self, *args, **kwargs)
+            committed = bool(result[0])
+            return result
+        finally:
+            undoLog = self.undoLog
+            self.undoLog = None
+            if not committed:
+                self._rollback(undoLog, scalars)
+                stage.rollback(savepoint)
+
+    def _rollback(self, undoLog, scalars):
+        for function, undoArgs in reversed(undoLog):
+            function(*undoArgs)
+        for field, value in zip(TRANSACTION_SCALARS, scalars):
+            setattr(self, field, value)
+
+    def simulate(self, operation, *args):
+        """
+        Dry run: execute one operation and report its full effect, then put the pool and the ledger back exactly as
+        they were, with the same undo mechanism as a rejected transaction. Nothing is published (no snapshot, no
+        events, no ledger writes), so it costs about as much as the operation itself.
+        The pool is modified while the operation runs: the caller must hold it exclusively (SwapHub.simulate holds
+        the write lock).
+        :param operation: One of BATCH_OPERATIONS, e.g. "shortOpen"
+        :param args: Method arguments
+        :return: dict with
+                 success, message: the (bool, message) result the operation would return
+                 events: the events the operation would emit (amounts, fees, prices, order ranges)
+                 reserve0, reserve1, loanReserve0, loanReserve1, price: pool state after the operation
+                 balanceChanges: {token: {address: balance change}}
+                 orders: {orderID: order fields after the operation} for every order created or changed
+                 removedOrders: IDs of the orders the operation would close
+        """
+        if operation not in BATCH_OPERATIONS:
+            return {"success": False, "message": f"Unknown operation {operation}"}
+        if self.undoLog is not None or self.ledgerStage is not None:
+            raise RuntimeError("simulate cannot run inside a transaction or batch")
+        publish = self.publishSnapshots
+        self.publishSnapshots = False
+        with erc20_factory_instance.locked((self.token0, self.token1)):
+            stage = self.ledgerStage = erc20_factory_instance.stage()
+            scalars = _getScalars(self)
+            self.undoLog = []
+            try:
+                with event_log_instance.capture() as events:
+                    success, message = getattr(self, operation)(*args)  # Runs inside this transaction, never commits
+                effect = {"success": bool(success), "message": message, "events": events if success else []}
+                if success:
+                    orders = {}
+                    removedOrders = []
+                    for orderID in self._loggedOrderIDs(self.undoLog):
+                        order = self.orderShortMap.get(orderID) or self.orderLongMap.get(orderID)
+                        if order is not None:
+                            orders[orderID] = order.toDict() if isinstance(order, OrderRecord) else dict(order)
+                        else:
+                            removedOrders.append(orderID)
+                    effect.update(reserve0=self.reserve0, reserve1=self.reserve1, loanReserve0=self.loanReserve0,
+                                  loanReserve1=self.loanReserve1, price=self.getPrice(), balanceChanges=stage.changes(),
+                                  orders=orders, removedOrders=removedOrders)
+            finally:
+                undoLog = self.undoLog
+                self.undoLog = None
+                self.ledgerStage = None
+                self._rollback(undoLog, scalars)
+                self.publishSnapshots = publish
+        if not success:
+            effect.update(reserve0=self.reserve0, reserve1=self.reserve1, loanReserve0=self.loanReserve0,
+                          loanReserve1=self.loanReserve1, price=self.getPrice(), balanceChanges={}, orders={}, removedOrders=[])
+        return effect
+
+    def submitBatch(self, operations, afterEach=None):
+        """
+        Execute an ordered list of operations as one unit of work.
+        Every item runs as its own transaction with the same checks as its own call, and is accepted or rejected
+        exactly like the same calls made one after another. An item raising an exception (e.g. wrong arguments) is
+        rolled back and rejected with the error as its message. The snapshot is published once for the whole batch and
+        the ledger transfers of all items are staged and written back together.
+        All items run at the same operation time (the pinned time when set via at()).
+        :param operations: List of (address, operation, args), operation is one of BATCH_OPERATIONS, e.g.
+                           [("0xA", "buy", (100,)), ("0xB", "shortOpen", (50, 400, 0.12, ""))]
+        :param afterEach: Optional callback(index, result, reserve0Before) called after every item
+        :return: (True, list of (bool, message) per item, in order)
+        """
+        timestamp = self.now()
+        publish = self.publishSnapshots
+        self.publishSnapshots = False
+        with erc20_factory_instance.locked((self.token0, self.token1)):
+            stage = self.ledgerStage = erc20_factory_instance.stage()
+            results = []
+            try:
+                for index, (address, operation, args) in enumerate(operations):
+                    self.current_address = address
+                    self.current_time = timestamp
+                    reserve0Before = self.reserve0
+                    if operation in BATCH_OPERATIONS:
+                        try:
+                            result = getattr(self, operation)(*args)
+                        except Exception as error:
+                            # Rolled back like a rejection (runTransaction), the items before it stay committed
+                            result = False, f"{operation} failed: {type(error).__name__}: {error}"
+                    else:
+                        result = False, f"Unknown operation {operation}"
+                    results.append(result)
+                    if afterEach is not None:
+                        afterEach(index, result, reserve0Before)
+            finally:
+                self.ledgerStage = None
+                stage.flush()
+                self.publishSnapshots = publish
+        if any(result[0] for result in results):
+            self.publishSnapshot()
+        return True, results
+
+    @transactional
     def shortOpen(self, baseAmount1, lendAmount0, forcedClosePrice, insterOrderID):
         """
         Short operation
         :param baseAmount1: User provided base token amount
         :param lendAmount0: User desired borrowed token amount
         :param forcedClosePrice: Forced liquidation price
-        :param insterOrderID: Insert to liquidation order queue ID (needs to be obtained off-chain)
+        :param insterOrderID: Insert to liquidation order queue ID (optional hint obtained off-chain, the position is located automatically when it is empty or stale)
         """
-        print("---------Short open shortOpen--------- Current price:", self.getPrice())
         # ------------Pre-check section----------------
-        print("Parameters: use",baseAmount1,"USDT as collateral", "borrow", lendAmount0, "tokens", "forced liquidation price", forcedClosePrice, "insert liquidation order linked list position:", insterOrderID)
         
         if forcedClosePrice <= self.getPrice():
             return False, "Forced liquidation price cannot be less than current price"
 
         # 1. Check if user address has enough baseAmount token1 tokens
-        user_balance = erc20_factory_instance.balanceOf(self.token1, self.current_address)
+        user_balance = self._balanceOf(self.token1, self.current_address)
         if user_balance < baseAmount1:
             return False, "Insufficient wallet balance"
 
@@ -217,44 +498,37 @@ class ShortSwapV1Pool(ShortSwapV1Order):
             return False, "Insufficient tokens in loan pool"
 
         # 3. Simulate selling borrowed coins (if conditions not met, don't actually sell) use get_amount_out_reserve0_to_reserve1 to calculate how much USDT can be obtained by selling lendAmount0 coins (this serves as the base price for this order, used to calculate fees, equivalent to calculating how much USDT can be obtained by immediately selling after borrowing)
-        sell_amount1, sell_fee_amount0, sell_new_reserve0, sell_new_reserve1, initial_height_price, final_low_price = get_amount_out_reserve0_to_reserve1(
+        sell_amount1, sell_fee_amount0, sell_new_reserve0, sell_new_reserve1, initial_height_price, final_low_price = self.swapMath.get_amount_out_reserve0_to_reserve1(
             lendAmount0, self.reserve0, self.reserve1, self.fee # fee is 0
         )
         
         # Check if price movement range exceeds self.forceMoveRate
         price_change_rate = (initial_height_price - final_low_price) / initial_height_price
-        print(f"1.Calculate sell impact on price range {initial_height_price} to {final_low_price} price movement: {price_change_rate:.3%}")
         if price_change_rate > self.forceMoveRate:
             return False, f"Price movement {price_change_rate:.3%} exceeds maximum single trade volatility {self.forceMoveRate:.3%}"
 
         # Check if price range intersects with liquidation orders
         is_valid, message = self.checkLongOrderRange(initial_height_price, final_low_price)
-        print("1.Calculate sell impact on price range", initial_height_price, "to", final_low_price, "no intersection with short liquidation:", is_valid)
         if not is_valid:
             return False, "Intersects with long liquidation, please liquidate first"
 
         # Calculate all fees
-        loan_fee = sell_amount1 * (1.0 - self.loanFee)  # Loan fee
-        loan_day_fee = sell_amount1 * (1.0 - self.loanDayFee)  # Loan daily interest fee
-        forced_close_fee = sell_amount1 * (1.0 - self.forcedCloseFee)  # Third party liquidation ratio fee
+        loan_fee = self.swapMath.get_fee_amount(sell_amount1, self.loanFee)  # Loan fee
+        loan_day_fee = self.swapMath.get_fee_amount(sell_amount1, self.loanDayFee)  # Loan daily interest fee
+        forced_close_fee = self.swapMath.get_fee_amount(sell_amount1, self.forcedCloseFee)  # Third party liquidation ratio fee
         third_fee = forced_close_fee + self.forcedCloseBaseAmount  # Total third party liquidation fee
         total_fees = loan_fee + loan_day_fee + third_fee  # Total loan fees
 
         #realLendAmount = lendAmount0 - sell_fee_amount0  # Actual borrowed token amount
-        # Print fees
-        print("2.Simulate borrowing and selling to get USDT:", sell_amount1, "simulate trading fee:", sell_fee_amount0,"T actual borrowed token amount:", lendAmount0,"loan fee:",loan_fee,"USDT")
         loanReserveAmount = sell_amount1 + total_fees # Minimum loan reserve
-        print(f"3.Daily interest: {loan_day_fee} USDT, liquidation(third party benefit fee): {forced_close_fee} USDT, third party total fee: {third_fee} USDT, total borrowing fee: {total_fees}USDT minimum loan reserve{loanReserveAmount}USDT")
 
         # Move liquidity pool to liquidation price (for calculation only, cannot change real liquidity pool)
-        forced_reserve0, forced_reserve1 = get_reserves_at_price(forcedClosePrice, self.reserve0, self.reserve1)
+        forced_reserve0, forced_reserve1 = self.swapMath.get_reserves_at_price(forcedClosePrice, self.reserve0, self.reserve1)
         # Simulate liquidation trade
-        forced_amount_in, forced_fee_amount, forced_new_reserve0, forced_new_reserve1, forced_initial_low_price, forced_final_height_price = get_amount_in_reserve1_for_amount0_out(
+        forced_amount_in, forced_fee_amount, forced_new_reserve0, forced_new_reserve1, forced_initial_low_price, forced_final_height_price = self.swapMath.get_amount_in_reserve1_for_amount0_out(
             lendAmount0, forced_reserve0, forced_reserve1, self.fee
         )
         
-        print("4.Minimum loan reserve fund:"+ str(loanReserveAmount) +"USDT", "liquidation at price:",forcedClosePrice,"buy back needs:" ,forced_amount_in,"USDT" " includes fee:", forced_fee_amount,"USDT")
-        print("5.Total funds needed for liquidation:", forced_amount_in + total_fees, "USDT from selling coins + collateral:", sell_amount1+baseAmount1)
         
         # Check if liquidation will result in loss
         if forced_amount_in + total_fees >= sell_amount1+baseAmount1:
@@ -262,31 +536,31 @@ class ShortSwapV1Pool(ShortSwapV1Order):
         
         # ------------Check section successful, actual trading section begins----------------
         # Create orderNode and insert
-        orderNode = {
+        orderNode = OrderRecord(
             # Linked list section
-            'orderID': self.generateOrderID("short"),
-            'hightPrice': forced_final_height_price,  # Highest price after forced liquidation
-            'lowPrice': forced_initial_low_price,  # Lowest price after forced liquidation
-            'address': self.current_address,  # Current user address
-            'hightNode': "",  # Previous node
-            'lowNode': "",  # Next node
+            orderID=self.generateOrderID("short"),
+            hightPrice=forced_final_height_price,  # Highest price after forced liquidation
+            lowPrice=forced_initial_low_price,  # Lowest price after forced liquidation
+            address=self.current_address,  # Current user address
+            hightNode="",  # Previous node
+            lowNode="",  # Next node
             # Data section
-            'orderType': "short",
-            'baseAmount1': baseAmount1,  # User collateral base token amount
-            'sell_amount1': sell_amount1,  # USDT obtained from selling borrowed coins
-            'lendAmount0': lendAmount0,  # User borrowed token amount
-            'forcedClosePrice': forcedClosePrice,  # Forced liquidation price
-            'loan_fee': loan_fee,  # Basic loan fee
-            'loan_day_fee': loan_day_fee,  # Loan daily interest fee
-            'third_fee': third_fee,  # Third party liquidation benefit fee (total)
-            'loan_time': int(time.time()),  # Opening timestamp
-            'openPrice': self.getPrice(),  # Opening price
+            orderType="short",
+            baseAmount1=baseAmount1,  # User collateral base token amount
+            sell_amount1=sell_amount1,  # USDT obtained from selling borrowed coins
+            lendAmount0=lendAmount0,  # User borrowed token amount
+            forcedClosePrice=forcedClosePrice,  # Forced liquidation price
+            loan_fee=loan_fee,  # Basic loan fee
+            loan_day_fee=loan_day_fee,  # Loan daily interest fee
+            third_fee=third_fee,  # Third party liquidation benefit fee (total)
+            loan_time=int(self.now()),  # Opening timestamp
+            openPrice=self.getPrice(),  # Opening price
             #Debug section
-            'insterOrderID': insterOrderID  # Insert liquidation order queue ID (for debugging)
-        }
+            insterOrderID=insterOrderID  # Insert liquidation order queue ID (for debugging)
+        )
 
         # Insert liquidation order
-        success, message = self.insterShortOrder(orderNode, insterOrderID)
+        success, message = self.insterShortOrderAuto(orderNode, insterOrderID)
         if not success:
             return False, message
 
@@ -299,31 +573,32 @@ class ShortSwapV1Pool(ShortSwapV1Order):
         
 
         # Send collateral baseAmount1 to self.poolAddress
-        success, message = erc20_factory_instance.use(self.current_address).transfer(self.token1, self.poolAddress, baseAmount1)
+        success, message = self._transfer(self.token1, self.current_address, self.poolAddress, baseAmount1)
         if not success:
             return False, message
         
         # 3. Send fee_amount to self.feeAddress
-        success, message = erc20_factory_instance.use(self.poolAddress).transfer(self.token0, self.feeAddress, sell_fee_amount0)
+        success, message = self._transfer(self.token0, self.poolAddress, self.feeAddress, sell_fee_amount0)
         if not success:
             return False, message
         
-        print("6.Real trading begins, deduct borrowed coins from loan pool loanReserve0 and sell:",lendAmount0," remaining:",self.loanReserve0, "fee transfer:",sell_fee_amount0,"T"  )
        
         
         
         #  Update collateral variable (user's + borrowed coin sales proceeds)
         self.collateralShortAmount1 += baseAmount1 + sell_amount1
         #print('shortOpen hightPrice=', forced_final_price,'lowPrice', forced_initial_price)
-        print("7.Collateral transferred to loan pool:",baseAmount1,"USDT", "collateral in lending increased to:",self.collateralShortAmount1, "USDT", "all orders for this address:", self.getOrderIDsByAddress(self.current_address))
+        event_log_instance.emit("shortOpen", pool=self.poolAddress, address=self.current_address, orderID=orderNode['orderID'], baseAmount1=baseAmount1, lendAmount0=lendAmount0, sellAmount1=sell_amount1, fee0=sell_fee_amount0,
+                                loanFee=loan_fee, loanDayFee=loan_day_fee, thirdFee=third_fee, forcedClosePrice=forcedClosePrice, hightPrice=forced_final_height_price, lowPrice=forced_initial_low_price,
+                                priceBefore=initial_height_price, priceAfter=final_low_price)
         return True, "Short operation successful"
 
                 
+    @transactional
     def shortClose(self, orderID, closeAmount0, isThirdParty=False):
         """
         User liquidation operation (including third party liquidation)
         """
-        print("---------User short position liquidation shortClose--------- Current price:", self.getPrice(),"calling address:",self.current_address)
         if closeAmount0 == 0:
             return False, "Liquidation amount cannot be 0"
         # 1. Check if orderID exists in self.orderShortMap
@@ -334,15 +609,11 @@ class ShortSwapV1Pool(ShortSwapV1Order):
         if isThirdParty:
             # Need to check if liquidation line reached or lending time exceeded limit
             current_price = self.getPrice()
-            current_time = int(time.time())
+            current_time = int(self.now())
             threshold_price = order['forcedClosePrice'] * (1 - self.forceMoveRate)
             time_exceeded = (current_time - order['loan_time']) > self.lendingSecondLimit
             if current_price < threshold_price and not time_exceeded:
                 return False, "Liquidation price conditions not met and lending time not exceeded"
-            if current_price >= threshold_price:
-                print(f"1.Liquidation line reached  price: {current_price}, liquidation order price{order['forcedClosePrice']}  liquidation threshold (will float down): {threshold_price}")
-            if time_exceeded:
-                print(f"1.Lending time exceeded limit  current time: {current_time}, opening time: {order['loan_time']}, lending time limit: {self.lendingSecondLimit}seconds")
         else:
             # Check if address in data matches self.current_address
             if order['address'] != self.current_address:
@@ -354,51 +625,44 @@ class ShortSwapV1Pool(ShortSwapV1Order):
         
         # 3. Execute buy operation buy lendAmount0 amount of tokens
         lendAmount0 = order['lendAmount0']   # Amount of tokens to buy for repayment
+        closeAmount0 = self._snapFullClose(closeAmount0, lendAmount0)
         if lendAmount0 < closeAmount0:
             return False, "Liquidation amount cannot exceed borrowed token amount"
         
         # For partial liquidation, need to check if full liquidation exceeds maximum liquidation range, if not, can only fully liquidate
         if closeAmount0 != lendAmount0:
             # Contract buys back order['lendAmount0'] tokens, calculate price movement
-            _, _, _, _, check_initial_low_price, check_final_height_price = get_amount_in_reserve1_for_amount0_out(
+            _, _, _, _, check_initial_low_price, check_final_height_price = self.swapMath.get_amount_in_reserve1_for_amount0_out(
                 order['lendAmount0'], self.reserve0, self.reserve1, self.fee
             )
             price_change_rate = (check_final_height_price - check_initial_low_price) / check_initial_low_price
-            print(f"1.1.Calculate buy impact on price range {check_initial_low_price} to {check_final_height_price} price movement: {price_change_rate:.3%}")
             if price_change_rate <= self.forceMoveRate:
                 return False, f"Full liquidation price movement {price_change_rate:.3%} does not exceed maximum single trade volatility {self.forceMoveRate:.3%}, this order cannot be partially liquidated"
 
-            _, _, _, _, check_close_initial_low_price, check_close_final_height_price = get_amount_in_reserve1_for_amount0_out(
+            _, _, _, _, check_close_initial_low_price, check_close_final_height_price = self.swapMath.get_amount_in_reserve1_for_amount0_out(
                 closeAmount0, self.reserve0, self.reserve1, self.fee
             )
             price_close_change_rate = (check_close_final_height_price - check_close_initial_low_price) / check_close_initial_low_price
-            print(f"1.2.Calculate buy impact on price range {check_close_initial_low_price} to {check_close_final_height_price} price movement: {price_close_change_rate:.3%}")
             if price_close_change_rate < self.forceMoveSlack:
                 return False, f"Partial liquidation range cannot be too small {price_close_change_rate:.3%} does not meet partial liquidation requirement {self.forceMoveSlack:.3%}"
 
 
         
-        # Calculate batch liquidation ratio
-        close_rate = closeAmount0 / lendAmount0
-        print("0.Batch liquidation ratio:",close_rate)
-        
-        
-        # Reduce various parameters proportionally
-        closeBaseAmount = order['baseAmount1'] * close_rate # User collateral base token amount
-        close_sell_amount1 =  order['sell_amount1'] * close_rate      # USDT obtained from selling borrowed coins
-        close_loan_fee = order['loan_fee'] * close_rate  # Loan fee
-        close_loan_day_fee = order['loan_day_fee'] * close_rate  # Loan daily interest
+        # Reduce various parameters proportionally (by the batch liquidation ratio closeAmount0 / lendAmount0)
+        closeBaseAmount = self.swapMath.get_prorated_amount(order['baseAmount1'], closeAmount0, lendAmount0) # User collateral base token amount
+        close_sell_amount1 =  self.swapMath.get_prorated_amount(order['sell_amount1'], closeAmount0, lendAmount0)      # USDT obtained from selling borrowed coins
+        close_loan_fee = self.swapMath.get_prorated_amount(order['loan_fee'], closeAmount0, lendAmount0)  # Loan fee
+        close_loan_day_fee = self.swapMath.get_prorated_amount(order['loan_day_fee'], closeAmount0, lendAmount0)  # Loan daily interest
         close_third_fee = 0 # Total third party liquidation fee
         if isThirdParty:
-            close_third_fee = order['third_fee'] * close_rate # Total third party liquidation fee
+            close_third_fee = self.swapMath.get_prorated_amount(order['third_fee'], closeAmount0, lendAmount0) # Total third party liquidation fee
 
 
         # Contract buys back lendAmount0 tokens, calculate how much USDT needed
-        amount1_in, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price = get_amount_in_reserve1_for_amount0_out(
+        amount1_in, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price = self.swapMath.get_amount_in_reserve1_for_amount0_out(
             closeAmount0, self.reserve0, self.reserve1, self.fee
         )
         
-        print("1.Repurchase:",closeAmount0,"tokens cost",amount1_in,"USDT(fee included)", "fee:", fee_amount1,"USDT")
         
         # Check partial liquidation, price movement cannot be too small
         if closeAmount0 != lendAmount0:
@@ -409,16 +673,15 @@ class ShortSwapV1Pool(ShortSwapV1Order):
         
         # Check if price range intersects with liquidation orders
         is_valid, message = self.checkShortOrderRange(final_height_price, initial_low_price,orderID)
-        print("2.Calculate buy impact on price range", initial_low_price, "to", final_height_price, "no intersection with short liquidation:", is_valid)
         if not is_valid:
             return False, "Intersects with short liquidation, please liquidate first"
         
         
         # Start buying
+        self._saveOrder(order)
         self.reserve0 = new_reserve0
         self.reserve1 = new_reserve1
 
-        print("3.User's collateral + borrowed coin sales proceeds:", closeBaseAmount ,"USDT +", close_sell_amount1 ,"USDT =", closeBaseAmount +  close_sell_amount1 ,"USDT")
         closeAmount1 = (closeBaseAmount + close_sell_amount1) - amount1_in
         loanFeeAmount = close_loan_fee + close_loan_day_fee  # Loan fee + daily interest
         refundAmount = closeAmount1 - loanFeeAmount - close_third_fee
@@ -426,21 +689,19 @@ class ShortSwapV1Pool(ShortSwapV1Order):
         
         # # 3. Send fee_amount1 to self.feeAddress (transfer from contract address)
         all_fee_amount1 = fee_amount1 + loanFeeAmount
-        success, message = erc20_factory_instance.use(self.poolAddress).transfer(self.token1, self.feeAddress, all_fee_amount1)
+        success, message = self._transfer(self.token1, self.poolAddress, self.feeAddress, all_fee_amount1)
         if not success:
             return False, message
         
-        print("4.User's balance after liquidation:", closeAmount1,"USDT", "actual refund:",refundAmount,"USDT","interest collected:",loanFeeAmount,"USDT")
         # Return borrowed tokens
         self.loanReserve0 += closeAmount0
-        print("5.Return borrowed tokens:",closeAmount0,"USDT", "loan pool loanReserve0 increased to:",self.loanReserve0,"USDT","user profit/loss%: {:.2f}%".format((closeAmount1 - closeBaseAmount)/closeBaseAmount*100))
         # Return remaining USDT to user
-        success, message = erc20_factory_instance.use(self.poolAddress).transfer(self.token1, order['address'], refundAmount)
+        success, message = self._transfer(self.token1, self.poolAddress, order['address'], refundAmount)
         if not success:
             return False, message
         if isThirdParty:
             # Third party liquidation benefit fee to third party
-            success, message = erc20_factory_instance.use(self.poolAddress).transfer(self.token1, self.current_address, close_third_fee)
+            success, message = self._transfer(self.token1, self.poolAddress, self.current_address, close_third_fee)
             if not success:
                 return False, message
 
@@ -450,7 +711,7 @@ class ShortSwapV1Pool(ShortSwapV1Order):
             
             # Add closing data
             order['closePrice'] = self.getPrice()
-            order['closeTimestamp'] = int(time.time())
+            order['closeTimestamp'] = int(self.now())
             closeType = ""
             if isThirdParty:
                 closeType = "Third party liquidation"
@@ -463,7 +724,6 @@ class ShortSwapV1Pool(ShortSwapV1Order):
             success, message =  self.deleteShortOrder(orderID)
             if not success:
                 return False, message
-            print("6.Return remaining USDT to user:",refundAmount,"USDT","and delete order:",orderID,"all orders for this address:", self.getOrderIDsByAddress(self.current_address))
 
     
     
@@ -476,38 +736,39 @@ class ShortSwapV1Pool(ShortSwapV1Order):
             order['loan_day_fee'] = order['loan_day_fee'] - close_loan_day_fee
             order['lendAmount0'] = order['lendAmount0'] - closeAmount0
             # Move liquidity pool to liquidation price (for calculation only, cannot change real liquidity pool)
-            forced_reserve0, forced_reserve1 = get_reserves_at_price(order['forcedClosePrice'], self.reserve0, self.reserve1)
+            forced_reserve0, forced_reserve1 = self.swapMath.get_reserves_at_price(order['forcedClosePrice'], self.reserve0, self.reserve1)
             # Simulate liquidation trade
-            forced_amount_in, forced_fee_amount, forced_new_reserve0, forced_new_reserve1, forced_initial_low_price, forced_final_height_price = get_amount_in_reserve1_for_amount0_out(
+            forced_amount_in, forced_fee_amount, forced_new_reserve0, forced_new_reserve1, forced_initial_low_price, forced_final_height_price = self.swapMath.get_amount_in_reserve1_for_amount0_out(
                 order['lendAmount0'], forced_reserve0, forced_reserve1, self.fee
             )
             # Release liquidation required locked liquidity
             order['hightPrice'] = forced_final_height_price
             order['lowPrice'] = forced_initial_low_price
+            self._updateOrderRange(self.shortRangeIndex, orderID, order['lowPrice'], order['hightPrice'])
             
-            print("6.Return remaining USDT to user:",refundAmount,"USDT","modify order:",orderID,"all orders for this address:", self.getOrderIDsByAddress(self.current_address))
 
+        event_log_instance.emit("shortClose", pool=self.poolAddress, address=self.current_address, orderID=orderID, owner=order['address'], thirdParty=isThirdParty, closeAmount0=closeAmount0, amount1In=amount1_in, fee1=fee_amount1,
+                                loanFee=loanFeeAmount, thirdFee=close_third_fee, refund=refundAmount, fullClose=closeAmount0 == lendAmount0, priceBefore=initial_low_price, priceAfter=final_height_price)
         return True, "Liquidation successful"
                 
     
 
+    @transactional
     def longOpen(self, baseAmount1, lendAmount1, forcedClosePrice, insterOrderID):
         """
         Long operation
         :param baseAmount1: User provided base token amount (USDT)
         :param lendAmount1: User desired borrowed base token amount (USDT)
         :param forcedClosePrice: Forced liquidation price
-        :param insterOrderID: Insert to liquidation order queue ID (needs to be obtained off-chain)
+        :param insterOrderID: Insert to liquidation order queue ID (optional hint obtained off-chain, the position is located automatically when it is empty or stale)
         """
-        print("---------Long open longOpen--------- Current price:", self.getPrice())
         # ------------Pre-check section----------------
-        print("Parameters: use", baseAmount1, "USDT as collateral", "borrow", lendAmount1, "USDT", "forced liquidation price", forcedClosePrice, "insert liquidation order linked list position:", insterOrderID)
         if forcedClosePrice >= self.getPrice():
             return False, "Forced liquidation price cannot be greater than current price"
         if forcedClosePrice <= 0:
             return False, "Forced liquidation price cannot equal 0"
         # 1. Check if user address has enough baseAmount1 token1 tokens
-        user_balance = erc20_factory_instance.balanceOf(self.token1, self.current_address)
+        user_balance = self._balanceOf(self.token1, self.current_address)
         if user_balance < baseAmount1:
             return False, "Insufficient wallet balance"
 
@@ -519,41 +780,34 @@ class ShortSwapV1Pool(ShortSwapV1Order):
         total_base_amount = baseAmount1 + lendAmount1
 
         # Calculate all fees (based on lendAmount1 borrowed amount)
-        loan_fee = lendAmount1 * (1.0 - self.loanFee)  # Loan fee
-        loan_day_fee = lendAmount1 * (1.0 - self.loanDayFee)  # Loan daily interest fee       
-        forced_close_fee = lendAmount1 * (1.0 - self.forcedCloseFee)  # Forced liquidation fee
+        loan_fee = self.swapMath.get_fee_amount(lendAmount1, self.loanFee)  # Loan fee
+        loan_day_fee = self.swapMath.get_fee_amount(lendAmount1, self.loanDayFee)  # Loan daily interest fee       
+        forced_close_fee = self.swapMath.get_fee_amount(lendAmount1, self.forcedCloseFee)  # Forced liquidation fee
         third_fee = forced_close_fee + self.forcedCloseBaseAmount  # Total third party liquidation fee
         total_fees = loan_fee + loan_day_fee + third_fee  # Total loan fees USDT
-        # Print fees
-        print("1.Loan fee:", loan_fee, "USDT", "daily interest:", loan_day_fee, "USDT", "liquidation(third party benefit fee):", forced_close_fee, "USDT", "third party total fee:", third_fee, "USDT", "total borrowing fee:", total_fees, "USDT")
         
         # 4. Simulate purchase to get how many tokens
-        buy_amount0, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price = get_amount_out_reserve1_to_reserve0(
+        buy_amount0, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price = self.swapMath.get_amount_out_reserve1_to_reserve0(
             total_base_amount,self.reserve0, self.reserve1, self.fee
         )
-        print("2.Collateral + borrowed:" ,total_base_amount, "USDT can buy tokens (including fee):", buy_amount0 ,"T" )
         
         # Check if price movement range exceeds self.forceMoveRate
         price_change_rate = (final_height_price - initial_low_price) / initial_low_price
-        print(f"1.Calculate buy impact on price range {initial_low_price} to {final_height_price} price movement: {price_change_rate:.3%}")
         if price_change_rate > self.forceMoveRate:
             return False, f"Price movement {price_change_rate:.3%} exceeds maximum single trade volatility {self.forceMoveRate:.3%}"
 
-        print("3.1 Buy price range:", initial_low_price, "to", final_height_price)
         # Check if price range intersects with liquidation orders
         is_valid, message = self.checkShortOrderRange(final_height_price, initial_low_price )
-        print("4.Calculate buy impact on price range", initial_low_price, "to", final_height_price, "no intersection with short liquidation:", is_valid)
         if not is_valid:
             return False, "Intersects with short liquidation, please liquidate first"
 
 
         # Move liquidity pool to forcedClosePrice (for calculation only, cannot change real liquidity pool)
-        forced_reserve0, forced_reserve1 = get_reserves_at_price(forcedClosePrice, self.reserve0, self.reserve1)
+        forced_reserve0, forced_reserve1 = self.swapMath.get_reserves_at_price(forcedClosePrice, self.reserve0, self.reserve1)
         # 5. Simulate liquidation trade (sell buy_amount0 tokens, get forced_amount1_out base tokens)
-        forced_amount1_out, forced_fee_amount0, forced_new_reserve0, forced_new_reserve1, forced_initial_height_price, forced_final_low_price = get_amount_out_reserve0_to_reserve1(
+        forced_amount1_out, forced_fee_amount0, forced_new_reserve0, forced_new_reserve1, forced_initial_height_price, forced_final_low_price = self.swapMath.get_amount_out_reserve0_to_reserve1(
             buy_amount0, forced_reserve0, forced_reserve1, self.fee
         )
-        print("3.Liquidation at price:", forcedClosePrice, "sell tokens get (fee included):", forced_amount1_out, "USDT", "fee:", forced_fee_amount0, "T","no loss after liquidation needs at least:", lendAmount1+total_fees," borrowed USDT + fees")
         # Calculate whether liquidation will result in loss
         if forced_amount1_out + forced_amount1_out < lendAmount1+total_fees:
             return False, "Will lose money after liquidation"
@@ -562,27 +816,27 @@ class ShortSwapV1Pool(ShortSwapV1Order):
         
         # ------------Check section successful, actual trading section begins----------------
         # Create orderNode and insert
-        orderNode = {
-            'orderID': self.generateOrderID("long"),  # Generate order ID
-            'hightPrice': forced_initial_height_price,  # Highest price after forced liquidation
-            'lowPrice': forced_final_low_price,  # Lowest price after forced liquidation
-            'address': self.current_address,  # Current user address
-            'hightNode': "",  # Previous node
-            'lowNode': "",  # Next node
-            'orderType': "long",  # Order type is long
-            'baseAmount1': baseAmount1,  # User provided base token amount (USDT)
-            'lendAmount1': lendAmount1,  # User borrowed base token amount (USDT)
-            'buy_amount0': buy_amount0, # Purchased token amount (important data)
-            'forcedClosePrice': forcedClosePrice,  # Forced liquidation price
-            'loan_fee': loan_fee,  # Basic loan fee
-            'loan_day_fee': loan_day_fee,  # Loan daily interest fee
-            'third_fee': third_fee,  # Total third party liquidation fee
-            'loan_time': int(time.time()),  # Opening timestamp
-            'openPrice': self.getPrice(),  # Opening price
-            'insterOrderID': insterOrderID  # Insert liquidation order queue ID (for debugging)
-        }
+        orderNode = OrderRecord(
+            orderID=self.generateOrderID("long"),  # Generate order ID
+            hightPrice=forced_initial_height_price,  # Highest price after forced liquidation
+            lowPrice=forced_final_low_price,  # Lowest price after forced liquidation
+            address=self.current_address,  # Current user address
+            hightNode="",  # Previous node
+            lowNode="",  # Next node
+            orderType="long",  # Order type is long
+            baseAmount1=baseAmount1,  # User provided base token amount (USDT)
+            lendAmount1=lendAmount1,  # User borrowed base token amount (USDT)
+            buy_amount0=buy_amount0, # Purchased token amount (important data)
+            forcedClosePrice=forcedClosePrice,  # Forced liquidation price
+            loan_fee=loan_fee,  # Basic loan fee
+            loan_day_fee=loan_day_fee,  # Loan daily interest fee
+            third_fee=third_fee,  # Total third party liquidation fee
+            loan_time=int(self.now()),  # Opening timestamp
+            openPrice=self.getPrice(),  # Opening price
+            insterOrderID=insterOrderID  # Insert liquidation order queue ID (for debugging)
+        )
         # Insert liquidation order
-        success, message = self.insterLongOrder(orderNode, insterOrderID)
+        success, message = self.insterLongOrderAuto(orderNode, insterOrderID)
         if not success:
             return False, message
         
@@ -596,32 +850,33 @@ class ShortSwapV1Pool(ShortSwapV1Order):
 
 
         # Send collateral baseAmount1 to self.poolAddress
-        success, message = erc20_factory_instance.use(self.current_address).transfer(self.token1, self.poolAddress, baseAmount1)
+        success, message = self._transfer(self.token1, self.current_address, self.poolAddress, baseAmount1)
         if not success:
             return False, message
         
         # 3. Send fee_amount1 to self.feeAddress
-        success, message = erc20_factory_instance.use(self.poolAddress).transfer(self.token1, self.feeAddress, fee_amount1)
+        success, message = self._transfer(self.token1, self.poolAddress, self.feeAddress, fee_amount1)
         if not success:
             return False, message
         
-        print("6.Real trading completed, collateral buy tokens:", buy_amount0, "pieces", "collateral base tokens:", baseAmount1, "USDT", "trading fee:", fee_amount1, "USDT")
         
         
         # Update collateral variable
         self.collateralLongAmount1 += baseAmount1
 
-        print("7.Collateral transferred to loan pool:", baseAmount1, "USDT", "collateral in lending increased to:", self.collateralLongAmount1, "USDT", "all orders for this address:", self.getOrderIDsByAddress(self.current_address))
+        event_log_instance.emit("longOpen", pool=self.poolAddress, address=self.current_address, orderID=orderNode['orderID'], baseAmount1=baseAmount1, lendAmount1=lendAmount1, buyAmount0=buy_amount0, fee1=fee_amount1,
+                                loanFee=loan_fee, loanDayFee=loan_day_fee, thirdFee=third_fee, forcedClosePrice=forcedClosePrice, hightPrice=forced_initial_height_price, lowPrice=forced_final_low_price,
+                                priceBefore=initial_low_price, priceAfter=final_height_price)
 
         return True, "Long operation successful"
 
 
 
+    @transactional
     def longClose(self, orderID,closeAmount0,isThirdParty=False):
         """
         Long liquidation operation
         """
-        print("---------User long position liquidation longClose--------- Current price:", self.getPrice(),"orderID:",orderID,"calling address:",self.current_address)
         if closeAmount0 == 0:
             return False, "Liquidation amount cannot be 0"
         
@@ -633,16 +888,12 @@ class ShortSwapV1Pool(ShortSwapV1Order):
         if isThirdParty:
             # Need to check if liquidation line reached or lending time exceeded limit
             current_price = self.getPrice()
-            current_time = int(time.time())
+            current_time = int(self.now())
             threshold_price = order['forcedClosePrice'] * (1 + self.forceMoveRate)
             time_exceeded = (current_time - order['loan_time']) > self.lendingSecondLimit
             #print(current_price , threshold_price)
             if current_price > threshold_price and not time_exceeded:
                 return False, "Liquidation price conditions not met and lending time not exceeded"
-            if current_price <= threshold_price:
-                print(f"1.Liquidation line reached  price: {current_price}, liquidation order price{order['forcedClosePrice']}  liquidation threshold (will float up): {threshold_price}")
-            if time_exceeded:
-                print(f"1.Lending time exceeded limit  current time: {current_time}, opening time: {order['loan_time']}, lending time limit: {self.lendingSecondLimit}seconds")
         else:
             # Check if address in data matches self.current_address
             if order['address'] != self.current_address:
@@ -650,54 +901,50 @@ class ShortSwapV1Pool(ShortSwapV1Order):
 
         # 3. Execute sell operation sell buy_amount0 amount of tokens
         buy_amount0 = order['buy_amount0']  # Amount of tokens to sell
+        closeAmount0 = self._snapFullClose(closeAmount0, buy_amount0)
         if buy_amount0 < closeAmount0:
             return False, "Liquidation amount exceeds order amount"
         
         # For partial liquidation, need to check if full liquidation exceeds maximum liquidation range, if not, can only fully liquidate
         if closeAmount0 != buy_amount0:
             # Calculate price movement for selling all
-            _, _, _, _, check_initial_height_price, check_final_low_price = get_amount_out_reserve0_to_reserve1(
+            _, _, _, _, check_initial_height_price, check_final_low_price = self.swapMath.get_amount_out_reserve0_to_reserve1(
                 buy_amount0, self.reserve0, self.reserve1, self.fee
             )
             price_change_rate = (check_initial_height_price - check_final_low_price) / check_initial_height_price
-            print(f"1.2.Calculate sell impact on price range {check_initial_height_price} to {check_final_low_price} price movement: {price_change_rate:.3%}")
             if price_change_rate <= self.forceMoveRate:
                 return False, f"Full liquidation price movement {price_change_rate:.3%} does not exceed maximum single trade volatility {self.forceMoveRate:.3%}, this order cannot be partially liquidated"
 
-        close_rate = closeAmount0 / buy_amount0
-        print("0.Batch liquidation ratio:",close_rate)
-        # Reduce various parameters proportionally
-        close_loan_fee = order['loan_fee'] * close_rate
-        close_loan_day_fee = order['loan_day_fee'] * close_rate
-        close_lendAmount1 = order['lendAmount1'] * close_rate
+        # Reduce various parameters proportionally (by the batch liquidation ratio closeAmount0 / buy_amount0)
+        close_loan_fee = self.swapMath.get_prorated_amount(order['loan_fee'], closeAmount0, buy_amount0)
+        close_loan_day_fee = self.swapMath.get_prorated_amount(order['loan_day_fee'], closeAmount0, buy_amount0)
+        close_lendAmount1 = self.swapMath.get_prorated_amount(order['lendAmount1'], closeAmount0, buy_amount0)
         close_third_fee = 0 # Total third party liquidation fee
         if isThirdParty:
-            close_third_fee = order['third_fee'] * close_rate # Total third party liquidation fee
+            close_third_fee = self.swapMath.get_prorated_amount(order['third_fee'], closeAmount0, buy_amount0) # Total third party liquidation fee
         
         # Calculate selling closeAmount0 tokens to get how much USDT
-        amount1_out, fee_amount1, new_reserve0, new_reserve1, initial_height_price, final_low_price = get_amount_out_reserve0_to_reserve1(
+        amount1_out, fee_amount1, new_reserve0, new_reserve1, initial_height_price, final_low_price = self.swapMath.get_amount_out_reserve0_to_reserve1(
             closeAmount0, self.reserve0, self.reserve1, self.fee
         )
-        print("1.Repurchase:", closeAmount0, "tokens get", amount1_out, "USDT(fee included)", "fee:", fee_amount1, "T")
         
         if closeAmount0 != buy_amount0:
             price_close_change_rate = (initial_height_price - final_low_price) / initial_height_price
-            print(f"1.3.Calculate sell impact on price range {initial_height_price} to {final_low_price} price movement: {price_close_change_rate:.3%}")
             if price_close_change_rate < self.forceMoveSlack:
                 return False, f"Partial liquidation price movement {price_close_change_rate:.3%} too small, price volatility must be greater than {self.forceMoveSlack:.3%}"
 
         # Check if price range intersects with liquidation orders
         is_valid, message = self.checkLongOrderRange(initial_height_price,final_low_price,orderID)
-        print("2.Calculate sell impact on price range", initial_height_price, "to", final_low_price, "no intersection with long liquidation:", is_valid)
         if not is_valid:
             return False, "Intersects with other long liquidations, please liquidate first"
         
         # Start selling
+        self._saveOrder(order)
         self.reserve0 = new_reserve0
         self.reserve1 = new_reserve1
         
         # Send fee_amount1 to self.feeAddress (transfer from contract address)
-        success, message = erc20_factory_instance.use(self.poolAddress).transfer(self.token0, self.feeAddress, fee_amount1)
+        success, message = self._transfer(self.token0, self.poolAddress, self.feeAddress, fee_amount1)
         if not success:
             return False, message
         
@@ -706,25 +953,23 @@ class ShortSwapV1Pool(ShortSwapV1Order):
         loanFeeAmount = close_loan_fee + close_loan_day_fee  # Loan fee + interest
         refundAmount = amount1_out - loanFeeAmount - close_lendAmount1 - close_third_fee
         
-        print("3.User's total balance after liquidation:", amount1_out, "USDT", "actual refund:", refundAmount, "USDT", "interest etc. collected:", loanFeeAmount, "USDT")
         
         # Send loanFeeAmount fee to self.feeAddress (transfer from contract address)
-        success, message = erc20_factory_instance.use(self.poolAddress).transfer(self.token1, self.feeAddress, loanFeeAmount)
+        success, message = self._transfer(self.token1, self.poolAddress, self.feeAddress, loanFeeAmount)
         if not success:
             return False, message
         
         # Return borrowed coins
         self.loanReserve1 += close_lendAmount1
-        print("4.Return borrowed coins:", close_lendAmount1, "USDT", "loan pool loanReserve1 increased to:", self.loanReserve1, "USDT")
 
         # Return remaining USDT to user
-        success, message = erc20_factory_instance.use(self.poolAddress).transfer(self.token1, order['address'], refundAmount)
+        success, message = self._transfer(self.token1, self.poolAddress, order['address'], refundAmount)
         if not success:
             return False, message
 
         if isThirdParty:
             # Third party liquidation benefit fee to third party
-            success, message = erc20_factory_instance.use(self.poolAddress).transfer(self.token1, self.current_address, close_third_fee)
+            success, message = self._transfer(self.token1, self.poolAddress, self.current_address, close_third_fee)
             if not success:
                 return False, message
 
@@ -735,7 +980,7 @@ class ShortSwapV1Pool(ShortSwapV1Order):
             
             # Add closing data
             order['closePrice'] = self.getPrice()
-            order['closeTimestamp'] = int(time.time())
+            order['closeTimestamp'] = int(self.now())
             closeType = ""
             if isThirdParty:
                 closeType = "Third party liquidation"
@@ -748,7 +993,6 @@ class ShortSwapV1Pool(ShortSwapV1Order):
             success, message = self.deleteLongOrder(orderID)
             if not success:
                 return False, message
-            print("5.Return remaining USDT to user:", refundAmount, "USDT", "and delete order:", orderID, "all orders for this address:", self.getOrderIDsByAddress(self.current_address))
 
         else:
             # Modify order - subtract liquidated portion
@@ -759,13 +1003,15 @@ class ShortSwapV1Pool(ShortSwapV1Order):
             order['third_fee'] = order['third_fee'] - close_third_fee
             
             # Move liquidity pool to forcedClosePrice (for calculation only, cannot change real liquidity pool)
-            forced_reserve0, forced_reserve1 = get_reserves_at_price(order['forcedClosePrice'], self.reserve0, self.reserve1)
+            forced_reserve0, forced_reserve1 = self.swapMath.get_reserves_at_price(order['forcedClosePrice'], self.reserve0, self.reserve1)
             # 5. Simulate liquidation trade (sell buy_amount0 tokens, get forced_amount1_out base tokens)
-            forced_amount1_out, forced_fee_amount0, forced_new_reserve0, forced_new_reserve1, forced_initial_height_price, forced_final_low_price = get_amount_out_reserve0_to_reserve1(
+            forced_amount1_out, forced_fee_amount0, forced_new_reserve0, forced_new_reserve1, forced_initial_height_price, forced_final_low_price = self.swapMath.get_amount_out_reserve0_to_reserve1(
                 order['buy_amount0'], forced_reserve0, forced_reserve1, self.fee
             )
             order['hightPrice'] = forced_initial_height_price
             order['lowPrice'] = forced_final_low_price
-            print("5.Return remaining USDT to user:", refundAmount, "USDT", "and modify order:", orderID, "all orders for this address:", self.getOrderIDsByAddress(self.current_address))
+            self._updateOrderRange(self.longRangeIndex, orderID, order['lowPrice'], order['hightPrice'])
 
+        event_log_instance.emit("longClose", pool=self.poolAddress, address=self.current_address, orderID=orderID, owner=order['address'], thirdParty=isThirdParty, closeAmount0=closeAmount0, amount1Out=amount1_out, fee0=fee_amount1,
+                                loanFee=loanFeeAmount, lendAmount1=close_lendAmount1, thirdFee=close_third_fee, refund=refundAmount, fullClose=closeAmount0 == buy_amount0, priceBefore=initial_height_price, priceAfter=final_low_price)
         return True, "Liquidation successful"
@@ -2,6 +2,8 @@
 
 # Constant product market maker algorithm calculation functions
 
+import math
+
 def get_current_price(reserve0, reserve1):
     """
     Calculate current price
@@ -66,8 +68,9 @@ def get_reserves_at_price(price, reserve0, reserve1):
     k = reserve0 * reserve1
 
     # Calculate new reserves
-    new_reserve0 = (k / price) ** 0.5
-    new_reserve1 = (k * price) ** 0.5
+    # math.sqrt is correctly rounded (unlike ** 0.5), so swap_utils_batch can match it bit-for-bit
+    new_reserve0 = math.sqrt(k / price)
+    new_reserve1 = math.sqrt(k * price)
 
     # Calculate amount of tokens to buy or sell
     amount_in_reserve0 = new_reserve0 - reserve0
@@ -140,4 +143,37 @@ def get_amount_in_reserve1_for_amount0_out(amount0_out, reserve0, reserve1, fee=
     initial_low_price = get_current_price(reserve0, reserve1)
     final_height_price = get_current_price(new_reserve0, new_reserve1)
 
-    return amount1_in, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price
\ No newline at end of file
+    return amount1_in, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price
+
+
+def get_fee_amount(amount, rate):
+    """
+    Fee charged on amount for a fee ratio (the part of amount that rate does not keep)
+    :param rate: Fee ratio, e.g. loanFee 0.99 charges 1%
+    """
+    return amount * (1.0 - rate)
+
+
+def get_prorated_amount(amount, part, whole):
+    """
+    The share part / whole of amount (amount itself when part == whole)
+    """
+    return amount * (part / whole)
+
+
+def get_amount0_out_for_price_rise(reserve0, rate):
+    """
+    Largest amount of reserve0 tokens that can be bought out of the pool while the price rises at most rate
+    (the price rises by the factor (reserve0 / (reserve0 - x))^2, the fee is not added to the reserves)
+    :param rate: Price rise ratio, e.g. forceMoveRate 0.10
+    """
+    return reserve0 * (1 - 1 / math.sqrt(1 + rate))
+
+
+def get_amount0_in_for_price_drop(reserve0, rate, fee=0.997):
+    """
+    Largest amount of reserve0 tokens that can be sold to the pool while the price drops at most rate
+    (the price drops by the factor (reserve0 / (reserve0 + x * fee))^2)
+    :param rate: Price drop ratio, e.g. forceMoveRate 0.10
+    """
+    return reserve0 * (1 / math.sqrt(1 - rate) - 1) / fee
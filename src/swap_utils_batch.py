@@ -0,0 +1,158 @@
+# File name: swap_utils_batch.py
+
+# Vectorized (NumPy) versions of the constant product market maker functions in swap_utils.py
+# Every function accepts scalars or arrays (broadcast against each other) and performs the
+# same float64 operations in the same order as its scalar counterpart, so results match bit-for-bit.
+
+import numpy as np
+
+
+def _as_float64(*values):
+    return [np.asarray(value, dtype=np.float64) for value in values]
+
+
+def batch_get_current_price(reserve0, reserve1):
+    """
+    Calculate current prices
+    :param reserve0: Array of token amounts
+    :param reserve1: Array of base token amounts
+    :return: Array of current prices
+    """
+    reserve0, reserve1 = _as_float64(reserve0, reserve1)
+    return reserve1 / reserve0
+
+
+def batch_get_amount_out_reserve0_to_reserve1(amount0_in, reserve0, reserve1, fee=0.997):
+    """
+    Array version of get_amount_out_reserve0_to_reserve1
+    :param amount0_in: Array of input amounts of reserve0 tokens
+    :param reserve0: Array (or scalar) of token amounts
+    :param reserve1: Array (or scalar) of base token amounts
+    :param fee: Fee ratio (fee charged on reserve0 tokens)
+    :return: Arrays of amount1_out, fee_amount0, new_reserve0, new_reserve1, initial_height_price, final_low_price
+    """
+    amount0_in, reserve0, reserve1, fee = _as_float64(amount0_in, reserve0, reserve1, fee)
+    amount0_in_with_fee = amount0_in * fee
+    fee_amount0 = amount0_in - amount0_in_with_fee
+    numerator = amount0_in_with_fee * reserve1
+    denominator = reserve0 + amount0_in_with_fee
+    amount1_out = numerator / denominator
+    new_reserve0 = reserve0 + amount0_in_with_fee
+    new_reserve1 = reserve1 - amount1_out
+    initial_height_price = reserve1 / reserve0
+    final_low_price = new_reserve1 / new_reserve0
+    return amount1_out, fee_amount0, new_reserve0, new_reserve1, initial_height_price, final_low_price
+
+
+def batch_get_amount_out_reserve1_to_reserve0(amount1_in, reserve0, reserve1, fee=0.997):
+    """
+    Array version of get_amount_out_reserve1_to_reserve0
+    :param amount1_in: Array of input amounts of reserve1 tokens
+    :param reserve0: Array (or scalar) of token amounts
+    :param reserve1: Array (or scalar) of base token amounts
+    :param fee: Fee ratio (fee charged on reserve1 tokens)
+    :return: Arrays of amount0_out, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price
+    """
+    amount1_in, reserve0, reserve1, fee = _as_float64(amount1_in, reserve0, reserve1, fee)
+    amount1_in_with_fee = amount1_in * fee
+    fee_amount1 = amount1_in - amount1_in_with_fee
+    numerator = amount1_in_with_fee * reserve0
+    denominator = reserve1 + amount1_in_with_fee
+    amount0_out = numerator / denominator
+    new_reserve0 = reserve0 - amount0_out
+    new_reserve1 = reserve1 + amount1_in_with_fee
+    initial_low_price = reserve1 / reserve0
+    final_height_price = new_reserve1 / new_reserve0
+    return amount0_out, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price
+
+
+def batch_get_reserves_at_price(price, reserve0, reserve1):
+    """
+    Array version of get_reserves_at_price
+    :param price: Array of target prices
+    :param reserve0: Array (or scalar) of current reserve0 amounts
+    :param reserve1: Array (or scalar) of current reserve1 amounts
+    :return: Arrays of new reserve0, reserve1
+    """
+    price, reserve0, reserve1 = _as_float64(price, reserve0, reserve1)
+    k = reserve0 * reserve1
+    new_reserve0 = np.sqrt(k / price)
+    new_reserve1 = np.sqrt(k * price)
+    return new_reserve0, new_reserve1
+
+
+def batch_get_amount_in_reserve0_for_amount1_out(amount1_out, reserve0, reserve1, fee=0.997):
+    """
+    Array version of get_amount_in_reserve0_for_amount1_out
+    Entries with amount1_out >= reserve1 (insufficient liquidity) are returned as NaN instead of raising
+    :param amount1_out: Array of expected output amounts of reserve1 tokens
+    :param reserve0: Array (or scalar) of token0 reserve amounts
+    :param reserve1: Array (or scalar) of token1 reserve amounts
+    :param fee: Fee ratio (fee charged on reserve0 tokens)
+    :return: Arrays of amount0_in, fee_amount0, new_reserve0, new_reserve1, initial_height_price, final_low_price
+    """
+    amount1_out, reserve0, reserve1, fee = _as_float64(amount1_out, reserve0, reserve1, fee)
+    insufficient = amount1_out >= reserve1
+    initial_height_price = reserve1 / reserve0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        numerator = amount1_out * reserve0
+        denominator = (reserve1 - amount1_out) * fee
+        amount0_in = numerator / denominator
+        fee_amount0 = amount0_in * (1 - fee)
+        new_reserve0 = reserve0 + amount0_in
+        new_reserve1 = reserve1 - amount1_out
+        final_low_price = new_reserve1 / new_reserve0
+    results = np.broadcast_arrays(amount0_in, fee_amount0, new_reserve0, new_reserve1, initial_height_price, final_low_price)
+    return _mask_insufficient(results, insufficient)
+
+
+def batch_get_amount_in_reserve1_for_amount0_out(amount0_out, reserve0, reserve1, fee=0.997):
+    """
+    Array version of get_amount_in_reserve1_for_amount0_out
+    Entries with amount0_out >= reserve0 (insufficient liquidity) are returned as NaN instead of raising
+    :param amount0_out: Array of desired amounts of reserve0 tokens
+    :param reserve0: Array (or scalar) of token0 reserve amounts
+    :param reserve1: Array (or scalar) of token1 reserve amounts
+    :param fee: Fee ratio (fee charged on reserve1 tokens)
+    :return: Arrays of amount1_in, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price
+    """
+    amount0_out, reserve0, reserve1, fee = _as_float64(amount0_out, reserve0, reserve1, fee)
+    insufficient = amount0_out >= reserve0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        numerator = reserve1 * amount0_out
+        denominator = (reserve0 - amount0_out) * fee
+        amount1_in = numerator / denominator
+        fee_amount1 = amount1_in * (1 - fee)
+        amount1_in_with_fee = amount1_in - fee_amount1
+        new_reserve0 = reserve0 - amount0_out
+        new_reserve1 = reserve1 + amount1_in_with_fee
+        initial_low_price = reserve1 / reserve0
+        final_height_price = new_reserve1 / new_reserve0
+    results = np.broadcast_arrays(amount1_in, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price)
+    return _mask_insufficient(results, insufficient)
+
+
+def _mask_insufficient(results, insufficient):
+    """
+    Copy broadcast results into writable arrays and set rows without enough liquidity to NaN
+    """
+    masked = []
+    for result in results:
+        result = np.array(result, dtype=np.float64)
+        if result.ndim == 0:
+            if insufficient:
+                result = np.float64(np.nan)
+        else:
+            result[np.broadcast_to(insufficient, result.shape)] = np.nan
+        masked.append(result)
+    return tuple(masked)
+
+
+if __name__ == '__main__':
+    # Example: quote a ladder of buy sizes against a single pool in one call
+    amounts = np.linspace(100, 10000, 5)
+    amount0_out, fee_amount1, new_reserve0, new_reserve1, start_price, end_price = batch_get_amount_out_reserve1_to_reserve0(
+        amounts, 1000000, 100000
+    )
+    for amount, out, price in zip(amounts, amount0_out, end_price):
+        print("Buy with", amount, "USDT get", out, "tokens, price after buy:", price)
@@ -0,0 +1,174 @@
+# File name: swap_utils_fixed.py
+
+# Fixed point versions of the constant product market maker functions in swap_utils.py
+# Amounts are integers in 18-decimal base units (1 token = WAD units, as for decimals=18 tokens), prices and fee
+# ratios are integers scaled by WAD (fee=FEE is 0.997). Every function takes and returns the same values as its
+# swap_utils counterpart, computed with integer arithmetic only: results are exact and identical on every machine.
+# Amounts paid to the pool are rounded up and amounts paid out by it are rounded down, so rounding never drains it.
+
+import math
+from decimal import Decimal, ROUND_DOWN
+
+WAD = 10 ** 18  # Base units per token, and the scale of prices and ratios
+FEE = 997 * 10 ** 15  # Default trading fee ratio (0.997)
+
+
+def to_units(amount):
+    """
+    Convert a token amount, price or ratio to base units, exactly for any amount with at most 18 decimals
+    (floats are converted from their shortest decimal representation, so 0.1 becomes 10**17)
+    :param amount: int, float, str or Decimal amount in tokens, e.g. 12.5
+    :return: int amount in base units, rounded down below one unit
+    """
+    return int((Decimal(str(amount)) * WAD).to_integral_value(ROUND_DOWN))
+
+
+def from_units(units):
+    """
+    Convert base units back to tokens without rounding (to_units(from_units(units)) == units)
+    :param units: int amount in base units
+    :return: Decimal amount in tokens
+    """
+    return Decimal(units).scaleb(-18)
+
+
+def _ceil_div(numerator, denominator):
+    return -(-numerator // denominator)
+
+
+def get_current_price(reserve0, reserve1):
+    """
+    Calculate current price
+    :param reserve0: Amount of tokens
+    :param reserve1: Amount of base tokens
+    :return: Current price, scaled by WAD
+    """
+    return reserve1 * WAD // reserve0
+
+
+def get_amount_out_reserve0_to_reserve1(amount0_in, reserve0, reserve1, fee=FEE):
+    """
+    Calculate how much reserve1 can be exchanged for a certain amount of reserve0 tokens
+    Fee is charged on reserve0 tokens
+    :param amount0_in: Input amount of reserve0 tokens
+    :param reserve0: Amount of tokens
+    :param reserve1: Amount of base tokens
+    :param fee: Fee ratio scaled by WAD (fee charged on reserve0 tokens)
+    :return: Amount of reserve1 that can be exchanged, fee amount, updated reserve0, reserve1, initial and final price
+    """
+    amount0_in_with_fee = amount0_in * fee // WAD
+    fee_amount0 = amount0_in - amount0_in_with_fee
+    amount1_out = amount0_in_with_fee * reserve1 // (reserve0 + amount0_in_with_fee)
+    new_reserve0 = reserve0 + amount0_in_with_fee
+    new_reserve1 = reserve1 - amount1_out
+    initial_height_price = get_current_price(reserve0, reserve1)
+    final_low_price = get_current_price(new_reserve0, new_reserve1)
+    return amount1_out, fee_amount0, new_reserve0, new_reserve1, initial_height_price, final_low_price
+
+
+def get_amount_out_reserve1_to_reserve0(amount1_in, reserve0, reserve1, fee=FEE):
+    """
+    Calculate how much reserve0 can be exchanged for a certain amount of reserve1 tokens
+    Fee is charged on reserve1 tokens
+    :param amount1_in: Input amount of reserve1 tokens
+    :param reserve0: Amount of tokens
+    :param reserve1: Amount of base tokens
+    :param fee: Fee ratio scaled by WAD (fee charged on reserve1 tokens)
+    :return: Amount of reserve0 that can be exchanged, fee amount, updated reserve0, reserve1, initial and final price
+    """
+    amount1_in_with_fee = amount1_in * fee // WAD
+    fee_amount1 = amount1_in - amount1_in_with_fee
+    amount0_out = amount1_in_with_fee * reserve0 // (reserve1 + amount1_in_with_fee)
+    new_reserve0 = reserve0 - amount0_out
+    new_reserve1 = reserve1 + amount1_in_with_fee
+    initial_low_price = get_current_price(reserve0, reserve1)
+    final_height_price = get_current_price(new_reserve0, new_reserve1)
+    return amount0_out, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price
+
+
+def get_reserves_at_price(price, reserve0, reserve1):
+    """
+    Given target price and current reserves, calculate reserves at target price (same constant product k)
+    :param price: Target price, scaled by WAD
+    :param reserve0: Current reserve0 amount
+    :param reserve1: Current reserve1 amount
+    :return: New reserve0, reserve1
+    """
+    k = reserve0 * reserve1
+    return math.isqrt(k * WAD // price), math.isqrt(k * price // WAD)
+
+
+def get_amount_in_reserve0_for_amount1_out(amount1_out, reserve0, reserve1, fee=FEE):
+    """
+    Calculate how much reserve0 tokens are needed to exchange for specified amount of reserve1 tokens
+    Fee is charged on reserve0 tokens
+    :param amount1_out: Expected output amount of reserve1 tokens
+    :param reserve0: Token0 reserve amount
+    :param reserve1: Token1 reserve amount
+    :param fee: Fee ratio scaled by WAD (fee charged on reserve0 tokens)
+    :return: Required input amount of reserve0 tokens (fee included), fee amount, updated reserve0, reserve1, pre-exchange price, post-exchange price
+    """
+    assert amount1_out < reserve1, 'SwapV1: INSUFFICIENT_LIQUIDITY'
+    initial_height_price = get_current_price(reserve0, reserve1)
+    amount0_in = _ceil_div(amount1_out * reserve0 * WAD, (reserve1 - amount1_out) * fee)
+    fee_amount0 = amount0_in * (WAD - fee) // WAD
+    new_reserve0 = reserve0 + amount0_in
+    new_reserve1 = reserve1 - amount1_out
+    final_low_price = get_current_price(new_reserve0, new_reserve1)
+    return amount0_in, fee_amount0, new_reserve0, new_reserve1, initial_height_price, final_low_price
+
+
+def get_amount_in_reserve1_for_amount0_out(amount0_out, reserve0, reserve1, fee=FEE):
+    """
+    Calculate how much reserve1 tokens are needed to exchange for specified amount of reserve0 tokens
+    Fee is charged on reserve1 tokens
+    :param amount0_out: Desired amount of reserve0 tokens to obtain
+    :param reserve0: Token0 reserve amount
+    :param reserve1: Token1 reserve amount
+    :param fee: Fee ratio scaled by WAD (fee charged on reserve1 tokens)
+    :return: Required input amount of reserve1 tokens (fee included), fee amount, updated reserve0, reserve1, initial price, final price
+    """
+    assert amount0_out < reserve0, 'SwapV1: INSUFFICIENT_LIQUIDITY'
+    amount1_in = _ceil_div(reserve1 * amount0_out * WAD, (reserve0 - amount0_out) * fee)
+    fee_amount1 = amount1_in * (WAD - fee) // WAD
+    amount1_in_with_fee = amount1_in - fee_amount1
+    new_reserve0 = reserve0 - amount0_out
+    new_reserve1 = reserve1 + amount1_in_with_fee
+    initial_low_price = get_current_price(reserve0, reserve1)
+    final_height_price = get_current_price(new_reserve0, new_reserve1)
+    return amount1_in, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price
+
+
+def get_fee_amount(amount, rate):
+    """
+    Fee charged on amount for a fee ratio (the part of amount that rate does not keep)
+    :param rate: Ratio scaled by WAD, e.g. loanFee 0.99 charges 1%
+    """
+    return amount * (WAD - rate) // WAD
+
+
+def get_prorated_amount(amount, part, whole):
+    """
+    The share part / whole of amount, rounded down (amount itself when part == whole)
+    """
+    return amount * part // whole
+
+
+def get_amount0_out_for_price_rise(reserve0, rate):
+    """
+    Largest amount of reserve0 tokens that can be bought out of the pool while the price rises at most rate
+    (the price rises by the factor (reserve0 / (reserve0 - x))^2, the fee is not added to the reserves)
+    :param rate: Price rise ratio as a float, e.g. forceMoveRate 0.10
+    """
+    new_reserve0 = math.isqrt(reserve0 * reserve0 * WAD // (WAD + to_units(rate))) + 1
+    return reserve0 - new_reserve0
+
+
+def get_amount0_in_for_price_drop(reserve0, rate, fee=FEE):
+    """
+    Largest amount of reserve0 tokens that can be sold to the pool while the price drops at most rate
+    (the price drops by the factor (reserve0 / (reserve0 + x * fee))^2)
+    :param rate: Price drop ratio as a float, e.g. forceMoveRate 0.10
+    """
+    new_reserve0 = math.isqrt(reserve0 * reserve0 * WAD // (WAD - to_units(rate)))
+    return (new_reserve0 - reserve0) * WAD // fee
@@ -1,37 +1,64 @@
-import threading
 import time
+from decimal import Decimal, InvalidOperation
 from shortswapv1pool import ShortSwapV1Pool
+from rwlock import ReadWriteLock
+from eventlog import event_log_instance
+from pricehistory import PriceHistory, BUY, SELL
+from changefeed import ChangeFeed
 from swap_utils import get_current_price,get_amount_in_reserve1_for_amount0_out,get_amount_in_reserve0_for_amount1_out, get_amount_out_reserve0_to_reserve1, get_amount_out_reserve1_to_reserve0, get_reserves_at_price
 
+# Trade methods accepted by SwapHub.submit_batch and the pool method each one runs
+BATCH_OPERATIONS = {
+    "buy": "buy",
+    "sell": "sell",
+    "short_open": "shortOpen",
+    "short_close": "shortClose",
+    "long_open": "longOpen",
+    "long_close": "longClose",
+}
+
 # This class is equivalent to frontend code, no need to write as contract
 class SwapHub:
-    def __init__(self, pool: ShortSwapV1Pool):
+    def __init__(self, pool: ShortSwapV1Pool, journal=None):
         self.pool = pool
-        self.price_history = []
+        self.journal = journal  # Optional persistence.Persistence, committed trades are appended to its write-ahead log
+        self.change_feed = ChangeFeed()  # Published after every committed trade, UI sessions subscribe instead of polling
+        self.price_history = PriceHistory()  # Ticks and OHLCV candles of every price change
         self.current_price = None
-        self.lock = threading.Lock()
+        self.lock = ReadWriteLock()  # Reads share the lock, trades hold it exclusively
+        self.forced_close_price_tolerance = 1e-9  # Relative precision of the forced close price solvers
         
 
+    def get_snapshot(self):
+        """
+        Get the latest immutable pool snapshot (lock-free).
+        """
+        return self.pool.getSnapshot()
+
+    def get_version(self):
+        """
+        Get the version of the latest pool snapshot, clients can skip refreshes while it is unchanged.
+        """
+        return self.pool.getSnapshot().version
+
     def get_info(self):
         """
-        Get all attribute information of current pool.
+        Get all attribute information of current pool (from the latest snapshot, lock-free).
         """
-        with self.lock:
-            return self.pool.getInfo()
+        return self.pool.getSnapshot().info
 
     def get_reserves(self):
         """
-        Get reserve information of current pool.
+        Get reserve information of current pool (from the latest snapshot, lock-free).
         """
-        with self.lock:
-            return self.pool.getReserves()
+        snapshot = self.pool.getSnapshot()
+        return snapshot.reserve0, snapshot.reserve1
 
     def get_price(self):
         """
-        Get current price.
+        Get current price (from the latest snapshot, lock-free).
         """
-        with self.lock:
-            return self.pool.getPrice()
+        return self.pool.getSnapshot().price
 
     def buy(self, caller_address, amount1):
         """
@@ -39,10 +66,7 @@ class SwapHub:
         :param caller_address: Caller address
         :param amount1: Amount of tokens to buy
         """
-        with self.lock:
-            result = self.pool.use(caller_address).buy(amount1)
-            self._update_price_history()
-            return result
+        return self._execute("buy", caller_address, amount1)
 
     def sell(self, caller_address, amount0):
         """
@@ -50,10 +74,7 @@ class SwapHub:
         :param caller_address: Caller address
         :param amount0: Amount of tokens to sell
         """
-        with self.lock:
-            result = self.pool.use(caller_address).sell(amount0)
-            self._update_price_history()
-            return result
+        return self._execute("sell", caller_address, amount0)
 
     def short_open(self, caller_address, baseAmount, lendAmount, forcedClosePrice, insterOrderID):
         """
@@ -62,12 +83,9 @@ class SwapHub:
         :param baseAmount: User provided base token amount
         :param lendAmount: User desired borrowed token amount
         :param forcedClosePrice: Forced liquidation price
-        :param insterOrderID: Insert to liquidation order queue ID
+        :param insterOrderID: Insert to liquidation order queue ID (optional hint, located automatically when empty or stale)
         """
-        with self.lock:
-            result = self.pool.use(caller_address).shortOpen(baseAmount, lendAmount, forcedClosePrice, insterOrderID)
-            self._update_price_history()
-            return result
+        return self._execute("shortOpen", caller_address, baseAmount, lendAmount, forcedClosePrice, insterOrderID)
 
     def short_close(self, caller_address, orderID, closeAmount0,isThirdParty=False):
         """
@@ -76,10 +94,7 @@ class SwapHub:
         :param orderID: Order ID
         :param closeAmount0: Liquidation amount
         """
-        with self.lock:
-            result = self.pool.use(caller_address).shortClose(orderID, closeAmount0,isThirdParty)
-            self._update_price_history()
-            return result
+        return self._execute("shortClose", caller_address, orderID, closeAmount0, isThirdParty)
 
 
 
@@ -91,12 +106,9 @@ class SwapHub:
         :param lendAmount1: User desired borrowed base token amount
         :param buyAmount0: Amount of tokens to purchase
         :param forcedClosePrice: Forced liquidation price
-        :param insterOrderID: Insert to liquidation order queue ID
+        :param insterOrderID: Insert to liquidation order queue ID (optional hint, located automatically when empty or stale)
         """
-        with self.lock:
-            result = self.pool.use(caller_address).longOpen(baseAmount, lendAmount1, forcedClosePrice, insterOrderID)
-            self._update_price_history()
-            return result
+        return self._execute("longOpen", caller_address, baseAmount, lendAmount1, forcedClosePrice, insterOrderID)
 
     def long_close(self, caller_address, orderID, closeAmount0, isThirdParty=False):
         """
@@ -105,30 +117,213 @@ class SwapHub:
         :param orderID: Order ID
         :param closeAmount0: Liquidation amount
         """
-        with self.lock:
-            result = self.pool.use(caller_address).longClose(orderID, float(closeAmount0),isThirdParty)
-            self._update_price_history()
-            return result
+        try:
+            closeAmount0 = self._close_amount(closeAmount0)
+        except ValueError as error:
+            return False, str(error)
+        return self._execute("longClose", caller_address, orderID, closeAmount0, isThirdParty)
+
+
+
+    def submit_batch(self, operations):
+        """
+        Execute an ordered list of trades under one write lock acquisition (see ShortSwapV1Pool.submitBatch).
+        Each item is accepted or rejected exactly like the same calls made one after another, the batch is one
+        write-ahead log record, one snapshot and one change notification.
+        :param operations: List of (caller_address, operation, args): operation is a key of BATCH_OPERATIONS and
+                           args the arguments of that SwapHub method after the caller address, e.g.
+                           [("0xA", "buy", (100,)), ("0xB", "long_close", ("long3", 50.0))]
+        :return: List of (bool, message), one per item
+        """
+        items = self._batch_items(operations)
+        prices, volumes, sides = [], [], []
+
+        def record_price(index, result, reserve0_before):
+            # Same check as _update_price_history, the ticks are written together at the end
+            new_price = self.pool.getPrice()
+            if new_price != self.current_price:
+                self.current_price = new_price
+                reserve0_after = self.pool.reserve0
+                prices.append(new_price)
+                volumes.append(abs(reserve0_after - reserve0_before))
+                sides.append(BUY if reserve0_after < reserve0_before else SELL)
+
+        with self.lock.write():
+            timestamp = time.time()
+            if self.journal is None:
+                results = self.pool.at(timestamp).submitBatch(items, record_price)[1]
+            else:
+                with self.journal.lock:
+                    results = self.pool.at(timestamp).submitBatch(items, record_price)[1]
+                    if any(result[0] for result in results):
+                        self.journal.append(self.pool.poolAddress, "submitBatch", None, (items,), timestamp)
+            for (caller_address, op, _args), result in zip(items, results):
+                self._log_rejection(op, caller_address, result)
+            self.price_history.extend(timestamp, prices, volumes, sides)
+        if any(result[0] for result in results):
+            self.change_feed.publish()
+        return results
+
+    def simulate(self, caller_address, op, *args):
+        """
+        Preview one trade against the current state without executing it (see ShortSwapV1Pool.simulate).
+        :param caller_address: Caller address
+        :param op: A key of BATCH_OPERATIONS, e.g. "short_open"
+        :param args: Arguments of that SwapHub method after the caller address
+        :return: dict with the result and the full effect of the trade (amounts, fees, new reserves, order ranges)
+        """
+        return self.simulate_many([(caller_address, op, args)])[0]
+
+    def simulate_many(self, operations):
+        """
+        Preview several trades under one write lock acquisition, each one on its own against the current state.
+        :param operations: List of (caller_address, operation, args), same format as submit_batch
+        :return: List of effect dicts, one per item
+        """
+        items = self._batch_items(operations)
+        with self.lock.write():
+            timestamp = time.time()
+            return [self.pool.use(caller_address).at(timestamp).simulate(op, *args) for caller_address, op, args in items]
+
+    def _batch_items(self, operations):
+        """
+        Check batch items and convert them to (caller_address, pool method, args)
+        Raises ValueError for an unknown operation or an invalid long_close amount, before any item runs
+        """
+        items = []
+        for caller_address, op, args in operations:
+            if op not in BATCH_OPERATIONS:
+                raise ValueError(f"Unknown batch operation {op!r}, expected one of {sorted(BATCH_OPERATIONS)}")
+            args = tuple(args)
+            if op == "long_close":
+                args = (args[0], self._close_amount(args[1])) + args[2:]  # Same conversion as long_close()
+            items.append((caller_address, BATCH_OPERATIONS[op], args))
+        return items
+
+    def _close_amount(self, amount):
+        # Close amounts from the UI may be strings, fixed point pools take integer base units. Raises ValueError for
+        # an amount that is not a number, or not a whole number of base units on a fixed point pool (never truncated)
+        if not self.pool.fixedPoint:
+            return float(amount)
+        if isinstance(amount, int):
+            return amount
+        try:
+            units = Decimal(str(amount).strip())
+        except InvalidOperation:
+            units = None
+        if units is None or not units.is_finite():
+            raise ValueError(f"Close amount {amount!r} is not a number")
+        if units != units.to_integral_value():
+            raise ValueError(f"Close amount {amount!r} is not a whole number of base units, fixed point pools take integer amounts")
+        return int(units)
+
+    def get_price_history(self, num=100):
+        """
+        Return price history.
+        :param num: Number of most recent prices
+        :return: List of prices, oldest first
+        """
+        with self.lock.read():
+            return self.price_history.latest_prices(num).tolist()
 
+    def get_change_version(self):
+        """
+        Version of the change feed (lock-free), it increases after every committed trade.
+        """
+        return self.change_feed.version
 
+    def subscribe(self, since_version=None, heartbeat=None):
+        """
+        Async generator of change versions, see ChangeFeed.updates.
+        :param since_version: Last version the subscriber has seen, None to get the current version first
+        :param heartbeat: Seconds between heartbeats (the unchanged version is yielded again), None for no heartbeat
+        """
+        return self.change_feed.updates(since_version, heartbeat)
 
-    def get_price_history(self):
+    def notify_change(self):
         """
-        Return price history.
+        Publish a change that did not go through the hub, e.g. an airdrop changing balances.
+        """
+        return self.change_feed.publish()
+
+    def get_price_history_version(self):
+        """
+        Version of the price history (lock-free), it changes whenever a price is recorded.
+        """
+        return self.price_history.version
+
+    def get_price_ticks(self, num=100):
+        """
+        Return the most recent price ticks.
+        :param num: Number of ticks
+        :return: dict of NumPy arrays: timestamp, price, volume, side (pricehistory.BUY / SELL)
         """
-        with self.lock:
-            return self.price_history
+        with self.lock.read():
+            return self.price_history.latest_ticks(num)
 
-    def _update_price_history(self):
+    def get_candles(self, interval=60, num=100):
+        """
+        Return OHLCV candles.
+        :param interval: Candle length in seconds, one of pricehistory.DEFAULT_CANDLE_INTERVALS
+        :param num: Number of most recent candles
+        :return: dict of NumPy arrays: start, open, high, low, close, volume
+        """
+        with self.lock.read():
+            return self.price_history.get_candles(interval, num)
+
+    def _update_price_history(self, timestamp, reserve0_before):
         """
         Check price changes and update price history.
+        :param timestamp: Time of the operation
+        :param reserve0_before: Pool reserve0 before the operation, the difference is the traded volume
         """
         new_price = self.pool.getPrice()
         if new_price != self.current_price:
             self.current_price = new_price
-            self.price_history.append(new_price)
-            if len(self.price_history) > 100:
-                self.price_history.pop(0)
+            reserve0_after = self.pool.reserve0
+            side = BUY if reserve0_after < reserve0_before else SELL
+            self.price_history.append(timestamp, new_price, abs(reserve0_after - reserve0_before), side)
+
+    def _execute(self, op, caller_address, *args):
+        """
+        Run one pool operation under the write lock.
+        :param op: Pool method name, e.g. "buy", "shortOpen"
+        :param caller_address: Caller address
+        :param args: Pool method arguments
+        """
+        with self.lock.write():
+            result = self._apply(op, caller_address, *args)
+        # Wake subscribers after the write lock is released, they read the new state right away
+        if result[0]:
+            self.change_feed.publish()
+        return result
+
+    def _apply(self, op, caller_address, *args):
+        """
+        Run one pool operation, journal it and record the price. The caller holds the write lock and publishes the
+        change (used by _execute, and by the liquidation keeper to run a whole sweep under one lock acquisition).
+        The operation time is pinned so a journaled trade replays with the same timestamps.
+        """
+        timestamp = time.time()
+        reserve0_before = self.pool.reserve0
+        if self.journal is None:
+            result = getattr(self.pool.use(caller_address).at(timestamp), op)(*args)
+        else:
+            # Apply and append under the journal lock so the log order matches the order state changed in
+            with self.journal.lock:
+                result = getattr(self.pool.use(caller_address).at(timestamp), op)(*args)
+                if result[0]:
+                    self.journal.append(self.pool.poolAddress, op, caller_address, args, timestamp)
+        self._log_rejection(op, caller_address, result)
+        self._update_price_history(timestamp, reserve0_before)
+        return result
+
+    def _log_rejection(self, op, caller_address, result):
+        """
+        Record a rejected trade, committed trades are recorded by the pool itself.
+        """
+        if not result[0]:
+            event_log_instance.emit("rejected", pool=self.pool.poolAddress, op=op, address=caller_address, message=result[1], price=self.pool.getPrice())
 
 
     def get_address_history_orders(self, address):
@@ -137,25 +332,31 @@ class SwapHub:
         :param address: User address
         :return: Historical order list for the address
         """
-        with self.lock:
+        with self.lock.read():
             return self.pool.getAddressHistoryOrders(address)
 
     def get_short_order(self, num):
         """
         Get short order data.
         :param num: Number of nodes to retrieve
-        :return: List containing data of specified number of nodes
+        :return: List containing data of specified number of nodes (read-only when served from the snapshot)
         """
-        with self.lock:
+        snapshot = self.pool.getSnapshot()
+        if num <= len(snapshot.shortOrders) or len(snapshot.shortOrders) < self.pool.snapshotOrderDepth:
+            return list(snapshot.shortOrders[:num])
+        with self.lock.read():
             return self.pool.getShortOrder(self.pool.nearShortNode, num)
 
     def get_long_order(self, num):
         """
         Get long order data.
         :param num: Number of nodes to retrieve
-        :return: List containing data of specified number of nodes
+        :return: List containing data of specified number of nodes (read-only when served from the snapshot)
         """
-        with self.lock:
+        snapshot = self.pool.getSnapshot()
+        if num <= len(snapshot.longOrders) or len(snapshot.longOrders) < self.pool.snapshotOrderDepth:
+            return list(snapshot.longOrders[:num])
+        with self.lock.read():
             return self.pool.getLongOrder(self.pool.nearLongNode, num)
         
     
@@ -168,77 +369,51 @@ class SwapHub:
         :param levMult: Leverage multiplier
         :return: (bool, str) Whether operation was successful and corresponding message
         """
-        print(f"Starting fast short open operation: address={caller_address}, base amount={baseAmount}, leverage multiplier={levMult}")
+        if self.pool.fixedPoint:
+            return False, "Fast open searches float prices, use short_open with a fixed point forced close price"
 
         # 1. Calculate total available amount
         total_amount = baseAmount * levMult
-        print(f"1. Calculate available total amount: {total_amount}")
 
         # 2. Get current price and initial forced close price
         current_price = self.get_price()
         initial_forced_close_price = current_price * (1 + 1 / levMult)
-        print(f"2. Current price: {current_price}, initial forced close price: {initial_forced_close_price}")
 
         # 3. Get current reserves
         reserve0, reserve1 = self.get_reserves()
-        print(f"3. Current reserves: reserve0={reserve0}, reserve1={reserve1}")
 
-        # 4. Loop to adjust forced close price to a value where pool won't lose money
-        forced_close_price = initial_forced_close_price
+        # 4. Solve for the highest forced close price where pool won't lose money
         lendAmount = total_amount / current_price
-        max_iterations = 10000
-        for i in range(max_iterations):
-            is_valid, result = self.calculate_short_open(reserve0, reserve1, baseAmount, lendAmount, forced_close_price)
-            print(f"4. Attempt {i+1}: forced close price={forced_close_price}, is valid={is_valid}")
-            
-            if is_valid:
-                break
-            
-            forced_close_price *= 0.998  # Decrease forced close price by 1%
-            
-            if forced_close_price <= current_price:
-                return False, "Unable to find suitable forced close price"
+        forced_close_price = self.solve_short_forced_close_price(reserve0, reserve1, baseAmount, lendAmount, current_price, initial_forced_close_price)
+        if forced_close_price is None:
+            return False, "Unable to find suitable forced close price"
 
+        is_valid, result = self.calculate_short_open(reserve0, reserve1, baseAmount, lendAmount, forced_close_price)
         if not is_valid:
-            return False, "Reached maximum iterations, still unable to find suitable forced close price"
-
-        print(f"5. Found suitable forced close price: {forced_close_price}")
+            return False, "Unable to find suitable forced close price"
 
-        # 5. Get short order data
-        short_orders = self.get_short_order(10000)
-        print(f"6. Retrieved {len(short_orders)} short orders")
 
-        # 6. Check for intersections and adjust forced close price
+        # 5. Check for intersections with existing short orders (sorted index lookup) and adjust forced close price
         forced_initial_low_price = result['forced_initial_low_price']
         forced_final_height_price = result['forced_final_height_price']
         max_iterations = 10000  # Set maximum iterations to prevent infinite loop
         iteration = 0
         
-        print("6.1 Forced liquidation range:", forced_initial_low_price, forced_final_height_price) 
 
         while iteration < max_iterations:
-            has_intersection = False
-            for order in short_orders:
-                # Check for any overlap
-                if not (forced_initial_low_price > order['hightPrice'] or forced_final_height_price < order['lowPrice']):
-                    # Has intersection, need to adjust forced close price
-                    forced_close_price = forced_close_price * 0.998
-                    print(f"7. Found intersection, adjusting forced close price to: {forced_close_price}")
-                    print(f"   Intersecting order: low price {order['lowPrice']}, high price {order['hightPrice']}")
-                    print(f"   Current range: low price {forced_initial_low_price}, high price {forced_final_height_price}")
-                    # Recalculate
-                    is_valid, result = self.calculate_short_open(reserve0, reserve1, baseAmount, lendAmount, forced_close_price)
-                    if not is_valid:
-                        return False, "Adjusted forced close price is invalid"
-                    forced_final_height_price = result['forced_final_height_price']
-                    forced_initial_low_price = result['forced_initial_low_price']
-                    print("8. Found new price range:", forced_final_height_price, forced_initial_low_price)
-                    
-                    has_intersection = True
-                    break  # Break inner loop, recheck all orders
-            
-            if not has_intersection:
-                break  # If no intersection, break outer loop
+            with self.lock.read():
+                intersect_id = self.pool.shortRangeIndex.findIntersect(forced_final_height_price, forced_initial_low_price)
+            if intersect_id is None:
+                break  # If no intersection, break loop
+
+            # Has intersection, need to adjust forced close price
+            forced_close_price = forced_close_price * 0.998
+            # Recalculate
+            is_valid, result = self.calculate_short_open(reserve0, reserve1, baseAmount, lendAmount, forced_close_price)
+            if not is_valid:
+                return False, "Adjusted forced close price is invalid"
+            forced_final_height_price = result['forced_final_height_price']
+            forced_initial_low_price = result['forced_initial_low_price']
             
             iteration += 1
 
@@ -246,20 +421,14 @@ class SwapHub:
             return False, "Reached maximum iterations, unable to find suitable forced close price"
         
         
-        print(f"8. Found suitable forced close price: {forced_close_price}")
 
-        # 7. Find insertion position
-        insert_position = len(short_orders)  # Default insert at end
-        insert_order_id = ""  # Default empty string
+        # 6. Find insertion position (lower neighbour), only a hint: short_open locates the slot again if it goes stale
+        with self.lock.read():
+            below_id, above_id = self.pool.shortRangeIndex.neighbours(forced_initial_low_price)
+        insert_order_id = below_id if below_id is not None else ""
+        event_log_instance.emit("shortFastOpenQuote", pool=self.pool.poolAddress, address=caller_address, baseAmount=baseAmount, levMult=levMult, lendAmount=lendAmount,
+                                forcedClosePrice=forced_close_price, adjustments=iteration, insterOrderID=insert_order_id)
 
-        for i, order in enumerate(short_orders):
-            if forced_close_price < order['lowPrice']:
-                insert_position = i
-                if i > 0:
-                    insert_order_id = short_orders[i-1]['orderID']
-                break
-
-        print(f"9. Found insertion position: {insert_position}, insert order ID: {insert_order_id}")
 
         # 8. Return result
         current_price = self.get_price()
@@ -284,49 +453,34 @@ class SwapHub:
         :param levMult: Leverage multiplier
         :return: (bool, str) Whether operation was successful and corresponding message
         """
-        print(f"Starting fast long open operation: address={caller_address}, base amount={baseAmount}, leverage multiplier={levMult}")
+        if self.pool.fixedPoint:
+            return False, "Fast open searches float prices, use long_open with a fixed point forced close price"
 
         # 1. Calculate total available amount
         total_amount = baseAmount * levMult
-        print(f"1. Calculate available total amount: {total_amount}")
 
         # 2. Get current price and initial forced close price
         current_price = self.get_price()
         initial_forced_close_price = max(current_price * (1 - 1 / levMult), current_price * 0.1)
-        print(f"2. Current price: {current_price}, initial forced close price: {initial_forced_close_price}")
 
         # 3. Get current reserves
         reserve0, reserve1 = self.get_reserves()
-        print(f"3. Current reserves: reserve0={reserve0}, reserve1={reserve1}")
 
-        # 4. Loop to adjust forced close price to a value where pool won't lose money
-        forced_close_price = initial_forced_close_price
+        # 4. Solve for the lowest forced close price where pool won't lose money
         lendAmount1 = total_amount - baseAmount
 
-        print("Collateral funds:",baseAmount, "borrowed funds:", lendAmount1, "forced close price:", forced_close_price)
-        max_iterations = 1000
-        for i in range(max_iterations):
-            is_valid, result = self.calculate_long_open(reserve0, reserve1, baseAmount, lendAmount1, forced_close_price)
-            print(f"4. Attempt {i+1}: forced close price={forced_close_price}, is valid={is_valid}")
-            if is_valid:
-                break
-            
-            forced_close_price *= 1.02  # Increase forced close price by 0.2%
-            
-            if forced_close_price >= current_price:
-                return False, "Unable to find suitable forced close price"
+        if self.pool.loanReserve1 < lendAmount1:
+            return False, "Insufficient base tokens in loan pool"
+        forced_close_price = self.solve_long_forced_close_price(reserve0, reserve1, baseAmount, lendAmount1, current_price, initial_forced_close_price)
+        if forced_close_price is None:
+            return False, "Unable to find suitable forced close price"
 
+        is_valid, result = self.calculate_long_open(reserve0, reserve1, baseAmount, lendAmount1, forced_close_price)
         if not is_valid:
-            return False, "Reached maximum iterations, still unable to find suitable forced close price"
-
-        print(f"5. Found suitable forced close price: {forced_close_price}")
+            return False, "Unable to find suitable forced close price"
 
-        # 5. Get long order data
-        long_orders = self.get_long_order(10000)
-        print(f"6. Retrieved {len(long_orders)} long orders")
 
-            
-        # 6. Check for intersections and adjust forced close price
+        # 5. Check for intersections with existing long orders (sorted index lookup) and adjust forced close price
         forced_initial_height_price = result['forced_initial_height_price']
         forced_final_low_price = result['forced_final_low_price']
         amount0_out = result['amount0_out']
@@ -334,49 +488,33 @@ class SwapHub:
         iteration = 0
 
         while iteration < max_iterations:
-            has_intersection = False
-            for order in long_orders:
-                # Check for all possible intersections
-                if (forced_final_low_price <= order['hightPrice'] and forced_initial_height_price >= order['lowPrice']) or \
-                (forced_final_low_price >= order['lowPrice'] and forced_final_low_price <= order['hightPrice']) or \
-                (forced_initial_height_price >= order['lowPrice'] and forced_initial_height_price <= order['hightPrice']) or \
-                (forced_final_low_price <= order['lowPrice'] and forced_initial_height_price >= order['hightPrice']):
-                    # Has intersection, need to adjust forced close price
-                    forced_close_price = forced_close_price * 1.02
-                    print(f"7. Found intersection, adjusting forced close price to: {forced_close_price}")
-                    print(f"   Intersecting order: low price {order['lowPrice']}, high price {order['hightPrice']}")
-                    print(f"   Current range: low price {forced_final_low_price}, high price {forced_initial_height_price}")
-                    # Recalculate
-                    is_valid, result = self.calculate_long_open(reserve0, reserve1, baseAmount, lendAmount1, forced_close_price)
-                    if not is_valid:
-                        return False, "Adjusted forced close price is invalid"
-                    forced_initial_height_price = result['forced_initial_height_price']
-                    forced_final_low_price = result['forced_final_low_price']
-                    has_intersection = True
-                    break  # Break inner loop, recheck all orders
-            
-            if not has_intersection:
-                break  # If no intersection, break outer loop
+            with self.lock.read():
+                intersect_id = self.pool.longRangeIndex.findIntersect(forced_initial_height_price, forced_final_low_price)
+            if intersect_id is None:
+                break  # If no intersection, break loop
+
+            # Has intersection, need to adjust forced close price
+            forced_close_price = forced_close_price * 1.02
+            # Recalculate
+            is_valid, result = self.calculate_long_open(reserve0, reserve1, baseAmount, lendAmount1, forced_close_price)
+            if not is_valid:
+                return False, "Adjusted forced close price is invalid"
+            forced_initial_height_price = result['forced_initial_height_price']
+            forced_final_low_price = result['forced_final_low_price']
             
             iteration += 1
 
         if iteration == max_iterations:
             return False, "Unable to find suitable forced close price, reached maximum iterations"
 
-        print(f"8. Found suitable forced close price: {forced_close_price}")
-
-        # 7. Find insertion position
-        insert_position = len(long_orders)  # Default insert at end
-        insert_order_id = ""  # Default empty string
 
-        for i, order in enumerate(long_orders):
-            if forced_close_price > order['hightPrice']:
-                insert_position = i
-                if i > 0:
-                    insert_order_id = long_orders[i-1]['orderID']
-                break
+        # 6. Find insertion position (upper neighbour), only a hint: long_open locates the slot again if it goes stale
+        with self.lock.read():
+            below_id, above_id = self.pool.longRangeIndex.neighbours(forced_final_low_price)
+        insert_order_id = above_id if above_id is not None else ""
+        event_log_instance.emit("longFastOpenQuote", pool=self.pool.poolAddress, address=caller_address, baseAmount=baseAmount, levMult=levMult, lendAmount1=lendAmount1,
+                                forcedClosePrice=forced_close_price, adjustments=iteration, insterOrderID=insert_order_id)
 
-        print(f"9. Found insertion position: {insert_position}, insert order ID: {insert_order_id}")
 
         # 8. Return result
         current_price = self.get_price()
@@ -393,6 +531,100 @@ class SwapHub:
             "priceDifferencePercentage": price_difference_percentage  # Price difference percentage between moved forced close price and current price
         }
 
+    def solve_short_forced_close_price(self, reserve0, reserve1, baseAmount, lendAmount, current_price, max_price, tolerance=None):
+        """
+        Find the highest forced close price in (current_price, max_price] at which short liquidation does not lose money.
+        Buy-back cost rises monotonically with price, so the boundary is found by bisection.
+
+        :param reserve0: Token0 reserve amount
+        :param reserve1: Token1 reserve amount
+        :param baseAmount: User provided base token amount
+        :param lendAmount: User desired borrowed token amount
+        :param current_price: Current price (exclusive lower bound)
+        :param max_price: Highest forced close price to consider
+        :param tolerance: Relative price tolerance, defaults to self.forced_close_price_tolerance
+        :return: Forced close price, or None if no price above current price is safe
+        """
+        if tolerance is None:
+            tolerance = self.forced_close_price_tolerance
+        fee = self.pool.fee
+
+        # Selling borrowed tokens and the fees do not depend on the forced close price (same math as calculate_short_open)
+        sell_amount1_out = get_amount_out_reserve0_to_reserve1(lendAmount, reserve0, reserve1, fee)[0]
+        loan_fee = sell_amount1_out * (1.0 - self.pool.loanFee)
+        loan_day_fee = sell_amount1_out * (1.0 - self.pool.loanDayFee)
+        forced_close_fee = sell_amount1_out * (1.0 - self.pool.forcedCloseFee)
+        total_fees = loan_fee + loan_day_fee + forced_close_fee + self.pool.forcedCloseBaseAmount
+        available_amount1 = sell_amount1_out + baseAmount
+
+        def is_safe(price):
+            forced_reserve0, forced_reserve1 = get_reserves_at_price(price, reserve0, reserve1)
+            if lendAmount >= forced_reserve0:
+                return False
+            forced_amount_in = get_amount_in_reserve1_for_amount0_out(lendAmount, forced_reserve0, forced_reserve1, fee)[0]
+            return forced_amount_in + total_fees < available_amount1
+
+        if is_safe(max_price):
+            return max_price
+        low_price = current_price * (1 + tolerance)
+        if low_price >= max_price or not is_safe(low_price):
+            return None
+        return self._bisect_price(is_safe, low_price, max_price, tolerance)
+
+    def solve_long_forced_close_price(self, reserve0, reserve1, baseAmount, lendAmount1, current_price, min_price, tolerance=None):
+        """
+        Find the lowest forced close price in [min_price, current_price) at which long liquidation does not lose money.
+        Sell-off proceeds rise monotonically with price, so the boundary is found by bisection.
+
+        :param reserve0: Token0 reserve amount
+        :param reserve1: Token1 reserve amount
+        :param baseAmount: User provided base token amount (USDT)
+        :param lendAmount1: User desired borrowed base token amount (USDT)
+        :param current_price: Current price (exclusive upper bound)
+        :param min_price: Lowest forced close price to consider
+        :param tolerance: Relative price tolerance, defaults to self.forced_close_price_tolerance
+        :return: Forced close price, or None if no price below current price is safe
+        """
+        if tolerance is None:
+            tolerance = self.forced_close_price_tolerance
+        fee = self.pool.fee
+
+        # Buying with collateral + borrowed funds and the fees do not depend on the forced close price (same math as calculate_long_open)
+        loan_fee = lendAmount1 * (1.0 - self.pool.loanFee)
+        loan_day_fee = lendAmount1 * (1.0 - self.pool.loanDayFee)
+        forced_close_fee = lendAmount1 * (1.0 - self.pool.forcedCloseFee)
+        total_fees = loan_fee + loan_day_fee + forced_close_fee + self.pool.forcedCloseBaseAmount
+        amount0_out = get_amount_out_reserve1_to_reserve0(baseAmount + lendAmount1, reserve0, reserve1, fee)[0]
+        required_amount1 = lendAmount1 + total_fees
+
+        def is_safe(price):
+            forced_reserve0, forced_reserve1 = get_reserves_at_price(price, reserve0, reserve1)
+            forced_amount1_out = get_amount_out_reserve0_to_reserve1(amount0_out, forced_reserve0, forced_reserve1, fee)[0]
+            # Same check as ShortSwapV1Pool.longOpen
+            return not (forced_amount1_out + forced_amount1_out < required_amount1)
+
+        if min_price <= 0:
+            return None
+        if is_safe(min_price):
+            return min_price
+        high_price = current_price * (1 - tolerance)
+        if high_price <= min_price or not is_safe(high_price):
+            return None
+        return self._bisect_price(is_safe, high_price, min_price, tolerance)
+
+    def _bisect_price(self, is_safe, safe_price, unsafe_price, tolerance):
+        """
+        Narrow [safe_price, unsafe_price] around the monotone is_safe boundary until it is within the relative tolerance.
+        :return: The safe end of the final interval
+        """
+        while abs(unsafe_price - safe_price) > tolerance * safe_price:
+            mid_price = (safe_price + unsafe_price) / 2
+            if is_safe(mid_price):
+                safe_price = mid_price
+            else:
+                unsafe_price = mid_price
+        return safe_price
+
     def calculate_short_open(self, reserve0, reserve1, baseAmount, lendAmount, forcedClosePrice):
         """
         Calculate short open related parameters, check if forced close price is reasonable.
@@ -404,8 +636,6 @@ class SwapHub:
         :param forcedClosePrice: Forced liquidation price
         :return: (bool, dict) Whether reasonable and related calculation results
         """
-        print("b--------Calculate short open calculate_short_open---------")
-        print(f"Parameters: reserve0: {reserve0}, reserve1: {reserve1}, base amount: {baseAmount}, borrow amount: {lendAmount}, forced close price: {forcedClosePrice}")
 
         # Simulate selling borrowed tokens
         sell_amount1_out, sell_fee_amount0, sell_new_reserve0, sell_new_reserve1, sell_initial_price, sell_final_price = get_amount_out_reserve0_to_reserve1(
@@ -419,11 +649,9 @@ class SwapHub:
         total_fees = loan_fee + loan_day_fee + forced_close_fee + self.pool.forcedCloseBaseAmount  # Total loan fees
 
         #realLendAmount = lendAmount - sell_fee_amount0  # Actual borrowed token amount
-        print(f"1.Simulate borrowing and selling to get USDT: {sell_amount1_out}, simulate trading fee: {sell_fee_amount0}, borrowed token amount: {lendAmount}, loan fee: {loan_fee}USDT")
 
         loanReserveAmount = sell_amount1_out + total_fees  # Minimum loan reserve
         
-        print(f"2.Daily interest: {loan_day_fee} USDT, liquidation(third party benefit fee): {forced_close_fee} USDT, third party fixed fee: {self.pool.forcedCloseBaseAmount} USDT, total borrowing fee: {total_fees}USDT minimum loan reserve{loanReserveAmount}")
  
         # if baseAmount < loanReserveAmount:
         #     return False, {"message": "Insufficient base tokens to pay all fees"}
@@ -436,8 +664,6 @@ class SwapHub:
             lendAmount, forced_reserve0, forced_reserve1, self.pool.fee
         )
 
-        print(f"3. Minimum loan reserve funds: {loanReserveAmount}USDT, liquidation at price: {forcedClosePrice}, buy back needs: {forced_amount_in}USDT, includes fee: {forced_fee_amount}USDT")
-        print(f"4. Total funds needed for liquidation: {forced_amount_in + total_fees}, sell coins + collateral: {sell_amount1_out + baseAmount}")
 
         # Check if liquidation will result in loss
         if forced_amount_in + total_fees >= sell_amount1_out + baseAmount:
@@ -465,8 +691,7 @@ class SwapHub:
         :param forcedClosePrice: Forced liquidation price
         :return: (bool, dict) Whether reasonable and related calculation results
         """
-        print("Parameters: use", baseAmount, "USDT as collateral", "borrow", lendAmount1, "USDT", "forced liquidation price", forcedClosePrice)
-        if forcedClosePrice >= self.pool.getPrice():
+        if forcedClosePrice >= get_current_price(reserve0, reserve1):
             return False, "Forced liquidation price cannot be greater than current price"
         if forcedClosePrice <= 0:
             return False, "Forced liquidation price cannot equal 0"
@@ -484,21 +709,18 @@ class SwapHub:
         forced_close_fee = lendAmount1 * (1.0 - self.pool.forcedCloseFee)  # Forced liquidation fee
         total_fees = loan_fee + loan_day_fee + forced_close_fee + self.pool.forcedCloseBaseAmount  # Total loan fees USDT
         # Print fees
-        print("1.Loan fee:", loan_fee, "USDT", "daily interest:", loan_day_fee, "USDT", "liquidation(third party benefit fee):", forced_close_fee, "USDT", "third party fixed fee:", self.pool.forcedCloseBaseAmount, "USDT", "total borrowing fee:", total_fees, "USDT")
         
         # 4. Simulate purchase with total_base_amount USDT to get how many tokens
         amount0_out, fee_amount1, new_reserve0, new_reserve1, initial_price, final_price = get_amount_out_reserve1_to_reserve0(
-            total_base_amount,self.pool.reserve0, self.pool.reserve1, self.pool.fee
+            total_base_amount, reserve0, reserve1, self.pool.fee
         )
-        print("2.Collateral + borrowed:" ,total_base_amount, "USDT can buy tokens (including fee):", amount0_out ,"T" )
         
         # Move liquidity pool to forcedClosePrice (for calculation only, cannot change real liquidity pool)
-        forced_reserve0, forced_reserve1 = get_reserves_at_price(forcedClosePrice, self.pool.reserve0, self.pool.reserve1)
+        forced_reserve0, forced_reserve1 = get_reserves_at_price(forcedClosePrice, reserve0, reserve1)
         # 5. Simulate forced liquidation trade (sell amount0_out tokens, get forced_amount1_out base tokens)
         forced_amount1_out, forced_fee_amount0, forced_new_reserve0, forced_new_reserve1, forced_initial_height_price, forced_final_low_price = get_amount_out_reserve0_to_reserve1(
             amount0_out, forced_reserve0, forced_reserve1, self.pool.fee
         )
-        print("3.Liquidation at price:", forcedClosePrice, "sell tokens get (fee included):", forced_amount1_out, "USDT", "fee:", forced_fee_amount0, "T","no loss after liquidation needs at least:", lendAmount1+total_fees," borrowed USDT+fees")
         # Check if liquidation will result in loss
         if forced_amount1_out + forced_amount1_out < lendAmount1+total_fees:
             return False, {"message": "Will lose money after liquidation"}
@@ -522,31 +744,31 @@ class SwapHub:
         :param lendAmount0: Token amount
         :return: Profit or loss percentage value
         """
-        with self.lock:
-            reserve0, reserve1 = self.pool.getReserves()
-            current_price = self.pool.getPrice()
-
-            if the_type == "short":
-                # Short case
-                # Contract buys back lendAmount0 tokens, calculate how much USDT needed
-                amount1_in, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price = get_amount_in_reserve1_for_amount0_out(
-                    lendAmount0, reserve0, reserve1, self.pool.fee
-                )
-                # 3. Calculate profit/loss
-                profit_loss =  lendAmount1 - amount1_in
-            elif the_type == "long":
-                # 2. Simulate selling all tokens
-                sell_amount1_out, _, _, _, _, _ = get_amount_out_reserve0_to_reserve1(
-                    lendAmount0, reserve0, reserve1, self.pool.fee
-                )
-                # 3. Calculate profit/loss
-                profit_loss =  sell_amount1_out - (baseAmount1 + lendAmount1)
-            else:
-                raise ValueError("Invalid trade type. Must be 'short' or 'long'.")
-
-            # Calculate profit/loss percentage
-            initial_investment = baseAmount1
-            profit_loss_percentage = (profit_loss / initial_investment) * 100
-            
-            return profit_loss_percentage
-        
\ No newline at end of file
+        snapshot = self.pool.getSnapshot()
+        reserve0, reserve1 = snapshot.reserve0, snapshot.reserve1
+        current_price = snapshot.price
+
+        if the_type == "short":
+            # Short case
+            # Contract buys back lendAmount0 tokens, calculate how much USDT needed
+            amount1_in, fee_amount1, new_reserve0, new_reserve1, initial_low_price, final_height_price = get_amount_in_reserve1_for_amount0_out(
+                lendAmount0, reserve0, reserve1, self.pool.fee
+            )
+            # 3. Calculate profit/loss
+            profit_loss =  lendAmount1 - amount1_in
+        elif the_type == "long":
+            # 2. Simulate selling all tokens
+            sell_amount1_out, _, _, _, _, _ = get_amount_out_reserve0_to_reserve1(
+                lendAmount0, reserve0, reserve1, self.pool.fee
+            )
+            # 3. Calculate profit/loss
+            profit_loss =  sell_amount1_out - (baseAmount1 + lendAmount1)
+        else:
+            raise ValueError("Invalid trade type. Must be 'short' or 'long'.")
+
+        # Calculate profit/loss percentage
+        initial_investment = baseAmount1
+        profit_loss_percentage = (profit_loss / initial_investment) * 100
+        
+        return profit_loss_percentage
+    
\ No newline at end of file